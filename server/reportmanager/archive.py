@@ -0,0 +1,169 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""Archive of expired reports in date-partitioned Parquet files.
+
+Reports are written under `<root>/reported_date=<YYYY-MM-DD>/`, by the UTC date
+they were reported at, one zstd compressed file per archived batch named after
+the first and last id it holds. The columns are the fields of
+`webcompat.models.Report` plus the `id` and `bucket_id` of the entry, so the
+files can be read back with `load_archived_reports()`, or imported again with
+the `import_reports_from_file` command.
+"""
+
+import json
+import os
+from collections import defaultdict
+from collections.abc import Iterator
+from datetime import UTC, date, timedelta
+from logging import getLogger
+from pathlib import Path
+
+from reportmanager.models import ReportEntry
+from reportmanager.utils import REPORT_FIELDS
+from webcompat.models import Report
+
+try:
+    import pyarrow
+    import pyarrow.dataset
+    import pyarrow.parquet
+except ImportError:  # only required for archiving
+    pyarrow = None  # type: ignore[assignment]
+
+LOG = getLogger("reportmanager.archive")
+
+BATCH_SIZE = 1000
+PARTITION_FIELD = "reported_date"
+
+# archived column -> ReportEntry lookup
+COLUMNS = {
+    "id": "id",
+    "uuid": "uuid",
+    "reported_at": "reported_at",
+    "url": "url",
+    "app_name": "app__name",
+    "app_channel": "app__channel",
+    "app_version": "app__version",
+    "os": "os__name",
+    "breakage_category": "breakage_category__value",
+    "comments": "comments",
+    "comments_translated": "comments_translated",
+    "comments_original_language": "comments_original_language",
+    "details": "details",
+    "ml_valid_probability": "ml_valid_probability",
+    "country": "country",
+    "bucket_id": "bucket_id",
+    "cluster_id": "cluster_id",
+}
+
+
+class ArchiveError(Exception):
+    pass
+
+
+def get_schema():
+    string = pyarrow.string()
+    return pyarrow.schema(
+        [
+            ("id", pyarrow.int64()),
+            ("uuid", string),
+            ("reported_at", pyarrow.timestamp("us", tz="UTC")),
+            ("url", string),
+            ("app_name", string),
+            ("app_channel", string),
+            ("app_version", string),
+            ("os", string),
+            ("breakage_category", string),
+            ("comments", string),
+            ("comments_translated", string),
+            ("comments_original_language", string),
+            ("details", string),
+            ("ml_valid_probability", pyarrow.float64()),
+            ("country", string),
+            ("bucket_id", pyarrow.int64()),
+            ("cluster_id", string),
+        ]
+    )
+
+
+def check_available() -> None:
+    if pyarrow is None:
+        raise ArchiveError("pyarrow is required to archive reports")
+
+
+def to_record(row: tuple) -> dict:
+    record = dict(zip(COLUMNS, row, strict=True))
+    record["uuid"] = str(record["uuid"])
+    record["reported_at"] = record["reported_at"].astimezone(UTC)
+    record["details"] = json.dumps(record["details"])
+    if record["cluster_id"] is not None:
+        record["cluster_id"] = str(record["cluster_id"])
+    return record
+
+
+def write_partition(root: Path, day: date, records: list[dict]) -> Path:
+    """Write the records reported on `day` to a new file of its partition."""
+    directory = root / f"{PARTITION_FIELD}={day.isoformat()}"
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"{records[0]['id']}-{records[-1]['id']}.parquet"
+    # written aside first, so that partial files are never read
+    tmp_path = path.with_suffix(".tmp")
+    pyarrow.parquet.write_table(
+        pyarrow.Table.from_pylist(records, schema=get_schema()),
+        tmp_path,
+        compression="zstd",
+    )
+    os.replace(tmp_path, path)
+    return path
+
+
+def archive_reports(queryset, root: Path, batch_size: int = BATCH_SIZE) -> int:
+    """Move the entries of `queryset` to the archive at `root`.
+
+    Entries are archived in batches of ascending ids, and each batch is deleted
+    with `ReportEntry.objects.bulk_delete()` once its files are written.
+    Returns the number of archived entries.
+    """
+    check_available()
+    rows = queryset.order_by("id").values_list(*COLUMNS.values())
+    archived = 0
+    last_id = 0
+    while batch := list(rows.filter(id__gt=last_id)[:batch_size]):
+        last_id = batch[-1][0]
+        by_day: dict[date, list[dict]] = defaultdict(list)
+        for row in batch:
+            record = to_record(row)
+            by_day[record["reported_at"].date()].append(record)
+        for day, records in sorted(by_day.items()):
+            write_partition(root, day, records)
+        archived += ReportEntry.objects.bulk_delete(
+            ReportEntry.objects.filter(id__in=[row[0] for row in batch])
+        )
+        LOG.debug("archived %d reports up to id %d", archived, last_id)
+    return archived
+
+
+def iter_archived_records(
+    root: Path, since: date, until: date, batch_size: int = BATCH_SIZE
+) -> Iterator[dict]:
+    """Read the records archived at `root` that were reported from `since` to
+    `until` (inclusive, UTC dates), without touching the database."""
+    check_available()
+    days = (since + timedelta(days=n) for n in range((until - since).days + 1))
+    paths = sorted(
+        str(path)
+        for day in days
+        for path in (root / f"{PARTITION_FIELD}={day.isoformat()}").glob("*.parquet")
+    )
+    if not paths:
+        return
+    dataset = pyarrow.dataset.dataset(paths, schema=get_schema(), format="parquet")
+    for batch in dataset.to_batches(batch_size=batch_size):
+        yield from batch.to_pylist()
+
+
+def load_archived_reports(root: Path, since: date, until: date) -> Iterator[Report]:
+    """Like `iter_archived_records()`, as `Report` objects."""
+    for record in iter_archived_records(root, since, until):
+        yield Report.from_dict({k: v for k, v in record.items() if k in REPORT_FIELDS})
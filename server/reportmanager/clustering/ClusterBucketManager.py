@@ -3,6 +3,7 @@
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 import json
 from collections import defaultdict
+from collections.abc import Iterable
 from dataclasses import dataclass
 from datetime import datetime, timedelta
 from itertools import batched
@@ -14,7 +15,13 @@ from django.db.models import Count, QuerySet
 from django.utils import timezone
 
 from reportmanager.clustering.SBERTClusterer import SBERTClusterer
-from reportmanager.models import Bucket, BucketHit, Cluster, ReportEntry
+from reportmanager.models import (
+    CLUSTER_BUCKET_IDENTIFIER,
+    Bucket,
+    BucketCounterDeltas,
+    Cluster,
+    ReportEntry,
+)
 
 
 @dataclass
@@ -121,7 +128,7 @@ class ClusteringConfig:
     # Number of records to process per batch to avoid SQL variable limits
     BATCH_SIZE = 500
     # Identifier in bucket description for cluster-based buckets
-    CLUSTER_BUCKET_IDENTIFIER = "[Cluster"
+    CLUSTER_BUCKET_IDENTIFIER = CLUSTER_BUCKET_IDENTIFIER
     DEFAULT_BUCKET_PRIORITY = 0
 
 
@@ -425,12 +432,15 @@ class ClusterBucketManager:
         return json.dumps(signature, sort_keys=True)
 
     def update_bucket_hits(self, reports_to_move: QuerySet, new_bucket_id: int) -> None:
-        """Update BucketHit counts when moving reports to a new bucket."""
+        """Update BucketHit and BucketCounter counts when moving reports to a
+        new bucket."""
 
-        for report in reports_to_move.values("reported_at", "bucket_id"):
-            if report["bucket_id"]:
-                BucketHit.decrement_count(report["bucket_id"], report["reported_at"])
-            BucketHit.increment_count(new_bucket_id, report["reported_at"])
+        counter_deltas = BucketCounterDeltas()
+        for report in reports_to_move.values(
+            "bucket_id", *BucketCounterDeltas.REPORT_FIELDS
+        ):
+            counter_deltas.move(report["bucket_id"], new_bucket_id, report)
+        counter_deltas.apply()
 
     def create_bucket_for_cluster(
         self, domain: str, cluster_id: int, report_ids: list[int]
@@ -453,7 +463,7 @@ class ClusterBucketManager:
             # Reassign reports to new bucket
             reports_to_move = ReportEntry.objects.filter(id__in=report_ids)
             self.update_bucket_hits(reports_to_move, new_bucket.id)
-            reports_to_move.update(bucket=new_bucket)
+            reports_to_move.update(bucket=new_bucket, triage_pending=False)
 
     def create_buckets_from_clusters(self, all_clusters: list[ClusterData]) -> int:
         buckets_created = 0
@@ -476,14 +486,17 @@ class ClusterBucketManager:
 
         return buckets_created
 
-    def get_bucket_for_cluster(self, cluster_id: int) -> Bucket | None:
-        cluster = Cluster.objects.filter(id=cluster_id).first()
-        if not cluster:
-            return None
-
-        signature = self.build_cluster_bucket_signature(cluster.domain, cluster_id)
-        bucket = Bucket.objects.filter(signature=signature).first()
-        return bucket
+    def get_cluster_buckets(self, cluster_ids: Iterable[int]) -> dict[int, int]:
+        """Map clusters to the id of their bucket, for those that have one."""
+        cluster_buckets: dict[int, int] = {}
+        for batch_ids in batched(set(cluster_ids), 500):
+            for cluster_id, bucket_id in (
+                Bucket.objects.filter(cluster_id__in=batch_ids)
+                .order_by("id")
+                .values_list("cluster_id", "id")
+            ):
+                cluster_buckets.setdefault(cluster_id, bucket_id)
+        return cluster_buckets
 
     def calculate_domain_thresholds(self, domains: set[str]) -> dict[str, float]:
         """Calculate dynamic distance thresholds for domains based on report volume."""
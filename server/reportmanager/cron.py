@@ -2,60 +2,31 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 from datetime import timedelta
-from itertools import count
+from logging import getLogger
 
 from celeryconf import app
 from django.conf import settings
 from django.core.management import call_command
-from django.db import transaction
-from django.db.models import F, Q
 from django.utils import timezone
 
+LOG = getLogger("reportmanager.cron")
+
 
 @app.task(ignore_result=True)
 def update_report_stats():
-    from .models import ReportEntry, ReportHit
+    from .models import ReportHit
 
     max_history = timedelta(days=getattr(settings, "REPORT_STATS_MAX_HISTORY_DAYS", 14))
-    now = timezone.now()
-    cur_period = ReportHit.get_period(now)
+    cutoff = ReportHit.get_period(timezone.now()) - max_history
+
+    # counts are maintained as reports are created and deleted, only correct
+    # the periods that drifted (e.g. after an interrupted import)
+    corrected = ReportHit.check_counts(cutoff - timedelta(hours=1))
+    if corrected:
+        LOG.warning("corrected the report counts of %d hours", corrected)
 
-    try:
-        last_run = max(
-            ReportHit.objects.all().order_by("-last_update")[0].last_update,
-            cur_period - max_history,
-        )
-    except IndexError:
-        # no run, go back as far in history as needed
-        last_run = cur_period - max_history
-
-    for hours in count():
-        period = cur_period - timedelta(hours=hours)
-        if period <= last_run:
-            break
-        with transaction.atomic():
-            reporthits_range = ReportHit.objects.select_for_update().filter(
-                Q(last_update__gt=period - timedelta(hours=1))
-                & Q(last_update__lte=period)
-            )
-            hits = ReportEntry.objects.filter(
-                reported_at__gt=max(period - timedelta(hours=1), last_run),
-                reported_at__lte=period,
-            ).count()
-
-            obj, created = reporthits_range.get_or_create(
-                defaults={
-                    "last_update": min(period, now),
-                    "count": hits,
-                },
-            )
-            if not created:
-                obj.last_update = min(period, now)
-                obj.count = F("count") + hits
-                obj.save()
     # trim old stats
-    old_cutoff = cur_period - max_history
-    ReportHit.objects.filter(last_update__lt=old_cutoff).delete()
+    ReportHit.objects.filter(last_update__lt=cutoff).delete()
 
 
 @app.task(ignore_result=True)
@@ -73,6 +44,11 @@ def cleanup_old_reports():
     call_command("cleanup_old_reports")
 
 
+@app.task(ignore_result=True)
+def compact_bucket_hits():
+    call_command("compact_bucket_hits")
+
+
 @app.task(ignore_result=True)
 def triage_new_reports():
     call_command("triage_new_reports")
@@ -85,13 +61,20 @@ def notify_by_email():
 
 @app.task(ignore_result=True)
 def import_reports():
-    from .models import ReportEntry
+    from .models import ImportWatermark, ReportEntry
 
     max_history = timedelta(days=getattr(settings, "REPORT_STATS_MAX_HISTORY_DAYS", 14))
     since = timezone.now() - max_history
 
-    newest_entry = ReportEntry.objects.all().order_by("-reported_at").first()
-    if newest_entry is not None:
+    watermark = ImportWatermark.objects.filter(
+        source=ImportWatermark.Sources.BIGQUERY
+    ).first()
+    if watermark is not None:
+        # the import skips the already imported reports at the watermark itself
+        since = max(watermark.reported_at, since)
+    elif (
+        newest_entry := ReportEntry.objects.all().order_by("-reported_at").first()
+    ) is not None:
         since = max(
             # dupe 60s from previous update to ensure nothing is missed
             newest_entry.reported_at - timedelta(seconds=60),
@@ -5,13 +5,17 @@
 import logging
 import os
 import socket
-from collections.abc import Generator
+import threading
+import uuid
+from collections.abc import Generator, Iterable
 from contextlib import contextmanager
+from dataclasses import dataclass
 
-from django.db import IntegrityError, transaction
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Q
 from django.utils import timezone
 
-from reportmanager.models import JobLock
+from reportmanager.models import JobLock, JobLockHolder
 
 LOG = logging.getLogger("reportmanager.locking")
 
@@ -63,6 +67,14 @@ def acquire_lock(lock_name: str) -> bool:
         lock = get_or_create_lock()
         acquired_by = get_process_identifier()
 
+        drop_stale_holders()
+        if holder := JobLockHolder.objects.first():
+            raise JobLockError(
+                f"Cannot acquire lock '{lock_name}': "
+                f"another operation '{holder.lock_name}' is in progress "
+                f"(held by {holder.acquired_by} since {holder.acquired_at})"
+            )
+
         if lock.acquired_at is None:
             lock.acquire(lock_name, acquired_by)
             LOG.info(f"Acquired lock '{lock_name}' (by {acquired_by})")
@@ -144,3 +156,236 @@ def acquire_job_lock(lock_name: str) -> Generator[None, None, None]:
         yield
     finally:
         release_lock(lock_name)
+
+
+DOMAIN_SCOPE = "domain"
+# key of the rows without domain in DOMAIN_SCOPE (not a valid hostname)
+NO_DOMAIN = "<none>"
+
+
+@dataclass(frozen=True)
+class LockScope:
+    """A scope to lock, see JobLockHolder."""
+
+    scope: str
+    key: str = ""
+    mode: str = JobLockHolder.Modes.EXCLUSIVE
+
+
+def domain_scope(
+    domain: str | None = None, mode: str = JobLockHolder.Modes.EXCLUSIVE
+) -> LockScope:
+    """Scope of the reports, clusters and buckets of `domain` (of all domains
+    by default)."""
+    return LockScope(DOMAIN_SCOPE, domain or "", mode)
+
+
+def domain_scopes(
+    domains: Iterable[str | None], mode: str = JobLockHolder.Modes.EXCLUSIVE
+) -> list[LockScope]:
+    """Scopes of the rows of each of `domains`, None for the rows without
+    domain."""
+    return [
+        LockScope(DOMAIN_SCOPE, NO_DOMAIN if domain is None else domain, mode)
+        for domain in domains
+    ]
+
+
+def operation_scope(
+    lock_name: str, mode: str = JobLockHolder.Modes.EXCLUSIVE
+) -> LockScope:
+    """Scope of an operation, to not run it twice at the same time."""
+    return LockScope(f"operation:{lock_name}", "", mode)
+
+
+def check_global_lock(lock_name: str) -> None:
+    """Lock the JobLock row, and raise JobLockError if the global lock is held."""
+    lock = get_or_create_lock()
+    if lock.acquired_at is not None and not lock.is_stale():
+        raise JobLockError(
+            f"Cannot acquire lock '{lock_name}': "
+            f"another operation '{lock.lock_name}' is in progress "
+            f"(held by {lock.acquired_by} since {lock.acquired_at})"
+        )
+
+
+def drop_stale_holders() -> None:
+    for holder in JobLockHolder.objects.filter(
+        heartbeat_at__lt=timezone.now() - JobLockHolder.STALE_AFTER
+    ):
+        LOG.warning(
+            f"Releasing stale lock '{holder.lock_name}' on {holder.scope} "
+            f"{holder.key!r} (held since {holder.acquired_at} by "
+            f"{holder.acquired_by}, last seen {holder.heartbeat_at})"
+        )
+        holder.delete()
+
+
+def acquire_scopes(
+    lock_name: str, scopes: Iterable[LockScope], partial: bool = False
+) -> tuple[uuid.UUID, list[LockScope]]:
+    """Lock `scopes` for the operation `lock_name`.
+
+    Raises JobLockError if a scope is held by a conflicting lock, or skips it
+    with `partial`. Returns the token of the acquired locks, and the scopes that
+    were acquired.
+    """
+    scopes = list(dict.fromkeys(scopes))
+    token = uuid.uuid4()
+    acquired_by = get_process_identifier()
+
+    with transaction.atomic():
+        # serializes the acquisitions
+        check_global_lock(lock_name)
+        drop_stale_holders()
+
+        holders = list(
+            JobLockHolder.objects.filter(scope__in={s.scope for s in scopes})
+        )
+        acquired = []
+        for scope in scopes:
+            holder = next(
+                (
+                    h
+                    for h in holders
+                    if h.conflicts_with(scope.scope, scope.key, scope.mode)
+                ),
+                None,
+            )
+            if holder is None:
+                acquired.append(scope)
+            elif not partial:
+                raise JobLockError(
+                    f"Cannot acquire lock '{lock_name}' on {scope.scope} "
+                    f"{scope.key!r}: another operation '{holder.lock_name}' is in "
+                    f"progress (held by {holder.acquired_by} since "
+                    f"{holder.acquired_at})"
+                )
+
+        now = timezone.now()
+        JobLockHolder.objects.bulk_create(
+            JobLockHolder(
+                scope=scope.scope,
+                key=scope.key,
+                mode=scope.mode,
+                lock_name=lock_name,
+                token=token,
+                acquired_at=now,
+                acquired_by=acquired_by,
+                heartbeat_at=now,
+            )
+            for scope in acquired
+        )
+
+    LOG.info(
+        f"Acquired lock '{lock_name}' on {len(acquired)} scopes "
+        f"(by {acquired_by}, skipped {len(scopes) - len(acquired)})"
+    )
+    return token, acquired
+
+
+def release_scopes(token: uuid.UUID) -> None:
+    """Release the locks acquired together by acquire_scopes()."""
+    deleted, _ = JobLockHolder.objects.filter(token=token).delete()
+    if not deleted:
+        LOG.warning(f"Attempted to release locks {token} but they are not held")
+
+
+class LockHeartbeat(threading.Thread):
+    """Keeps the locks of a token (and of `others`) from going stale while the
+    holder runs."""
+
+    def __init__(self, token: uuid.UUID, others: Iterable[uuid.UUID] = ()) -> None:
+        super().__init__(name=f"lock-heartbeat-{token}", daemon=True)
+        self.token = token
+        self.tokens = {token, *others}
+        self.stopped = threading.Event()
+
+    def run(self) -> None:
+        try:
+            interval = JobLockHolder.HEARTBEAT_INTERVAL.total_seconds()
+            while not self.stopped.wait(interval):
+                if not JobLockHolder.objects.filter(token__in=self.tokens).update(
+                    heartbeat_at=timezone.now()
+                ):
+                    LOG.warning(f"Locks {self.token} were released as stale")
+                    return
+        finally:
+            connection.close()
+
+    def stop(self) -> None:
+        self.stopped.set()
+        self.join()
+
+
+@contextmanager
+def hold_scopes(
+    token: uuid.UUID, others: Iterable[uuid.UUID] = ()
+) -> Generator[None, None, None]:
+    """Context manager taking over the locks acquired by acquire_scopes() in
+    another process, e.g. for a Celery task: heartbeats them while running, and
+    releases them when done.
+
+    The locks of `others` are heartbeated too, but not released, e.g. those of
+    other tasks of the same operation still waiting to run.
+
+    Raises JobLockError if the locks are not held anymore, e.g. if they were
+    released as stale while the task was queued.
+    """
+    if not JobLockHolder.objects.filter(token=token).update(
+        heartbeat_at=timezone.now()
+    ):
+        raise JobLockError(f"Locks {token} are not held anymore")
+    heartbeat = LockHeartbeat(token, others)
+    heartbeat.start()
+    try:
+        yield
+    finally:
+        heartbeat.stop()
+        release_scopes(token)
+
+
+@dataclass
+class ScopedLock:
+    token: uuid.UUID
+    scopes: list[LockScope]
+
+    def keys(self, scope: str):
+        """Return the keys locked on `scope`, as a queryset usable in filters."""
+        return JobLockHolder.objects.filter(token=self.token, scope=scope).values("key")
+
+    def domain_filter(self, field: str = "domain") -> Q:
+        """Return a filter on the rows of the locked domains, and of the rows
+        without domain if they are locked too (see domain_scopes())."""
+        locked = Q(**{f"{field}__in": self.keys(DOMAIN_SCOPE)})
+        if any(s.scope == DOMAIN_SCOPE and s.key == NO_DOMAIN for s in self.scopes):
+            locked |= Q(**{f"{field}__isnull": True})
+        return locked
+
+
+@contextmanager
+def acquire_scoped_lock(
+    lock_name: str, *scopes: LockScope, partial: bool = False
+) -> Generator[ScopedLock, None, None]:
+    """Context manager holding locks on `scopes` (see acquire_scopes()), with a
+    heartbeat, and releasing them when done.
+
+    Unlike acquire_job_lock(), operations on scopes that do not conflict run
+    concurrently, e.g. the cleanup of a domain while another one is clustered:
+        try:
+            with acquire_scoped_lock(
+                JobLock.LockTypes.CLUSTERING, domain_scope(domain)
+            ):
+                ...
+        except JobLockError as e:
+            LOG.warning(f"Could not acquire lock: {e}")
+            return
+    """
+    token, acquired = acquire_scopes(lock_name, scopes, partial=partial)
+    heartbeat = LockHeartbeat(token)
+    heartbeat.start()
+    try:
+        yield ScopedLock(token, acquired)
+    finally:
+        heartbeat.stop()
+        release_scopes(token)
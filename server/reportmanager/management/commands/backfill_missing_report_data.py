@@ -41,9 +41,11 @@ deciding factor for updates.
 
 """
 
+from collections import defaultdict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from dataclasses import dataclass
-from itertools import batched
 from logging import getLogger
+from typing import Any
 
 from django.conf import settings
 from django.core.management import BaseCommand
@@ -51,8 +53,18 @@ from django.db.models import Q
 from google.cloud import bigquery
 from google.oauth2 import service_account
 
-from reportmanager.locking import JobLockError, acquire_job_lock
-from reportmanager.models import JobLock, ReportEntry
+from reportmanager.locking import (
+    JobLockError,
+    acquire_scoped_lock,
+    domain_scopes,
+    operation_scope,
+)
+from reportmanager.models import (
+    BucketCounterDeltas,
+    DataVersion,
+    JobLock,
+    ReportEntry,
+)
 from reportmanager.utils import preprocess_text, transform_ml_label
 
 LOG = getLogger("reportmanager.backfill")
@@ -70,17 +82,86 @@ class Command(BaseCommand):
     help = "Backfill missing ML classification and translations from BigQuery"
 
     BQ_BATCH_SIZE = 5000
+    # number of BigQuery batches queried concurrently
+    BQ_WORKERS = 4
     DB_BATCH_SIZE = 1000
 
+    # columns read from the database: the ones updated below, plus the ones needed
+    # to adjust the bucket counters
+    REPORT_FIELDS = (
+        "id",
+        "uuid",
+        "bucket_id",
+        "cluster_id",
+        "ml_valid_probability",
+        "comments_translated",
+        "country",
+        *BucketCounterDeltas.REPORT_FIELDS,
+    )
+
+    BQ_QUERY = """
+        SELECT r.uuid,
+               c.label as ml_label, c.probability as ml_probability,
+               t.language_code, t.translated_text, r.country
+        FROM `{table}` as r
+        INNER JOIN `{classification_table}` c
+            ON r.uuid = c.report_uuid
+        LEFT JOIN `{translations_table}` t
+            ON r.uuid = t.report_uuid
+        WHERE r.uuid IN UNNEST(@uuids)
+    """
+
     def handle(self, *args, **options) -> None:
         try:
-            with acquire_job_lock(JobLock.LockTypes.BACKFILL):
+            with acquire_scoped_lock(
+                JobLock.LockTypes.BACKFILL, operation_scope(JobLock.LockTypes.BACKFILL)
+            ):
                 self.run_backfill()
         except JobLockError as e:
             LOG.warning(f"Cannot start backfill: {e}")
             return
 
-    def run_backfill(self) -> None:
+    @staticmethod
+    def get_client() -> bigquery.Client:
+        params = {
+            "project": settings.BIGQUERY_PROJECT,
+        }
+
+        if svc_acct := getattr(settings, "BIGQUERY_SERVICE_ACCOUNT", None):
+            params["credentials"] = (
+                service_account.Credentials.from_service_account_info(svc_acct)
+            )
+
+        return bigquery.Client(**params)
+
+    def iter_report_batches(self, reports_to_update):
+        """Yield the reports to update in batches of BQ_BATCH_SIZE.
+
+        Batches are read by primary key ranges, so that only one batch of the
+        selected columns is held at a time, without keeping a cursor open over a
+        table that is updated meanwhile.
+        """
+        reports = reports_to_update.only(*self.REPORT_FIELDS).order_by("id")
+        last_id = 0
+        while batch := list(reports.filter(id__gt=last_id)[: self.BQ_BATCH_SIZE]):
+            yield batch
+            last_id = batch[-1].id
+
+    def fetch_batch(self, client, uuids: list[str]) -> list[Any]:
+        """Query the BigQuery rows of `uuids`. This runs in a worker thread."""
+        query = self.BQ_QUERY.format(
+            table=settings.BIGQUERY_TABLE,
+            classification_table=settings.BIGQUERY_CLASSIFICATION_TABLE,
+            translations_table=settings.BIGQUERY_TRANSLATIONS_TABLE,
+        )
+        job_config = bigquery.QueryJobConfig(
+            query_parameters=[bigquery.ArrayQueryParameter("uuids", "STRING", uuids)]
+        )
+        return list(client.query(query, job_config=job_config))
+
+    def run_backfill(self, client=None) -> None:
+        """Backfill the reports missing data, from `client` (a BigQuery client by
+        default) which only has to provide `query()`."""
         # Find reports needing ML updates (only those with non-empty comments)
         reports_to_update = (
             ReportEntry.objects.filter(comments__isnull=False)
@@ -96,129 +177,137 @@ class Command(BaseCommand):
 
         LOG.info("Found %d reports needing backfill", total_reports)
 
-        all_reports = list(reports_to_update)
-        batches = list(batched(all_reports, self.BQ_BATCH_SIZE))
-        total_updated: int = 0
+        if client is None:
+            client = self.get_client()
+
+        # reports of domains locked by another operation (e.g. clustering) are
+        # left for the next run
+        domains = set(reports_to_update.values_list("domain", flat=True).distinct())
+        with acquire_scoped_lock(
+            JobLock.LockTypes.BACKFILL,
+            *domain_scopes(domains),
+            partial=True,
+        ) as domain_lock:
+            self.backfill_reports(
+                reports_to_update.filter(domain_lock.domain_filter()), client
+            )
 
-        params = {
-            "project": settings.BIGQUERY_PROJECT,
-        }
+    def backfill_reports(self, reports_to_update, client) -> None:
+        total_updated: int = 0
+        # database access stays in this thread, the workers only query BigQuery
+        pending: deque[tuple[list[ReportEntry], Future]] = deque()
+        with ThreadPoolExecutor(self.BQ_WORKERS) as executor:
+            for batch_num, report_batch in enumerate(
+                self.iter_report_batches(reports_to_update), 1
+            ):
+                LOG.info(
+                    "Processing batch %d (total %d reports)...",
+                    batch_num,
+                    len(report_batch),
+                )
+                uuids = [str(report.uuid) for report in report_batch]
+                pending.append(
+                    (report_batch, executor.submit(self.fetch_batch, client, uuids))
+                )
+                if len(pending) >= self.BQ_WORKERS:
+                    total_updated += self.update_batch(*pending.popleft())
+            while pending:
+                total_updated += self.update_batch(*pending.popleft())
 
-        if svc_acct := getattr(settings, "BIGQUERY_SERVICE_ACCOUNT", None):
-            params["credentials"] = (
-                service_account.Credentials.from_service_account_info(svc_acct)
-            )
+        DataVersion.bump()
+        LOG.info("Backfill complete: %d reports updated", total_updated)
 
-        client: bigquery.Client = bigquery.Client(**params)
+    def update_batch(self, report_batch: list[ReportEntry], result: Future) -> int:
+        uuid_batch = {str(report.uuid): report for report in report_batch}
 
-        for batch_num, report_batch in enumerate(batches, 1):
-            LOG.info(
-                "Processing batch %d (total %d reports)...",
-                batch_num,
-                len(report_batch),
+        bq_data: dict[str, BackfillData] = {}
+        for row in result.result():
+            report = uuid_batch[row.uuid]
+            if report.ml_valid_probability is None:
+                ml_valid_probability = transform_ml_label(
+                    row.ml_label, row.ml_probability
+                )
+            else:
+                ml_valid_probability = report.ml_valid_probability
+            bq_data[row.uuid] = BackfillData(
+                ml_valid_probability=ml_valid_probability,
+                language_code=row.language_code,
+                translated_text=row.translated_text,
+                country=row.country,
             )
 
-            uuid_batch = {str(report.uuid): report for report in report_batch}
-
-            query: str = f"""
-                SELECT r.uuid,
-                       c.label as ml_label, c.probability as ml_probability,
-                       t.language_code, t.translated_text, r.country
-                FROM `{settings.BIGQUERY_TABLE}` as r
-                INNER JOIN `{settings.BIGQUERY_CLASSIFICATION_TABLE}` c
-                    ON r.uuid = c.report_uuid
-                LEFT JOIN `{settings.BIGQUERY_TRANSLATIONS_TABLE}` t
-                    ON r.uuid = t.report_uuid
-                WHERE r.uuid IN UNNEST(@uuids)
-            """
-
-            job_config = bigquery.QueryJobConfig(
-                query_parameters=[
-                    bigquery.ArrayQueryParameter("uuids", "STRING", uuid_batch)
-                ]
-            )
+        LOG.info("Fetched data for %d reports from BigQuery", len(bq_data))
+
+        if not bq_data:
+            return 0
+
+        # reports grouped by the fields they need updated, so that bulk_update()
+        # never reads a column that was not loaded
+        reports_to_update: dict[tuple[str, ...], list[ReportEntry]] = defaultdict(list)
+        counter_deltas = BucketCounterDeltas()
+
+        for report in report_batch:
+            uuid = str(report.uuid)
+
+            if uuid in bq_data:
+                data = bq_data[uuid]
+                updated: list[str] = []
+                retriage = False
+
+                # the updates below can change the counter keys of the report,
+                # and re-triaging takes it out of its bucket
+                if report.bucket_id is not None:
+                    counter_deltas.add(report.bucket_id, report, -1)
+
+                if (
+                    report.ml_valid_probability is None
+                    and data.ml_valid_probability is not None
+                ):
+                    report.ml_valid_probability = data.ml_valid_probability
+                    updated.append("ml_valid_probability")
+                    retriage = True
+
+                if (
+                    report.comments_translated is None
+                    and data.translated_text is not None
+                ):
+                    report.comments_translated = data.translated_text
+                    report.comments_original_language = data.language_code
+                    report.comments_preprocessed = preprocess_text(data.translated_text)
+                    updated.extend(
+                        (
+                            "comments_translated",
+                            "comments_original_language",
+                            "comments_preprocessed",
+                        )
+                    )
+                    retriage = True
 
-            result = client.query(query, job_config=job_config)
+                if report.country is None and data.country is not None:
+                    report.country = data.country
+                    updated.append("country")
 
-            bq_data: dict[str, BackfillData] = {}
-            for row in result:
-                report = uuid_batch[row.uuid]
-                if report.ml_valid_probability is None:
-                    ml_valid_probability = transform_ml_label(
-                        row.ml_label, row.ml_probability
-                    )
-                else:
-                    ml_valid_probability = report.ml_valid_probability
-                bq_data[row.uuid] = BackfillData(
-                    ml_valid_probability=ml_valid_probability,
-                    language_code=row.language_code,
-                    translated_text=row.translated_text,
-                    country=row.country,
-                )
+                if updated:
+                    # Clear bucket assignment to re-triage these reports
+                    if retriage and report.cluster_id is None:
+                        report.bucket_id = None
+                        updated.append("bucket_id")
 
-            LOG.info("Fetched data for %d reports from BigQuery", len(bq_data))
-
-            if not bq_data:
-                continue
-
-            reports_to_update: list[ReportEntry] = []
-
-            for report in report_batch:
-                uuid = str(report.uuid)
-
-                if uuid in bq_data:
-                    data = bq_data[uuid]
-                    updated = False
-                    retriage = False
-
-                    if (
-                        report.ml_valid_probability is None
-                        and data.ml_valid_probability is not None
-                    ):
-                        report.ml_valid_probability = data.ml_valid_probability
-                        updated = True
-                        retriage = True
-
-                    if (
-                        report.comments_translated is None
-                        and data.translated_text is not None
-                    ):
-                        report.comments_translated = data.translated_text
-                        report.comments_original_language = data.language_code
-                        report.comments_preprocessed = preprocess_text(
-                            data.translated_text
-                        )
-                        updated = True
-                        retriage = True
-
-                    if report.country is None and data.country is not None:
-                        report.country = data.country
-                        updated = True
-
-                    if updated:
-                        reports_to_update.append(report)
-
-                        # Clear bucket assignment to re-triage these reports
-                        if retriage and report.cluster_id is None:
-                            report.bucket_id = None
-
-            if reports_to_update:
-                ReportEntry.objects.bulk_update(
-                    reports_to_update,
-                    [
-                        "ml_valid_probability",
-                        "comments_translated",
-                        "comments_original_language",
-                        "comments_preprocessed",
-                        "bucket_id",
-                        "country",
-                    ],
-                    batch_size=self.DB_BATCH_SIZE,
-                )
-                total_updated += len(reports_to_update)
-                LOG.info(
-                    "Updated %d reports in batch (cleared buckets for re-triaging)",
-                    len(reports_to_update),
-                )
+                    reports_to_update[tuple(updated)].append(report)
 
-        LOG.info("Backfill complete: %d reports updated", total_updated)
+                if report.bucket_id is not None:
+                    counter_deltas.add(report.bucket_id, report)
+
+        total_updated = 0
+        for fields, reports in reports_to_update.items():
+            ReportEntry.objects.bulk_update(
+                reports, fields, batch_size=self.DB_BATCH_SIZE
+            )
+            total_updated += len(reports)
+        if total_updated:
+            counter_deltas.apply()
+            LOG.info(
+                "Updated %d reports in batch (cleared buckets for re-triaging)",
+                total_updated,
+            )
+        return total_updated
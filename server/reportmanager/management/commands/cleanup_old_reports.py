@@ -1,14 +1,27 @@
 from datetime import timedelta
-from itertools import batched
 from logging import getLogger
+from pathlib import Path
 
 from django.conf import settings
-from django.core.management import BaseCommand, CommandError  # noqa
-from django.db.models import Count
+from django.core.management import BaseCommand, CommandError
+from django.db.models import Count, Exists, OuterRef
 from django.utils import timezone
 
-from reportmanager.locking import JobLockError, acquire_job_lock
-from reportmanager.models import Bucket, Bug, Cluster, JobLock, ReportEntry
+from reportmanager.archive import ArchiveError, archive_reports, check_available
+from reportmanager.locking import (
+    JobLockError,
+    acquire_scoped_lock,
+    domain_scopes,
+    operation_scope,
+)
+from reportmanager.models import (
+    Bucket,
+    Bug,
+    Cluster,
+    DataVersion,
+    JobLock,
+    ReportEntry,
+)
 
 LOG = getLogger("reportmanager.cleanup_old_reports")
 
@@ -17,9 +30,18 @@ class Command(BaseCommand):
     help = "Cleanup old report entries."
 
     def handle(self, *args, **options):
+        if getattr(settings, "REPORT_ARCHIVE_DIR", None) is not None:
+            try:
+                check_available()
+            except ArchiveError as e:
+                raise CommandError(str(e)) from e
+
         try:
-            with acquire_job_lock(JobLock.LockTypes.CLEANUP):
+            with acquire_scoped_lock(
+                JobLock.LockTypes.CLEANUP, operation_scope(JobLock.LockTypes.CLEANUP)
+            ):
                 self.run_cleanup(options)
+            DataVersion.bump()
 
         except JobLockError as e:
             LOG.warning(f"Cannot start cleanup: {e}.")
@@ -43,99 +65,113 @@ class Command(BaseCommand):
             seconds=now.second,
             microseconds=now.microsecond,
         )
-        bugs = Bug.objects.filter(closed__lt=expiry_date)
-        for bug in bugs:
-            # Deleting the bug causes buckets referring to this bug as well as entries
-            # referring these buckets to be deleted as well due to cascading delete.
-            # However, if the associated buckets are too large, the cascading delete
-            # can easily cause Django to run out of memory so we have to manually
-            # delete issues in batches first for large buckets.
-            # The reason for Django running OOM here is probably due to the fact that
-            # we have a post-delete receiver on ReportEntry that has to be called for
-            # every single deleted entry with the full instance. Maybe Django loads
-            # a copy of all instances to be deleted into memory for this purpose.
-            reports = ReportEntry.objects.filter(bucket__bug=bug)
-            report_count = reports.count()
-            if report_count:
-                LOG.info(
-                    "Removing %d ReportEntry objects from buckets assigned to bug %s",
-                    report_count,
-                    bug.external_id,
-                )
-            for report_set in batched(reports.values_list("id", flat=True), 500):
-                # Deleting things in buckets is complicated:
-                #
-                # Attempting to combine a subset (LIMIT) with a delete yields
-                #   "Cannot use 'limit' or 'offset' with delete."
-                #
-                # Using a nested query with pk_in=<filter query> yields
-                #   "This version of MySQL doesn't yet support
-                #        'LIMIT & IN/ALL/ANY/SOME subquery'"
-
-                # So the only way we have left is to manually select a given amount of
-                # pks and store them in a list to use pk__in with the list and a DELETE
-                # query.
-                ReportEntry.objects.filter(pk__in=list(report_set)).delete()
-
-            bug.delete()
-
-        if not options["leave_empty_buckets"]:
-            # Select all buckets that are empty and delete them
-            for bucket in Bucket.objects.annotate(size=Count("reportentry")).filter(
-                size=0, bug=None
-            ):
-                LOG.info("Removing empty bucket %d", bucket.id)
-                bucket.delete()
-
         # Select all entries that are older than x days
-        # Again, for the same reason as mentioned above, we have to delete entries in
-        # batches.
-        expiry_date = now - timedelta(
+        report_expiry_date = now - timedelta(
             days=cleanup_reports_after_days,
         )
-        old_reports = ReportEntry.objects.filter(
-            reported_at__lt=expiry_date, centroid_of__isnull=True
-        )
-        old_report_count = old_reports.count()
-        if old_report_count:
-            LOG.info("Removing %d old non-centroid reports", old_report_count)
-        for report_set in batched(old_reports.values_list("pk", flat=True), 500):
-            ReportEntry.objects.filter(pk__in=list(report_set)).delete()
-
         centroid_expiry_date = now - timedelta(
             days=cleanup_centroids_after_days,
         )
-        # Delete centroid reports that are the last in their cluster
-        # and older than 180 days
-        old_centroid_reports = (
-            ReportEntry.objects.filter(
-                reported_at__lt=centroid_expiry_date,
-                centroid_of__isnull=False,
-            )
-            .annotate(cluster_size=Count("centroid_of__reportentry"))
-            .filter(cluster_size=1)
+
+        empty_buckets = Bucket.objects.filter(bug=None).exclude(
+            Exists(ReportEntry.objects.filter(bucket=OuterRef("pk")))
+        )
+        empty_clusters = Cluster.objects.exclude(
+            Exists(ReportEntry.objects.filter(cluster=OuterRef("pk")))
         )
 
-        old_centroid_count = old_centroid_reports.count()
-        if old_centroid_count:
-            LOG.info(
-                "Removing %d old centroid reports (last in cluster)", old_centroid_count
+        # Only the domains that are not locked by another operation (e.g. being
+        # clustered) are cleaned up, the others are left for the next run.
+        domain_querysets = [
+            Bucket.objects.filter(bug__closed__lt=expiry_date),
+            ReportEntry.objects.filter(
+                reported_at__lt=max(report_expiry_date, centroid_expiry_date)
+            ),
+            empty_clusters,
+        ]
+        if not options["leave_empty_buckets"]:
+            domain_querysets.append(empty_buckets)
+        domains = {
+            domain
+            for queryset in domain_querysets
+            for domain in queryset.values_list("domain", flat=True).distinct()
+        }
+
+        with acquire_scoped_lock(
+            JobLock.LockTypes.CLEANUP,
+            *domain_scopes(domains),
+            partial=True,
+        ) as domain_lock:
+            skipped = len(domains) - len(domain_lock.scopes)
+            if skipped:
+                LOG.info("Skipping %d domains locked by other operations", skipped)
+            locked = domain_lock.domain_filter()
+
+            # skip bugs with buckets in any other domain
+            bugs = Bug.objects.filter(closed__lt=expiry_date).exclude(
+                bucket__in=Bucket.objects.exclude(locked)
+            )
+            for bug in bugs:
+                # Deleting the bug causes buckets referring to this bug as well as
+                # entries referring these buckets to be deleted as well due to
+                # cascading delete. The cascade loads every entry to send its
+                # post_delete signal, which runs out of memory for large buckets,
+                # so the entries are removed (and archived) in bulk first.
+                reports = ReportEntry.objects.filter(bucket__bug=bug)
+                report_count = reports.count()
+                if report_count:
+                    LOG.info(
+                        "Removing %d ReportEntry objects from buckets assigned to "
+                        "bug %s",
+                        report_count,
+                        bug.external_id,
+                    )
+                self.remove_reports(reports)
+
+                bug.delete()
+
+            if not options["leave_empty_buckets"]:
+                # Select all buckets that are empty and delete them
+                for bucket in empty_buckets.filter(locked):
+                    LOG.info("Removing empty bucket %d", bucket.id)
+                    bucket.delete()
+
+            old_reports = ReportEntry.objects.filter(
+                locked, reported_at__lt=report_expiry_date, centroid_of__isnull=True
+            )
+            old_report_count = old_reports.count()
+            if old_report_count:
+                LOG.info("Removing %d old non-centroid reports", old_report_count)
+            self.remove_reports(old_reports)
+
+            # Delete centroid reports that are the last in their cluster
+            # and older than 180 days
+            old_centroid_reports = (
+                ReportEntry.objects.filter(
+                    locked,
+                    reported_at__lt=centroid_expiry_date,
+                    centroid_of__isnull=False,
+                )
+                .annotate(cluster_size=Count("centroid_of__reportentry"))
+                .filter(cluster_size=1)
             )
-        for report_set in batched(
-            old_centroid_reports.values_list("pk", flat=True), 500
-        ):
-            ReportEntry.objects.filter(pk__in=list(report_set)).delete()
 
-        # Cleanup clusters with no reports left
-        empty_clusters = Cluster.objects.annotate(
-            report_count=Count("reportentry")
-        ).filter(report_count=0)
+            old_centroid_count = old_centroid_reports.count()
+            if old_centroid_count:
+                LOG.info(
+                    "Removing %d old centroid reports (last in cluster)",
+                    old_centroid_count,
+                )
+            self.remove_reports(old_centroid_reports)
+
+            # Cleanup clusters with no reports left
+            empty_clusters = empty_clusters.filter(locked)
 
-        empty_cluster_count = empty_clusters.count()
+            empty_cluster_count = empty_clusters.count()
 
-        if empty_cluster_count:
-            LOG.info("Removing %d empty clusters", empty_cluster_count)
-            empty_clusters.delete()
+            if empty_cluster_count:
+                LOG.info("Removing %d empty clusters", empty_cluster_count)
+                empty_clusters.delete()
 
         # Cleanup all bugs that don't belong to any bucket anymore
         orphan_bugs = Bug.objects.filter(bucket__isnull=True)
@@ -144,6 +180,20 @@ class Command(BaseCommand):
             LOG.info("Removing %d orphaned Bug objects", orphan_bug_count)
             orphan_bugs.delete()
 
+    @staticmethod
+    def remove_reports(reports) -> None:
+        """Delete expired reports, moving them to the archive if one is configured
+        (see reportmanager.archive)."""
+        archive_dir = getattr(settings, "REPORT_ARCHIVE_DIR", None)
+        if archive_dir is None:
+            ReportEntry.objects.bulk_delete(reports)
+            return
+        try:
+            archived = archive_reports(reports, Path(archive_dir))
+        except ArchiveError as e:
+            raise CommandError(str(e)) from e
+        LOG.info("Archived %d reports to %s", archived, archive_dir)
+
     def add_arguments(self, parser):
         parser.add_argument(
             "--leave-empty-buckets",
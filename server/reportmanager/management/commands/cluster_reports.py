@@ -7,8 +7,14 @@ from django.core.management import BaseCommand
 from django.utils import timezone
 
 from reportmanager.clustering.ClusterBucketManager import ClusterBucketManager
-from reportmanager.locking import JobLockError, acquire_job_lock
-from reportmanager.models import ClusteringJob, ClusteringJobType, JobLock
+from reportmanager.locking import JobLockError, acquire_scoped_lock, domain_scope
+from reportmanager.models import (
+    ClusteringJob,
+    ClusteringJobType,
+    DataVersion,
+    JobLock,
+    new_bucket_labeling,
+)
 
 LOG = getLogger("reportmanager.cluster")
 
@@ -25,6 +31,7 @@ def complete_job(
     if error:
         job.error_message = error
     job.save()
+    DataVersion.bump()
 
 
 def run_clustering(domain_filter: str | None, job: ClusteringJob) -> None:
@@ -63,7 +70,8 @@ def run_clustering(domain_filter: str | None, job: ClusteringJob) -> None:
         LOG.info(f"Saving {len(all_clusters)} clusters to db.")
 
         all_clusters = manager.save_clusters(all_clusters)
-        buckets_count = manager.create_buckets_from_clusters(all_clusters)
+        with new_bucket_labeling.deferred():
+            buckets_count = manager.create_buckets_from_clusters(all_clusters)
 
         LOG.info(f"Created {buckets_count} cluster-based buckets.")
 
@@ -86,7 +94,9 @@ class Command(BaseCommand):
 
     def handle(self, domain: str | None = None, **options) -> None:
         try:
-            with acquire_job_lock(JobLock.LockTypes.CLUSTERING):
+            with acquire_scoped_lock(
+                JobLock.LockTypes.CLUSTERING, domain_scope(domain)
+            ):
                 job = ClusteringJob.objects.create(
                     domain=domain, job_type=ClusteringJobType.FULL
                 )
@@ -0,0 +1,22 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+from logging import getLogger
+
+from django.core.management import BaseCommand
+
+from reportmanager.models import BucketHit
+
+LOG = getLogger("reportmanager.compact_bucket_hits")
+
+
+class Command(BaseCommand):
+    help = (
+        "Fold hourly BucketHit rows older than COMPACT_BUCKET_HITS_AFTER_DAYS "
+        "into daily rows"
+    )
+
+    def handle(self, *args, **options):
+        horizon = BucketHit.get_compaction_horizon()
+        folded = BucketHit.compact()
+        LOG.info("Folded %d hourly bucket hits before %s", folded, horizon)
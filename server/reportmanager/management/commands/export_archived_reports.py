@@ -0,0 +1,69 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+import json
+import sys
+from datetime import date
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+
+from reportmanager.archive import (
+    ArchiveError,
+    check_available,
+    iter_archived_records,
+)
+from reportmanager.utils import REPORT_FIELDS
+
+
+class Command(BaseCommand):
+    help = (
+        "Write archived reports of a date range as NDJSON (one Report.load() object "
+        "per line), e.g. to inspect them or import them with import_reports_from_file"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--since",
+            type=date.fromisoformat,
+            required=True,
+            help="first day to export (YYYY-MM-DD, UTC)",
+        )
+        parser.add_argument(
+            "--until",
+            type=date.fromisoformat,
+            required=True,
+            help="last day to export (YYYY-MM-DD, UTC)",
+        )
+        parser.add_argument(
+            "--archive-dir",
+            type=Path,
+            help="archive to read (default: settings.REPORT_ARCHIVE_DIR)",
+        )
+        parser.add_argument(
+            "--output",
+            type=Path,
+            help="file to write (default: standard output)",
+        )
+
+    def handle(self, since, until, archive_dir, output, **options):
+        archive_dir = archive_dir or getattr(settings, "REPORT_ARCHIVE_DIR", None)
+        if archive_dir is None:
+            raise CommandError("No archive configured, pass --archive-dir")
+        try:
+            check_available()
+        except ArchiveError as e:
+            raise CommandError(str(e)) from e
+
+        fp = output.open("w", encoding="utf-8") if output else sys.stdout
+        try:
+            for record in iter_archived_records(Path(archive_dir), since, until):
+                record = {k: v for k, v in record.items() if k in REPORT_FIELDS}
+                record["reported_at"] = record["reported_at"].isoformat()
+                fp.write(json.dumps(record) + "\n")
+        except ArchiveError as e:
+            raise CommandError(str(e)) from e
+        finally:
+            if output:
+                fp.close()
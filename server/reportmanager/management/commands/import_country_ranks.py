@@ -1,21 +1,151 @@
 # This Source Code Form is subject to the terms of the Mozilla Public
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
+from collections.abc import Iterable, Iterator
+from itertools import batched
 from logging import getLogger
+from time import monotonic
 from uuid import uuid4
 
 from django.conf import settings
 from django.core.management import BaseCommand
 from django.db import connection, transaction
+from django.db.models import Q
 from django.utils import timezone
 from google.cloud import bigquery
 from google.oauth2 import service_account
 
-from reportmanager.models import Bucket, BucketCountryRank
+from reportmanager.models import (
+    Bucket,
+    BucketCountryRank,
+    DataVersion,
+    PendingCountryRankDomain,
+)
 
 LOG = getLogger("reportmanager.import_country_ranks")
 
 
+BATCH_SIZE = 1000
+
+
+def iter_current_ranks() -> Iterator[tuple[int, int, str, int]]:
+    """Stream the (id, bucket_id, country, rank) rows of BucketCountryRank in
+    (bucket_id, country) order.
+
+    Rows are read in batches of BATCH_SIZE, each starting after the key of the
+    last row of the previous one, so that no cursor stays open while the rows
+    are changed. Country keys are lowercase ASCII column names, which sort the
+    same in Python and in the database.
+    """
+    current = BucketCountryRank.objects.order_by("bucket_id", "country").values_list(
+        "id", "bucket_id", "country", "rank"
+    )
+    batch = list(current[:BATCH_SIZE])
+    while batch:
+        yield from batch
+        _, bucket_id, country, _ = batch[-1]
+        batch = list(
+            current.filter(
+                Q(bucket_id__gt=bucket_id) | Q(bucket_id=bucket_id, country__gt=country)
+            )[:BATCH_SIZE]
+        )
+
+
+def sync_country_ranks(
+    ranks: Iterable[BucketCountryRank], upsert_kwargs: dict
+) -> tuple[int, int, int]:
+    """Make the BucketCountryRank table match `ranks`, which must be sorted by
+    (bucket_id, country), writing only differences.
+
+    Both sides are merged as streams, like the domain lists (see
+    import_domain_list.sync_domain_source), so memory use does not grow with the
+    number of ranks. The changes are committed in batches. Returns the number of
+    created, updated and deleted rows.
+    """
+    to_create: list[BucketCountryRank] = []
+    to_update: list[BucketCountryRank] = []
+    to_delete: list[int] = []
+    created_count = updated_count = deleted_count = 0
+
+    def flush() -> None:
+        nonlocal created_count, updated_count, deleted_count
+        with transaction.atomic():
+            if to_update:
+                BucketCountryRank.objects.bulk_update(
+                    to_update, ["rank", "updated_at", "import_id"]
+                )
+            if to_delete:
+                BucketCountryRank.objects.filter(id__in=to_delete).delete()
+            if to_create:
+                # rows created concurrently (by a partial import) are updated in
+                # place
+                BucketCountryRank.objects.bulk_create(to_create, **upsert_kwargs)
+        created_count += len(to_create)
+        updated_count += len(to_update)
+        deleted_count += len(to_delete)
+        to_create.clear()
+        to_update.clear()
+        to_delete.clear()
+
+    current = iter_current_ranks()
+    row = next(current, None)
+    previous = None
+    for new in ranks:
+        key = (new.bucket_id, new.country)
+        if previous is not None and key <= previous:
+            raise ValueError(f"Ranks are not sorted: {key!r} after {previous!r}")
+        previous = key
+        while row is not None and (row[1], row[2]) < key:
+            to_delete.append(row[0])
+            row = next(current, None)
+        if row is not None and (row[1], row[2]) == key:
+            if row[3] != new.rank:
+                new.id = row[0]
+                to_update.append(new)
+            row = next(current, None)
+        else:
+            to_create.append(new)
+        if len(to_create) + len(to_update) + len(to_delete) >= BATCH_SIZE:
+            flush()
+    while row is not None:
+        to_delete.append(row[0])
+        row = next(current, None)
+        if len(to_delete) >= BATCH_SIZE:
+            flush()
+    flush()
+
+    return created_count, updated_count, deleted_count
+
+
+class RankedBuckets:
+    """Process-local set of the ids of buckets that have country rank data.
+
+    Partial imports skip these buckets. The set is loaded with one query and kept
+    across runs (e.g. of the import task in a worker), and reloaded after
+    MAX_AGE seconds or a full import.
+    """
+
+    MAX_AGE = 6 * 60 * 60
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self) -> None:
+        self.bucket_ids: set[int] | None = None
+        self.loaded_at = 0.0
+
+    def get(self) -> set[int]:
+        if self.bucket_ids is None or monotonic() - self.loaded_at > self.MAX_AGE:
+            self.bucket_ids = set(
+                BucketCountryRank.objects.values_list("bucket_id", flat=True).distinct()
+            )
+            self.loaded_at = monotonic()
+        return self.bucket_ids
+
+
+ranked_buckets = RankedBuckets()
+
+
 class Command(BaseCommand):
     help = "Import CrUX country rank data from BigQuery into BucketCountryRank"
 
@@ -25,16 +155,43 @@ class Command(BaseCommand):
             default=None,
             help="Override the BigQuery project (default: settings.BIGQUERY_PROJECT)",
         )
-        parser.add_argument(
+        group = parser.add_mutually_exclusive_group()
+        group.add_argument(
             "--domains",
             nargs="+",
             default=None,
             help="Limit import to these specific domains. If omitted, imports for all bucket domains.",
         )
+        group.add_argument(
+            "--pending",
+            action="store_true",
+            help="Import for the domains queued by triage (PendingCountryRankDomain)",
+        )
 
     def handle(
-        self, bq_project: str | None, domains: list[str] | None, **options: object
+        self,
+        bq_project: str | None,
+        domains: list[str] | None,
+        pending: bool = False,
+        **options: object,
     ) -> None:
+        if pending:
+            # domains queued from now on schedule the next import
+            PendingCountryRankDomain.objects.filter(
+                domain=PendingCountryRankDomain.SCHEDULED_MARKER
+            ).delete()
+            pending_domains = list(PendingCountryRankDomain.pending_domains())
+            if not pending_domains:
+                LOG.info("No pending domains — nothing to import")
+                return
+            self.import_ranks(bq_project, pending_domains)
+            # domains queued meanwhile are left for the next run
+            for batch in batched(pending_domains, 1000):
+                PendingCountryRankDomain.objects.filter(domain__in=batch).delete()
+        else:
+            self.import_ranks(bq_project, domains)
+
+    def import_ranks(self, bq_project: str | None, domains: list[str] | None) -> None:
         project = bq_project or settings.BIGQUERY_PROJECT
 
         params: dict = {"project": project}
@@ -56,17 +213,21 @@ class Command(BaseCommand):
         if partial:
             domains = list({nd for d in domains if (nd := d.strip().lower())})
             # Only import for buckets that don't already have rank data.
-            buckets = list(
-                Bucket.objects.filter(
-                    domain__in=domains, country_ranks__isnull=True
-                ).only("id", "domain")
-            )
+            ranked = ranked_buckets.get()
+            buckets = [
+                bucket
+                for bucket in Bucket.objects.filter(domain__in=domains).only(
+                    "id", "domain"
+                )
+                if bucket.id not in ranked
+            ]
         else:
             # Default: import for all bucket domains.
             buckets = list(
                 Bucket.objects.exclude(domain__isnull=True)
                 .exclude(domain="")
                 .only("id", "domain")
+                .order_by("id")
             )
 
         if not buckets:
@@ -111,20 +272,17 @@ class Command(BaseCommand):
 
         now = timezone.now()
         import_id = uuid4()
-        to_upsert: list[BucketCountryRank] = []
 
-        for bucket in buckets:
-            ranks = host_ranks.get(bucket.domain)
-            if ranks:
-                for country, rank in ranks.items():
-                    to_upsert.append(
-                        BucketCountryRank(
-                            bucket_id=bucket.id,
-                            country=country,
-                            rank=rank,
-                            updated_at=now,
-                            import_id=import_id,
-                        )
+        def iter_ranks() -> Iterator[BucketCountryRank]:
+            """Yield the imported ranks in (bucket_id, country) order."""
+            for bucket in buckets:
+                for country, rank in sorted(host_ranks.get(bucket.domain, {}).items()):
+                    yield BucketCountryRank(
+                        bucket_id=bucket.id,
+                        country=country,
+                        rank=rank,
+                        updated_at=now,
+                        import_id=import_id,
                     )
 
         # Upsert on the (bucket, country) unique constraint so existing rows
@@ -145,29 +303,32 @@ class Command(BaseCommand):
         if connection.features.supports_update_conflicts_with_target:
             upsert_kwargs["unique_fields"] = ["bucket", "country"]
 
-        if not partial and not to_upsert:
+        if not partial and not any(bucket.domain in host_ranks for bucket in buckets):
             LOG.error("Full import produced 0 rows — skipping cleanup")
             return
 
-        batch_size = 1000
-        deleted_count = 0
-        with transaction.atomic():
-            for i in range(0, len(to_upsert), batch_size):
-                batch = to_upsert[i : i + batch_size]
-                BucketCountryRank.objects.bulk_create(batch, **upsert_kwargs)
-
+        if partial:
+            to_upsert = list(iter_ranks())
+            with transaction.atomic():
+                for batch in batched(to_upsert, BATCH_SIZE):
+                    BucketCountryRank.objects.bulk_create(batch, **upsert_kwargs)
+            created_count, updated_count, deleted_count = len(to_upsert), 0, 0
+            ranked_buckets.get().update(rank.bucket_id for rank in to_upsert)
+        else:
             # Only clean up stale rows on a full import. The partial (--domains)
             # path only fills in missing data, so there's nothing to clean up.
-            if not partial:
-                deleted_count, _ = BucketCountryRank.objects.exclude(
-                    import_id=import_id
-                ).delete()
+            created_count, updated_count, deleted_count = sync_country_ranks(
+                iter_ranks(), upsert_kwargs
+            )
+            ranked_buckets.clear()
 
+        DataVersion.bump()
         LOG.info(
             "import_country_ranks complete: %d rank columns, %d buckets processed, "
-            "%d rows upserted, %d stale rows deleted",
+            "%d rows created, %d rows updated, %d stale rows deleted",
             len(rank_cols),
             len(buckets),
-            len(to_upsert),
+            created_count,
+            updated_count,
             deleted_count,
         )
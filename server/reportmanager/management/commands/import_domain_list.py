@@ -1,38 +1,204 @@
 # This Source Code Form is subject to the terms of the Mozilla Public
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
+from collections.abc import Callable, Iterable, Iterator
 from logging import getLogger
 
 from django.conf import settings
-from django.core.management import BaseCommand, CommandError, call_command
-from django.db import transaction
+from django.core.management import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import CharField, Expression, F, Func, Max
+from django.db.models.functions import Collate
 from django.utils import timezone
 from google.cloud import bigquery
 from google.oauth2 import service_account
 
-from reportmanager.models import DomainEntry, DomainSource
+from reportmanager.management.commands.label_buckets import (
+    reconcile_domains_for_source,
+)
+from reportmanager.models import DataVersion, DomainEntry, DomainSource
 from reportmanager.utils import normalize_domain
 
 LOG = getLogger("reportmanager.import_domain_list")
 
+BATCH_SIZE = 1000
+
+# Normalizes the domains like reportmanager.utils.normalize_domain(), so that
+# BigQuery can sort and deduplicate them. A value of each domain is returned too,
+# to check that both normalize it the same way (see checked_domains()).
+NORMALIZED_DOMAINS_QUERY = """
+    SELECT domain, ANY_VALUE(value) AS value FROM (
+        SELECT REGEXP_REPLACE(
+            IF(STRPOS(value, '://') > 0 OR STARTS_WITH(value, '//'),
+               NET.HOST(value), value),
+            r'^(?:www|m)\\.(.*\\..*)$', r'\\1'
+        ) AS domain, value
+        FROM (SELECT LOWER(TRIM(`{field}`)) AS value FROM `{table}`)
+    )
+    WHERE domain IS NOT NULL AND domain != ''
+    GROUP BY domain
+    ORDER BY domain
+"""
+
+
+def domain_sort_key() -> Expression:
+    """The domain column, compared by code point like Python strings.
+
+    The default collation of SQLite already does. On MySQL the UTF-8 bytes are
+    compared, which sort the same whatever the charset of the column is.
+    """
+    if connection.vendor == "mysql":
+        return Func(
+            F("domain"),
+            template="CAST(%(expressions)s AS BINARY)",
+            output_field=CharField(),
+        )
+    if connection.vendor == "postgresql":
+        return Collate("domain", "C")
+    return F("domain")
+
+
+def iter_source_entries(domain_source: DomainSource) -> Iterator[tuple[int, str]]:
+    """Stream the (id, domain) entries of `domain_source` in code point order.
+
+    Entries are read in batches of BATCH_SIZE, each starting after the last domain
+    of the previous one, so that no cursor stays open while the entries are
+    updated. Entries created after the stream started are left out, so that the
+    ones inserted while merging are not read back.
+    """
+    last_id = domain_source.entries.aggregate(Max("id"))["id__max"]
+    if last_id is None:
+        return
+    entries = (
+        domain_source.entries.filter(id__lte=last_id)
+        .annotate(sort_key=domain_sort_key())
+        .order_by("sort_key")
+        .values_list("id", "domain")
+    )
+    batch = list(entries[:BATCH_SIZE])
+    while batch:
+        yield from batch
+        batch = list(entries.filter(sort_key__gt=batch[-1][1])[:BATCH_SIZE])
+
+
+def diff_sorted_domains(
+    domains: Iterable[str], entries: Iterable[tuple[int, str]]
+) -> Iterator[tuple[str, int | None]]:
+    """Merge the ascending `domains` with the ascending (id, domain) `entries`.
+
+    Yields (domain, None) for each domain that has no entry, and (domain, id) for
+    each entry whose domain is not in `domains`. Duplicate domains are skipped.
+    """
+    entries = iter(entries)
+    entry = next(entries, None)
+    previous = None
+    for domain in domains:
+        if previous is not None and domain <= previous:
+            if domain == previous:
+                continue
+            raise ValueError(f"Domains are not sorted: {domain!r} after {previous!r}")
+        previous = domain
+        while entry is not None and entry[1] < domain:
+            yield entry[1], entry[0]
+            entry = next(entries, None)
+        if entry is not None and entry[1] == domain:
+            entry = next(entries, None)
+        else:
+            yield domain, None
+    while entry is not None:
+        yield entry[1], entry[0]
+        entry = next(entries, None)
+
+
+def checked_domains(rows: Iterable[tuple[str, str]]) -> Iterator[str]:
+    """Yield the domains of the (domain, value) rows of NORMALIZED_DOMAINS_QUERY,
+    logging those that normalize_domain() normalizes differently from `value`.
+
+    The domains normalized by BigQuery are kept, so that they stay sorted.
+    """
+    mismatches = 0
+    for domain, value in rows:
+        if normalize_domain(value) != domain:
+            mismatches += 1
+            if mismatches <= 10:
+                LOG.warning(
+                    "BigQuery normalized %r to %r, normalize_domain() to %r",
+                    value,
+                    domain,
+                    normalize_domain(value),
+                )
+        yield domain
+    if mismatches:
+        LOG.warning("%d domains were normalized differently", mismatches)
+
 
 def sync_domain_source(
-    domain_source: DomainSource, domains: set[str]
+    domain_source: DomainSource,
+    domains: Iterable[str],
+    on_change: Callable[[list[str], list[str]], None] | None = None,
 ) -> tuple[int, int]:
-    existing = set(domain_source.entries.values_list("domain", flat=True))
-    to_add = domains - existing
-    to_remove = existing - domains
-
-    domain_source.entries.filter(domain__in=to_remove).delete()
-    DomainEntry.objects.bulk_create(
-        [DomainEntry(domain_source=domain_source, domain=d) for d in to_add],
-        batch_size=1000,
-        ignore_conflicts=True,
-    )
+    """Replace the entries of `domain_source` with `domains`, which must be
+    sorted in ascending order.
+
+    Both sides are merged as streams, and changes are written in batches, so
+    memory use does not grow with the size of the list. Each batch is committed
+    on its own, so no transaction stays open while `domains` is read. `on_change`
+    is called with the (added, removed) domains of each batch, in its transaction,
+    so the changes it makes (e.g. to labels) are committed with the entries.
+
+    A sync that fails leaves the entries partially synced, and last_synced_at is
+    only updated once all are. The next sync completes the changes, as it only
+    depends on the entries present, and logs that it resumes a partial sync.
+
+    Returns a tuple of (added_count, removed_count).
+    """
+    if domain_source.sync_started_at is not None and (
+        domain_source.last_synced_at is None
+        or domain_source.last_synced_at < domain_source.sync_started_at
+    ):
+        LOG.warning(
+            "The sync of source '%s' started at %s did not finish, "
+            "completing its partial changes",
+            domain_source.name,
+            domain_source.sync_started_at,
+        )
+    domain_source.sync_started_at = timezone.now()
+    domain_source.save(update_fields=["sync_started_at"])
+
+    added: list[str] = []
+    removed: dict[int, str] = {}
+    added_count = removed_count = 0
+
+    def flush() -> None:
+        nonlocal added_count, removed_count
+        with transaction.atomic():
+            DomainEntry.objects.filter(id__in=removed).delete()
+            DomainEntry.objects.bulk_create(
+                [DomainEntry(domain_source=domain_source, domain=d) for d in added],
+                ignore_conflicts=True,
+            )
+            if on_change is not None:
+                on_change(list(added), list(removed.values()))
+        added_count += len(added)
+        removed_count += len(removed)
+        added.clear()
+        removed.clear()
+
+    for domain, entry_id in diff_sorted_domains(
+        domains, iter_source_entries(domain_source)
+    ):
+        if entry_id is None:
+            added.append(domain)
+        else:
+            removed[entry_id] = domain
+        if len(added) + len(removed) >= BATCH_SIZE:
+            flush()
+    flush()
+
     domain_source.last_synced_at = timezone.now()
     domain_source.save(update_fields=["last_synced_at"])
 
-    return len(to_add), len(to_remove)
+    return added_count, removed_count
 
 
 class Command(BaseCommand):
@@ -71,35 +237,56 @@ class Command(BaseCommand):
         client = bigquery.Client(**params)
         full_table = f"{settings.BIGQUERY_PROJECT}.{config['bq_table']}"
 
-        result = client.query(f"SELECT `{bq_source_field}` FROM `{full_table}`")
-
-        should_normalize = config.get("normalize", False)
+        if config.get("normalize", False):
+            query = NORMALIZED_DOMAINS_QUERY.format(
+                field=bq_source_field, table=full_table
+            )
+        else:
+            query = (
+                f"SELECT DISTINCT `{bq_source_field}` FROM `{full_table}` "
+                f"WHERE `{bq_source_field}` IS NOT NULL ORDER BY `{bq_source_field}`"
+            )
         exclude = set(config.get("exclude", []))
-        domains = set()
+        rows = client.query(query)
+        if config.get("normalize", False):
+            values = checked_domains((row[0], row[1]) for row in rows)
+        else:
+            values = (row[0] for row in rows)
+        domains = (value for value in values if value and value not in exclude)
 
-        for row in result:
-            value = row[bq_source_field]
-            if should_normalize:
-                value = normalize_domain(value)
-            if value and value not in exclude:
-                domains.add(value)
+        labels_created = labels_removed = 0
 
-        with transaction.atomic():
-            domain_source, _ = DomainSource.objects.update_or_create(
-                name=name,
-                defaults={
-                    "bq_table": config["bq_table"],
-                    "bq_source_field": bq_source_field,
-                },
+        def reconcile_labels(added: list[str], removed: list[str]) -> None:
+            nonlocal labels_created, labels_removed
+            created_count, removed_count = reconcile_domains_for_source(
+                name, added, removed
             )
-            added, removed = sync_domain_source(domain_source, domains)
+            labels_created += created_count
+            labels_removed += removed_count
 
-        call_command("label_buckets", source_name=name)
+        domain_source, _ = DomainSource.objects.update_or_create(
+            name=name,
+            defaults={
+                "bq_table": config["bq_table"],
+                "bq_source_field": bq_source_field,
+            },
+        )
+        added, removed = sync_domain_source(
+            domain_source, domains, on_change=reconcile_labels
+        )
 
         LOG.info(
             "Synced source '%s': %d added, %d removed, %d total",
             name,
             added,
             removed,
-            len(domains),
+            domain_source.entries.count(),
+        )
+        LOG.info(
+            "Reconciled label '%s': %d added, %d removed",
+            name,
+            labels_created,
+            labels_removed,
         )
+        if labels_created or labels_removed:
+            DataVersion.bump()
@@ -1,24 +1,33 @@
 # This Source Code Form is subject to the terms of the Mozilla Public
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
-from contextlib import suppress
 from datetime import UTC
+from itertools import batched
 from logging import getLogger
+from time import perf_counter
 from urllib.parse import urlsplit
 
 from dateutil.parser import isoparse
 from django.conf import settings
 from django.core.management import BaseCommand
-from django.db.utils import IntegrityError
 from google.cloud import bigquery
 from google.oauth2 import service_account
 
-from reportmanager.models import ReportEntry
+from reportmanager.models import (
+    DataVersion,
+    DomainBucketCache,
+    ImportWatermark,
+    ReportDimensionCache,
+    ReportEntry,
+    new_bucket_labeling,
+)
 from reportmanager.utils import transform_ml_label
 from webcompat.models import Report
 
 LOG = getLogger("reportmanager.import")
 
+BATCH_SIZE = 1000
+
 
 class Command(BaseCommand):
     help = "Import reports from BigQuery"
@@ -57,29 +66,67 @@ class Command(BaseCommand):
             ),
         )
 
-        for row in result:
-            ml_valid_probability = transform_ml_label(row.ml_label, row.ml_probability)
+        watermark = ImportWatermark.objects.filter(
+            source=ImportWatermark.Sources.BIGQUERY
+        ).first()
+        newest = None
+        newest_uuids: set[str] = set()
 
-            report_obj = Report(
-                app_name=row.app_name,
-                app_channel=row.app_channel,
-                app_version=row.app_version,
-                breakage_category=row.breakage_category,
-                comments=row.comments,
-                comments_translated=row.translated_text,
-                comments_original_language=row.language_code,
-                country=row.country,
-                details=row.details,
-                reported_at=row.reported_at.replace(tzinfo=UTC),
-                url=urlsplit(row.url),
-                os=row.os,
-                uuid=row.uuid,
-                ml_valid_probability=ml_valid_probability,
+        dimensions = ReportDimensionCache()
+        domain_buckets = DomainBucketCache()
+        rows = 0
+        start = perf_counter()
+        # domain buckets created by the import are labeled together at the end
+        with new_bucket_labeling.deferred():
+            for batch in batched(result, options["batch_size"]):
+                reports = []
+                for row in batch:
+                    report = self.row_to_report(row)
+                    if watermark is not None and watermark.is_imported(report):
+                        continue
+                    reports.append(report)
+                    if newest is None or report.reported_at > newest:
+                        newest = report.reported_at
+                        newest_uuids = set()
+                    if report.reported_at == newest:
+                        newest_uuids.add(str(report.uuid))
+                created += ReportEntry.objects.bulk_create_from_reports(
+                    reports, dimensions=dimensions, domain_buckets=domain_buckets
+                )
+                rows += len(batch)
+                LOG.debug("processed %d rows, %d new", rows, created)
+        elapsed = perf_counter() - start
+        if newest is not None:
+            ImportWatermark.advance(
+                ImportWatermark.Sources.BIGQUERY, newest, newest_uuids
             )
-            with suppress(IntegrityError):
-                ReportEntry.objects.create_from_report(report_obj)
-                created += 1
-        LOG.info("imported %d report entries", created)
+        DataVersion.bump()
+        LOG.info(
+            "imported %d report entries from %d rows in %.1fs (%.0f rows/s)",
+            created,
+            rows,
+            elapsed,
+            rows / elapsed if elapsed else 0,
+        )
+
+    @staticmethod
+    def row_to_report(row):
+        return Report(
+            app_name=row.app_name,
+            app_channel=row.app_channel,
+            app_version=row.app_version,
+            breakage_category=row.breakage_category,
+            comments=row.comments,
+            comments_translated=row.translated_text,
+            comments_original_language=row.language_code,
+            country=row.country,
+            details=row.details,
+            reported_at=row.reported_at.replace(tzinfo=UTC),
+            url=urlsplit(row.url),
+            os=row.os,
+            uuid=row.uuid,
+            ml_valid_probability=transform_ml_label(row.ml_label, row.ml_probability),
+        )
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -88,3 +135,9 @@ class Command(BaseCommand):
             type=isoparse,
             required=True,
         )
+        parser.add_argument(
+            "--batch-size",
+            help="number of reports inserted per batch (default: %(default)s)",
+            type=int,
+            default=BATCH_SIZE,
+        )
@@ -0,0 +1,161 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+import os
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from itertools import batched
+from logging import getLogger
+from pathlib import Path
+from time import perf_counter
+
+from django.core.management import BaseCommand, CommandError
+
+from reportmanager.models import (
+    DataVersion,
+    DomainBucketCache,
+    ReportDimensionCache,
+    ReportEntry,
+    new_bucket_labeling,
+)
+from reportmanager.utils import parse_report_lines, parse_report_records
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:  # only required for Parquet and Arrow input
+    pyarrow = None  # type: ignore[assignment]
+
+LOG = getLogger("reportmanager.import")
+
+BATCH_SIZE = 1000
+FORMATS = {
+    ".arrow": "arrow",
+    ".feather": "arrow",
+    ".ipc": "arrow",
+    ".parquet": "parquet",
+}
+
+
+class InlineExecutor(Executor):
+    """Executor running each call in the calling process."""
+
+    def submit(self, fn, /, *args, **kwargs):
+        future: Future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as exc:
+            future.set_exception(exc)
+        return future
+
+
+class Command(BaseCommand):
+    help = (
+        "Import reports from NDJSON (one Report.load() object per line), Parquet or "
+        "Arrow files"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="+", type=Path, help="files to import")
+        parser.add_argument(
+            "--format",
+            choices=("ndjson", "parquet", "arrow"),
+            help="input format (default: detected from the file extension)",
+        )
+        parser.add_argument(
+            "--batch-size",
+            help="number of reports parsed and inserted per batch "
+            "(default: %(default)s)",
+            type=int,
+            default=BATCH_SIZE,
+        )
+        parser.add_argument(
+            "--workers",
+            help="number of parser processes, 0 parses in this process "
+            "(default: number of CPUs)",
+            type=int,
+            default=os.cpu_count() or 1,
+        )
+
+    def handle(self, paths, **options):
+        formats = []
+        for path in paths:
+            if not path.is_file():
+                raise CommandError(f"No such file: {path}")
+            fmt = options["format"] or FORMATS.get(path.suffix.lower(), "ndjson")
+            if fmt != "ndjson" and pyarrow is None:
+                raise CommandError(f"pyarrow is required to import {fmt} files")
+            formats.append(fmt)
+
+        workers = options["workers"]
+        executor = ProcessPoolExecutor(workers) if workers > 0 else InlineExecutor()
+        # bounds the number of parsed batches held in memory
+        max_pending = max(workers, 1) * 2
+
+        dimensions = ReportDimensionCache()
+        domain_buckets = DomainBucketCache()
+        created = rows = 0
+        start = perf_counter()
+
+        def insert(future):
+            nonlocal created, rows
+            parsed = future.result()
+            created += ReportEntry.objects.bulk_create_from_reports(
+                [report for report, _ in parsed],
+                dimensions=dimensions,
+                domain_buckets=domain_buckets,
+                comments_preprocessed=[preprocessed for _, preprocessed in parsed],
+            )
+            rows += len(parsed)
+            LOG.debug("processed %d rows, %d new", rows, created)
+
+        # domain buckets created by the import are labeled together at the end
+        with executor, new_bucket_labeling.deferred():
+            for path, fmt in zip(paths, formats, strict=True):
+                LOG.info("importing %s (%s)", path, fmt)
+                pending: deque[Future] = deque()
+                for parse, batch in self.read_batches(path, fmt, options["batch_size"]):
+                    pending.append(executor.submit(parse, batch))
+                    if len(pending) >= max_pending:
+                        insert(pending.popleft())
+                while pending:
+                    insert(pending.popleft())
+
+        elapsed = perf_counter() - start
+        DataVersion.bump()
+        LOG.info(
+            "imported %d report entries from %d rows in %.1fs (%.0f rows/s)",
+            created,
+            rows,
+            elapsed,
+            rows / elapsed if elapsed else 0,
+        )
+
+    @staticmethod
+    def read_batches(path, fmt, batch_size):
+        """Stream `path` as (parse function, raw batch) pairs."""
+        if fmt == "ndjson":
+            with path.open(encoding="utf-8") as fp:
+                for lines in batched(fp, batch_size):
+                    yield parse_report_lines, lines
+        elif fmt == "parquet":
+            for batch in pyarrow.parquet.ParquetFile(path).iter_batches(batch_size):
+                yield parse_report_records, batch.to_pylist()
+        else:
+            with pyarrow.memory_map(str(path)) as source:
+                try:
+                    reader = pyarrow.ipc.open_file(source)
+                    batches = (
+                        reader.get_batch(i) for i in range(reader.num_record_batches)
+                    )
+                except pyarrow.ArrowInvalid:
+                    # not the file format, try the streaming format
+                    source.seek(0)
+                    batches = pyarrow.ipc.open_stream(source)
+                for batch in batches:
+                    for offset in range(0, batch.num_rows, batch_size):
+                        yield (
+                            parse_report_records,
+                            batch.slice(offset, batch_size).to_pylist(),
+                        )
@@ -1,6 +1,8 @@
 # This Source Code Form is subject to the terms of the Mozilla Public
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
+from collections.abc import Iterable
+from itertools import batched
 from logging import getLogger
 
 from django.conf import settings
@@ -10,6 +12,7 @@ from django.db.models import Exists, OuterRef
 from reportmanager.models import (
     Bucket,
     BucketLabel,
+    DataVersion,
     DomainEntry,
     DomainSource,
     Label,
@@ -100,6 +103,92 @@ def reconcile_all_buckets_for_source(source_name: str) -> tuple[int, int]:
     return len(created), removed_count
 
 
+def reconcile_domains_for_source(
+    source_name: str, added: Iterable[str], removed: Iterable[str]
+) -> tuple[int, int]:
+    """Reconcile the source-based label for the buckets of domains that were
+    added to or removed from the DomainSource.
+
+    Only buckets whose normalized domain is in `added` or `removed` are looked
+    up, so the cost follows the size of the change rather than the number of
+    buckets. Returns a tuple of (created_count, removed_count).
+    """
+    if not Label.objects.filter(domain_source__name=source_name).exists():
+        # nothing was labeled for this source yet, so the diff does not cover
+        # the domains that were already in it
+        return reconcile_all_buckets_for_source(source_name)
+
+    label = get_or_create_source_label(source_name)
+    if label is None:
+        return 0, 0
+
+    created_count = 0
+    for domains in batched(added, ITER_CHUNK_SIZE):
+        bucket_ids = (
+            Bucket.objects.filter(domain_normalized__in=domains)
+            .exclude(labels__label=label)
+            .values_list("id", flat=True)
+        )
+        created_count += len(
+            BucketLabel.objects.bulk_create(
+                [BucketLabel(bucket_id=pk, label=label) for pk in bucket_ids],
+                batch_size=INSERT_BATCH_SIZE,
+                ignore_conflicts=True,
+            )
+        )
+
+    removed_count = 0
+    for domains in batched(removed, ITER_CHUNK_SIZE):
+        deleted, _ = BucketLabel.objects.filter(
+            label=label, bucket__domain_normalized__in=domains
+        ).delete()
+        removed_count += deleted
+    return created_count, removed_count
+
+
+def reconcile_buckets_for_source(
+    bucket_ids: Iterable[int], source_name: str
+) -> tuple[int, int]:
+    """Reconcile the source-based label for the given buckets against the
+    DomainSource, with one lookup of their domains in the source.
+
+    Returns a tuple of (created_count, removed_count).
+    """
+    label = get_or_create_source_label(source_name)
+    if label is None:
+        return 0, 0
+
+    buckets = dict(
+        Bucket.objects.filter(pk__in=bucket_ids).values_list("id", "domain_normalized")
+    )
+    matching = set(
+        DomainEntry.objects.filter(
+            domain_source__name=source_name,
+            domain__in={domain for domain in buckets.values() if domain},
+        ).values_list("domain", flat=True)
+    )
+    labeled = set(
+        BucketLabel.objects.filter(label=label, bucket_id__in=buckets).values_list(
+            "bucket_id", flat=True
+        )
+    )
+
+    created = BucketLabel.objects.bulk_create(
+        [
+            BucketLabel(bucket_id=pk, label=label)
+            for pk, domain in buckets.items()
+            if domain in matching and pk not in labeled
+        ],
+        batch_size=INSERT_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    removed_count, _ = BucketLabel.objects.filter(
+        label=label,
+        bucket_id__in=[pk for pk in labeled if buckets[pk] not in matching],
+    ).delete()
+    return len(created), removed_count
+
+
 def reconcile_bucket_for_label(bucket_id: int, source_name: str) -> tuple[bool, bool]:
     """Reconcile the source-based label for one bucket against the DomainSource.
 
@@ -137,7 +226,8 @@ class Command(BaseCommand):
     help = "Apply domain-list-based labels to buckets"
 
     def add_arguments(self, parser):
-        parser.add_argument(
+        buckets = parser.add_mutually_exclusive_group()
+        buckets.add_argument(
             "--bucket-id",
             type=int,
             default=None,
@@ -146,6 +236,13 @@ class Command(BaseCommand):
                 "Otherwise, run in bulk mode."
             ),
         )
+        buckets.add_argument(
+            "--bucket-ids",
+            type=int,
+            nargs="+",
+            default=None,
+            help="If passed, label only these buckets (e.g. newly created ones).",
+        )
         parser.add_argument(
             "--source-name",
             default=None,
@@ -158,11 +255,30 @@ class Command(BaseCommand):
     def handle(
         self,
         bucket_id: int | None,
+        bucket_ids: list[int] | None,
         source_name: str | None,
         **options: object,
     ) -> None:
         source_names = get_label_source_names(source_name)
 
+        if bucket_ids is not None:
+            changed = False
+            for mapped_source_name in source_names:
+                created_count, removed_count = reconcile_buckets_for_source(
+                    bucket_ids, mapped_source_name
+                )
+                LOG.info(
+                    "Reconciled label '%s' for %d buckets: %d added, %d removed",
+                    mapped_source_name,
+                    len(bucket_ids),
+                    created_count,
+                    removed_count,
+                )
+                changed = changed or bool(created_count or removed_count)
+            if changed:
+                DataVersion.bump()
+            return
+
         if bucket_id is not None:
             for mapped_source_name in source_names:
                 created, removed = reconcile_bucket_for_label(
@@ -180,6 +296,8 @@ class Command(BaseCommand):
                         mapped_source_name,
                         bucket_id,
                     )
+                if created or removed:
+                    DataVersion.bump()
             return
 
         for mapped_source_name in source_names:
@@ -192,3 +310,5 @@ class Command(BaseCommand):
                 created_count,
                 removed_count,
             )
+            if created_count or removed_count:
+                DataVersion.bump()
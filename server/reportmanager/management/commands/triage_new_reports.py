@@ -1,27 +1,49 @@
-from datetime import datetime
+import heapq
+import uuid
+from collections.abc import Iterable
+from datetime import timedelta
 from itertools import batched
 from logging import getLogger
+from operator import itemgetter
 
-from django.core.management import BaseCommand, call_command
+from django.conf import settings
+from django.core.management import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Q
 from django.utils import timezone
 
 from reportmanager.clustering.ClusterBucketManager import (
     ClusterBucketManager,
-    ClusteringConfig,
     ClusterReport,
 )
-from reportmanager.locking import JobLockError, acquire_job_lock
+from reportmanager.locking import (
+    JobLockError,
+    acquire_scoped_lock,
+    acquire_scopes,
+    domain_scope,
+    domain_scopes,
+    hold_scopes,
+    release_scopes,
+)
 from reportmanager.models import (
-    Bucket,
-    BucketHit,
+    BucketCounterDeltas,
     ClusteringJob,
     ClusteringJobType,
+    DataVersion,
+    DomainBucketCache,
     JobLock,
+    JobLockHolder,
+    PendingCountryRankDomain,
     ReportEntry,
+    new_bucket_labeling,
 )
 
 LOG = getLogger("reportmanager.triage")
 
+# sharded triage jobs still running after this long are failed by the next run,
+# e.g. if the result of a shard was lost
+TRIAGE_TIMEOUT = timedelta(hours=3)
+
 
 def complete_job(
     job: ClusteringJob,
@@ -35,6 +57,7 @@ def complete_job(
     if error:
         job.error_message = error
     job.save()
+    DataVersion.bump()
 
 
 def cluster_unmatched_reports(
@@ -83,142 +106,200 @@ def cluster_unmatched_reports(
 
 def apply_domain_bucketing_fallback(
     unmatched_reports: list[ClusterReport],
-    report_entries: dict[int, ReportEntry],
-) -> tuple[int, list[tuple[int, datetime]]]:
-    """Add unclustered reports to default domain-based buckets."""
+    report_rows: dict[int, dict],
+) -> int:
+    """Add unclustered reports to default domain-based buckets.
+
+    Returns the number of buckets created.
+    """
     if not unmatched_reports:
-        return 0, []
+        return 0
 
     LOG.info(
         f"Applying domain-based bucketing to {len(unmatched_reports)} reports that didn't cluster"  # noqa
     )
 
-    # Get all unique domains from unmatched reports
-    domains = {report.domain for report in unmatched_reports}
-
-    existing_buckets = {}
-
-    for batch_domains in batched(domains, 500):
-        buckets = (
-            Bucket.objects.filter(domain__in=batch_domains)
-            .exclude(description__contains=ClusteringConfig.CLUSTER_BUCKET_IDENTIFIER)
-            .values("domain", "id")
-        )
-        existing_buckets.update({bucket["domain"]: bucket["id"] for bucket in buckets})
+    domain_buckets = DomainBucketCache()
+    domain_buckets.load({report.domain for report in unmatched_reports})
 
     entries_to_update = []
-    bucket_hits = []
-    buckets_created = 0
 
     for report in unmatched_reports:
-        bucket_id = existing_buckets.get(report.domain)
-
-        if not bucket_id:
-            # Create new domain-based bucket
-            report_entry = report_entries[report.id]
-            report_obj = report_entry.get_report()
-
-            bucket = Bucket.objects.create(
-                description=f"domain is {report.domain}",
-                signature=report_obj.create_signature().raw_signature,
-            )
-            bucket_id = bucket.pk
-            buckets_created += 1
-
-            existing_buckets[report.domain] = bucket_id
-
-        entry = report_entries[report.id]
-        entry.bucket_id = bucket_id  # type: ignore[attr-defined]
-        entries_to_update.append(entry)
-        bucket_hits.append((bucket_id, entry.reported_at))
+        bucket_id = domain_buckets.buckets.get(report.domain)
+        if bucket_id is None:
+            # only the first report of a new domain bucket is loaded in full
+            entry = ReportEntry.objects.select_related(
+                "app", "os", "breakage_category"
+            ).get(pk=report.id)
+            bucket_id = domain_buckets.get_or_create(report.domain, entry.get_report())
+        report_rows[report.id]["bucket_id"] = bucket_id
+        entries_to_update.append(ReportEntry(pk=report.id, bucket_id=bucket_id))
 
     if entries_to_update:
         ReportEntry.objects.bulk_update(entries_to_update, ["bucket_id"])
 
     LOG.info(f"Applied domain-based bucketing to {len(entries_to_update)} reports")
-    return buckets_created, bucket_hits
+    return domain_buckets.created
 
 
 def get_cluster_bucket(
     manager: ClusterBucketManager,
     report: ClusterReport,
     domain_data: dict,
+    cluster_buckets: dict[int, int],
 ) -> tuple[int | None, int | None]:
     cluster_id = manager.get_closest_cluster(report, domain_data)
-    bucket_id = None
+    bucket_id = cluster_buckets.get(cluster_id) if cluster_id else None
+    return cluster_id, bucket_id
 
-    if cluster_id:
-        cluster_bucket = manager.get_bucket_for_cluster(cluster_id)
-        bucket_id = cluster_bucket.pk if cluster_bucket else None
 
-    return cluster_id, bucket_id
+def get_shard_filter(domains: Iterable[str | None]) -> Q:
+    """Return a filter on the reports of `domains`, None for reports without
+    domain."""
+    domains = set(domains)
+    shard_filter = Q(domain__in=domains - {None})
+    if None in domains:
+        shard_filter |= Q(domain__isnull=True)
+    return shard_filter
 
 
-def run_triage(job: ClusteringJob) -> None:
-    try:
-        manager = ClusterBucketManager()
-
-        # Query all unbucketed reports
-        report_entries_qs = ReportEntry.objects.select_related(
-            "app", "os", "breakage_category"
-        ).filter(bucket_id__isnull=True)
-
-        unbucketed_reports = []
-        report_entries = {}
-
-        for entry in report_entries_qs:
-            cluster_report = manager.build_cluster_report(
-                {
-                    "id": entry.id,
-                    "comments_preprocessed": entry.comments_preprocessed,
-                    "ml_valid_probability": entry.ml_valid_probability,
-                    "reported_at": entry.reported_at,
-                    "url": entry.url,
-                    "bucket_id": entry.bucket_id,
-                    "domain": entry.domain,
-                }
-            )
+def get_pending_domain_counts(
+    domains: Iterable[str | None] | None = None,
+) -> list[tuple[str | None, int]]:
+    """Return the number of reports to triage per domain (only of `domains` if
+    given), largest first."""
+    reports = ReportEntry.objects.filter(
+        Q(bucket_id__isnull=True) | Q(triage_pending=True)
+    )
+    if domains is not None:
+        reports = reports.filter(get_shard_filter(domains))
+    return list(
+        reports.values_list("domain")
+        .annotate(reports=Count("id"))
+        .order_by("-reports", "domain")
+    )
 
-            unbucketed_reports.append(cluster_report)
-            report_entries[entry.id] = entry
 
-        LOG.info(f"Unbucketed reports to triage: {len(unbucketed_reports)}")
+def plan_triage_chunks(
+    domain_counts: list[tuple[str | None, int]], chunk_size: int
+) -> list[list[str | None]]:
+    """Group domains into chunks of at most `chunk_size` reports, or of a single
+    domain if it has more reports than that."""
+    chunks: list[list[str | None]] = []
+    size = 0
+    for domain, reports in domain_counts:
+        if not chunks or size + reports > chunk_size:
+            chunks.append([])
+            size = 0
+        chunks[-1].append(domain)
+        size += reports
+    return chunks
 
-        if not unbucketed_reports:
-            LOG.info("No unbucketed reports to triage")
-            complete_job(job, success=True, buckets_created=0)
-            return
 
-        domains = {r.domain for r in unbucketed_reports if r.domain}
-        domain_data = manager.build_domain_data(domains=domains)
-
-        unmatched_reports = []
-        low_quality_reports = []
-        entries_to_update = []
-        bucket_hits = []
-
-        for report in unbucketed_reports:
-            if report.ok_to_cluster:
-                cluster_id, bucket_id = get_cluster_bucket(manager, report, domain_data)
-
-                if cluster_id and bucket_id:
-                    entry = report_entries[report.id]
-                    entry.cluster_id = cluster_id
-                    entry.bucket_id = bucket_id
-                    entries_to_update.append(entry)
-                    bucket_hits.append((bucket_id, entry.reported_at))
-                else:
-                    # Track unmatched reports for further clustering
-                    unmatched_reports.append(report)
-            else:
-                # Low quality reports (empty text, low probability) go straight to by domain bucketing # noqa
-                low_quality_reports.append(report)
+def triage_reports(
+    manager: ClusterBucketManager, domains: Iterable[str | None] | None = None
+) -> tuple[int, int, set[str]]:
+    """Triage the pending reports, only those of `domains` if given.
+
+    Domains are triaged in chunks of TRIAGE_CHUNK_SIZE reports, each one
+    committed before the next one is loaded, which bounds memory use.
+
+    Returns:
+        Tuple of (cluster buckets created, domain buckets created, domains)
+    """
+    chunk_size = getattr(settings, "TRIAGE_CHUNK_SIZE", 5000)
+    domain_counts = get_pending_domain_counts(domains)
 
-        if entries_to_update:
-            ReportEntry.objects.bulk_update(
-                entries_to_update, ["cluster_id", "bucket_id"]
+    LOG.info(f"Unbucketed reports to triage: {sum(c for _, c in domain_counts)}")
+
+    if not domain_counts:
+        LOG.info("No unbucketed reports to triage")
+        return 0, 0, set()
+
+    buckets_created = fallback_buckets = 0
+    triaged_domains: set[str] = set()
+    chunks = plan_triage_chunks(domain_counts, chunk_size)
+    for i, chunk in enumerate(chunks, start=1):
+        LOG.info(f"Triaging chunk {i}/{len(chunks)} ({len(chunk)} domains)")
+        with transaction.atomic():
+            chunk_buckets, chunk_fallback_buckets = triage_chunk(manager, chunk)
+        buckets_created += chunk_buckets
+        fallback_buckets += chunk_fallback_buckets
+        triaged_domains.update(domain for domain in chunk if domain)
+
+    return buckets_created, fallback_buckets, triaged_domains
+
+
+def triage_chunk(
+    manager: ClusterBucketManager, domains: list[str | None]
+) -> tuple[int, int]:
+    """Triage the pending reports of `domains`.
+
+    Returns:
+        Tuple of (cluster buckets created, domain buckets created)
+    """
+    # Query all unbucketed reports, and the reports placed in their domain
+    # bucket at ingest that may still be promoted into a cluster bucket
+    report_rows_qs = ReportEntry.objects.filter(
+        Q(bucket_id__isnull=True) | Q(triage_pending=True), get_shard_filter(domains)
+    ).values(
+        "id",
+        "comments_preprocessed",
+        "url",
+        "bucket_id",
+        "domain",
+        "triage_pending",
+        *BucketCounterDeltas.REPORT_FIELDS,
+    )
+
+    unbucketed_reports = []
+    report_rows = {}
+
+    for row in report_rows_qs:
+        unbucketed_reports.append(manager.build_cluster_report(row))
+        report_rows[row["id"]] = row
+
+    original_buckets = {row_id: row["bucket_id"] for row_id, row in report_rows.items()}
+
+    domain_data = manager.build_domain_data(
+        domains={r.domain for r in unbucketed_reports if r.domain}
+    )
+    cluster_buckets = manager.get_cluster_buckets(
+        cluster_id for data in domain_data.values() for cluster_id in data.embeddings
+    )
+
+    unmatched_reports = []
+    low_quality_reports = []
+    entries_to_update = []
+
+    for report in unbucketed_reports:
+        if report.ok_to_cluster:
+            cluster_id, bucket_id = get_cluster_bucket(
+                manager, report, domain_data, cluster_buckets
             )
 
+            if cluster_id and bucket_id:
+                report_rows[report.id]["bucket_id"] = bucket_id
+                entries_to_update.append(
+                    ReportEntry(
+                        pk=report.id, cluster_id=cluster_id, bucket_id=bucket_id
+                    )
+                )
+            else:
+                # Track unmatched reports for further clustering
+                unmatched_reports.append(report)
+        else:
+            # Low quality reports (empty text, low probability) go straight to by domain bucketing # noqa
+            low_quality_reports.append(report)
+
+    # the embeddings of the clusters are not needed anymore
+    del domain_data
+
+    if entries_to_update:
+        ReportEntry.objects.bulk_update(entries_to_update, ["cluster_id", "bucket_id"])
+
+    # the buckets created below are labeled together afterwards
+    with new_bucket_labeling.deferred():
         # Cluster unmatched reports that might form clusters among themselves
         clustered_report_ids, buckets_created = cluster_unmatched_reports(
             manager, unmatched_reports
@@ -229,28 +310,208 @@ def run_triage(job: ClusteringJob) -> None:
             r for r in unmatched_reports if r.id not in clustered_report_ids
         ]
 
-        # Fall back to domain-based bucketing for reports that still don't have clusters
-        # and low-quality reports
-        remaining = still_unmatched + low_quality_reports
-        fallback_buckets, fallback_bucket_hits = apply_domain_bucketing_fallback(
-            remaining, report_entries
-        )
+        # Fall back to domain-based bucketing for reports that still don't have
+        # clusters and low-quality reports, unless they were placed in one at
+        # ingest
+        remaining = [
+            r
+            for r in still_unmatched + low_quality_reports
+            if original_buckets[r.id] is None
+        ]
+        fallback_buckets = apply_domain_bucketing_fallback(remaining, report_rows)
+
+    # Reports moved into new cluster buckets are counted by the manager, the
+    # reports assigned in place above are counted here
+    counter_deltas = BucketCounterDeltas()
+    for row_id, row in report_rows.items():
+        if row["bucket_id"] != original_buckets[row_id]:
+            counter_deltas.move(original_buckets[row_id], row["bucket_id"], row)
+    counter_deltas.apply()
+
+    pending_ids = [
+        row_id for row_id, row in report_rows.items() if row["triage_pending"]
+    ]
+    for batch_ids in batched(pending_ids, 500):
+        ReportEntry.objects.filter(id__in=batch_ids).update(triage_pending=False)
+
+    return buckets_created, fallback_buckets
+
+
+def finish_triage(
+    job: ClusteringJob, results: Iterable[tuple[int, int, Iterable[str]]]
+) -> set[str]:
+    """Record the totals of the triage of all shards in `job`, and return the
+    triaged domains."""
+    buckets_created = fallback_buckets = 0
+    domains: set[str] = set()
+    for shard_buckets, shard_fallback_buckets, shard_domains in results:
+        buckets_created += shard_buckets
+        fallback_buckets += shard_fallback_buckets
+        domains.update(shard_domains)
+
+    total_buckets = buckets_created + fallback_buckets
+    complete_job(job, success=True, buckets_created=total_buckets)
+    LOG.info(
+        f"Triage completed successfully. Created {buckets_created} cluster buckets and {fallback_buckets} domain buckets."  # noqa
+    )
 
-        all_bucket_hits = bucket_hits + fallback_bucket_hits
-        if all_bucket_hits:
-            BucketHit.bulk_increment_counts(all_bucket_hits)
+    return domains
 
-        total_buckets = buckets_created + fallback_buckets
-        complete_job(job, success=True, buckets_created=total_buckets)
-        LOG.info(
-            f"Triage completed successfully. Created {buckets_created} cluster buckets and {fallback_buckets} domain buckets."  # noqa
+
+def run_triage(job: ClusteringJob) -> set[str]:
+    """Triage all pending reports in this process, and return the triaged
+    domains, whose country ranks are to be imported."""
+    try:
+        return finish_triage(job, [triage_reports(ClusterBucketManager())])
+    except Exception as e:
+        complete_job(job, success=False, error=str(e))
+        raise
+
+
+def plan_triage_shards(shard_count: int) -> list[list[str | None]]:
+    """Split the domains of the pending reports into at most `shard_count`
+    shards with about as many reports each.
+
+    Domains are never split, as reports are only matched against the clusters
+    of their own domain.
+    """
+    domain_counts = get_pending_domain_counts()
+    # largest domains first, each one to the least loaded shard
+    shards: list[tuple[int, int, list[str | None]]] = [
+        (0, i, []) for i in range(shard_count)
+    ]
+    for domain, reports in domain_counts:
+        load, i, domains = heapq.heappop(shards)
+        domains.append(domain)
+        heapq.heappush(shards, (load + reports, i, domains))
+
+    shard_domains = [domains for _, _, domains in sorted(shards, key=itemgetter(1))]
+    return [domains for domains in shard_domains if domains]
+
+
+def run_triage_shard(
+    domains: list[str | None], token: str, tokens: list[str]
+) -> tuple[int, int, list[str]]:
+    """Triage the pending reports of `domains`, locked with `token`.
+
+    Runs in a Celery worker (see start_sharded_triage()), which releases the locks
+    of the shard once done. While it runs, it also heartbeats the locks of all
+    shards (`tokens`), so that those still queued keep their domains. The result
+    is passed to the chord callback and must be serializable.
+    """
+    with hold_scopes(uuid.UUID(token), map(uuid.UUID, tokens)):
+        buckets_created, fallback_buckets, triaged_domains = triage_reports(
+            ClusterBucketManager(), domains
         )
+    return buckets_created, fallback_buckets, sorted(triaged_domains)
 
-        if domains:
-            call_command("import_country_ranks", domains=list(domains))
 
+def finish_sharded_triage(
+    job_pk: int, results: list[tuple[int, int, list[str]]]
+) -> None:
+    """Chord callback of start_sharded_triage(), once all shards are done."""
+    job = ClusteringJob.objects.get(pk=job_pk)
+    if job.completed_at is not None:
+        LOG.warning(f"Triage job {job_pk} was already completed")
+        return
+    domains = finish_triage(job, results)
+    if domains:
+        # imported later by a separate task, the shards released their locks
+        PendingCountryRankDomain.enqueue(domains)
+
+
+def fail_sharded_triage(job_pk: int, error: str) -> None:
+    """Error callback of start_sharded_triage(), if a shard failed.
+
+    The other shards release their locks once they are done.
+    """
+    job = ClusteringJob.objects.get(pk=job_pk)
+    if job.completed_at is None:
+        complete_job(job, success=False, error=error)
+
+
+def fail_expired_triage_jobs() -> None:
+    """Fail the sharded triage jobs that never completed within TRIAGE_TIMEOUT.
+
+    The locks of their shards are not heartbeated anymore, so they are released
+    as stale (see JobLockHolder).
+    """
+    expired = ClusteringJob.objects.filter(
+        job_type=ClusteringJobType.INCREMENTAL,
+        completed_at__isnull=True,
+        started_at__lt=timezone.now() - TRIAGE_TIMEOUT,
+    )
+    for job in expired:
+        LOG.warning(f"Triage job {job.pk} timed out")
+        complete_job(job, success=False, error="Timed out")
+
+
+def start_sharded_triage(shard_count: int) -> None:
+    """Triage the pending reports in up to `shard_count` Celery tasks running
+    in parallel, completing the triage job once they are all done.
+
+    The domains of each shard are locked here, and then held by the task of the
+    shard until it is done (see run_triage_shard()). Domains already locked by
+    another operation are left for the next run. This returns once the tasks are
+    dispatched, the chord callbacks complete the job. If the tasks are lost, their
+    locks go stale and the job is failed by a later run (see TRIAGE_TIMEOUT).
+    """
+    from celery import chord
+
+    from reportmanager.tasks import complete_triage, fail_triage, triage_shard
+
+    fail_expired_triage_jobs()
+
+    locked_shards: list[tuple[list[str | None], uuid.UUID]] = []
+    try:
+        for shard in plan_triage_shards(shard_count):
+            scopes = domain_scopes(shard)
+            token, acquired = acquire_scopes(
+                JobLock.LockTypes.CLUSTERING, scopes, partial=True
+            )
+            if len(acquired) < len(scopes):
+                LOG.info(
+                    "Skipping %d domains locked by other operations",
+                    len(scopes) - len(acquired),
+                )
+            locked = set(acquired)
+            domains = [
+                domain
+                for domain, scope in zip(shard, scopes, strict=True)
+                if scope in locked
+            ]
+            if domains:
+                locked_shards.append((domains, token))
+
+        if not locked_shards:
+            LOG.info("No unbucketed reports to triage")
+            complete_job(
+                ClusteringJob.objects.create(job_type=ClusteringJobType.INCREMENTAL),
+                success=True,
+                buckets_created=0,
+            )
+            return
+
+        job = ClusteringJob.objects.create(job_type=ClusteringJobType.INCREMENTAL)
+    except Exception:
+        for _, token in locked_shards:
+            release_scopes(token)
+        raise
+
+    LOG.info(f"Triaging in {len(locked_shards)} shards")
+    try:
+        tokens = [str(token) for _, token in locked_shards]
+        chord(
+            triage_shard.s(shard, str(token), tokens) for shard, token in locked_shards
+        )(complete_triage.s(job.pk).on_error(fail_triage.s(job.pk)))
     except Exception as e:
-        complete_job(job, success=False, error=str(e))
+        # the shards that did not run still hold their locks
+        for _, token in locked_shards:
+            if JobLockHolder.objects.filter(token=token).exists():
+                release_scopes(token)
+        job.refresh_from_db()
+        if job.completed_at is None:
+            complete_job(job, success=False, error=str(e))
         raise
 
 
@@ -261,20 +522,32 @@ class Command(BaseCommand):
     )
 
     def handle(self, *args: object, **options: object) -> None:
-        try:
-            with acquire_job_lock(JobLock.LockTypes.CLUSTERING):
-                status = ClusteringJob.get_clustering_status()
+        status = ClusteringJob.get_clustering_status()
+        if not status.has_successful_run:
+            LOG.warning("Skipping triaging: full clustering has not run yet")
+            return
+
+        # number of Celery tasks the triage is split into, each triaging the
+        # pending reports of a part of the domains
+        shard_count = getattr(settings, "TRIAGE_SHARDS", 8)
 
-                if not status.has_successful_run:
-                    LOG.warning("Skipping triaging: full clustering has not run yet")
-                    return
+        try:
+            if getattr(settings, "USE_CELERY", None) and shard_count > 1:
+                start_sharded_triage(shard_count)
+                return
 
+            with acquire_scoped_lock(JobLock.LockTypes.CLUSTERING, domain_scope()):
                 # Create a job record for this triage run
                 job = ClusteringJob.objects.create(
                     job_type=ClusteringJobType.INCREMENTAL
                 )
-                run_triage(job)
+                domains = run_triage(job)
 
         except JobLockError as e:
             LOG.warning(f"Cannot start triage: {e}.")
             return
+
+        if domains:
+            # imported once the clustering lock is released (right away without
+            # Celery)
+            PendingCountryRankDomain.enqueue(domains)
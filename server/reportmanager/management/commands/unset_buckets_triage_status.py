@@ -2,14 +2,17 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 from datetime import timedelta
+from itertools import batched
 from logging import getLogger
 
-from scipy.stats import poisson
-
+import numpy as np
 from django.core.management import BaseCommand
+from django.db import transaction
 from django.db.models import F, Q, Sum
+from django.db.models.functions import Coalesce
+from scipy.stats import poisson
 
-from reportmanager.models import Bucket, BucketHit
+from reportmanager.models import Bucket, BucketHit, DataVersion
 
 LOG = getLogger("reportmanager.unset_triage_status")
 
@@ -28,6 +31,34 @@ POISSON_P_VALUE = 0.01
 MIN_RECENT_REPORTS = 3
 
 
+def poisson_p_values(baseline_counts, recent_counts) -> np.ndarray:
+    """Return, for each pair of counts, the probability of seeing at least the
+    recent count in the SHORT_WINDOW under the rate of the baseline count, in
+    one vectorized computation (see `is_poisson_spike()`)."""
+    baseline_counts = np.asarray(baseline_counts, dtype=float)
+    recent_counts = np.asarray(recent_counts, dtype=int)
+
+    baseline_days = LONG_WINDOW - SHORT_WINDOW
+
+    # expected number of reports in the recent window based on baseline,
+    # i.e. if nothing changed, how many reports would we expect in the last SHORT_WINDOW days?
+    expected = (baseline_counts / baseline_days) * SHORT_WINDOW
+
+    # We compute the probability of seeing at least this many events (not just exactly
+    # this many), because any count >= recent_count would be equally or more extreme.
+    # This "right tail" probability tells us how surprising the observed spike is
+    # under the baseline rate. We want to include recent_count i.e. P(X >= recent_count),
+    # so passing recent_count - 1. Without a baseline, it is 0 for any recent report.
+    return poisson.sf(recent_counts - 1, expected)
+
+
+def find_poisson_spikes(baseline_counts, recent_counts) -> np.ndarray:
+    """Vectorized `is_poisson_spike()`, returning a boolean array."""
+    recent_counts = np.asarray(recent_counts, dtype=int)
+    p_values = poisson_p_values(baseline_counts, recent_counts)
+    return (recent_counts >= MIN_RECENT_REPORTS) & (p_values < POISSON_P_VALUE)
+
+
 def is_poisson_spike(baseline_count: int, recent_count: int) -> bool:
     """Detect whether recent report activity is an unusual spike vs the baseline.
 
@@ -57,39 +88,30 @@ def is_poisson_spike(baseline_count: int, recent_count: int) -> bool:
         Note: recent_count should meet minimum-volume threshold
         (recent_count >= MIN_RECENT_REPORTS)
     """
-    if recent_count < MIN_RECENT_REPORTS:
-        return False
-    if baseline_count == 0:
-        return True
-
-    baseline_days = LONG_WINDOW - SHORT_WINDOW
-
-    # expected number of reports in the recent window based on baseline,
-    # i.e. if nothing changed, how many reports would we expect in the last SHORT_WINDOW days?
-    expected = (baseline_count / baseline_days) * SHORT_WINDOW
-
-    # We compute the probability of seeing at least this many events (not just exactly
-    # this many), because any count >= recent_count would be equally or more extreme.
-    # This "right tail" probability tells us how surprising the observed spike is
-    # under the baseline rate. We want to include recent_count i.e. P(X >= recent_count),
-    # so passing recent_count - 1.
-    p_value = poisson.sf(recent_count - 1, expected)
-
-    return p_value < POISSON_P_VALUE
+    return bool(find_poisson_spikes([baseline_count], [recent_count])[0])
 
 
 class Command(BaseCommand):
     help = "Unset status of triaged buckets if spike is detected."
 
-    def handle(self, *args: object, **options: object) -> None:
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="print the p-value of each triaged bucket instead of untriaging",
+        )
+
+    def handle(self, *args: object, dry_run: bool = False, **options: object) -> None:
         LOG.info("Starting auto-untriage check")
 
-        untriaged_buckets = self.unset_status_if_spike()
+        untriaged_buckets = self.unset_status_if_spike(dry_run=dry_run)
 
         LOG.info(f"Auto-untriage complete for {untriaged_buckets} buckets.")
 
-    def unset_status_if_spike(self) -> int:
-        """Unset triaged status for cluster buckets experiencing a spike."""
+    def get_bucket_counts(self) -> list[tuple[int, str, int, int]]:
+        """Return (bucket_id, triage_status, recent_count, baseline_count) of the
+        triaged cluster buckets with hits since they were triaged, in one grouped
+        query over BucketHit."""
 
         # Reports are delayed by 1 day, so use the
         # window to the most recent BucketHit instead of today.
@@ -100,48 +122,78 @@ class Command(BaseCommand):
         )
 
         if last_hit is None:
-            return 0
+            return []
 
         now = last_hit.begin
         short_window_start = now - timedelta(days=SHORT_WINDOW)
         long_window_start = now - timedelta(days=LONG_WINDOW)
 
-        triaged_buckets = (
-            Bucket.objects.filter(
-                triage_status__isnull=False,
-                cluster__isnull=False,
-                triaged_at__isnull=False,
-                buckethit__begin__gt=F("triaged_at"),
+        # hits from before the bucket was triaged are not counted, neither in
+        # the recent nor in the baseline window. Daily rows of compacted hours
+        # (see BucketHit.compact()) count from the start of their day.
+        return list(
+            BucketHit.objects.filter(
+                bucket__triage_status__isnull=False,
+                bucket__cluster__isnull=False,
+                begin__gt=F("bucket__triaged_at"),
+                begin__gte=long_window_start,
             )
+            .values("bucket_id", "bucket__triage_status")
             .annotate(
-                recent_count=Sum(
-                    "buckethit__count",
-                    filter=Q(buckethit__begin__gte=short_window_start)
-                    & Q(buckethit__begin__gt=F("triaged_at")),
+                recent_count=Coalesce(
+                    Sum("count", filter=Q(begin__gte=short_window_start)), 0
                 ),
-                baseline_count=Sum(
-                    "buckethit__count",
-                    filter=Q(buckethit__begin__lt=short_window_start)
-                    & Q(buckethit__begin__gte=long_window_start),
+                baseline_count=Coalesce(
+                    Sum("count", filter=Q(begin__lt=short_window_start)), 0
                 ),
             )
-            .distinct()
+            .order_by("bucket_id")
+            .values_list(
+                "bucket_id", "bucket__triage_status", "recent_count", "baseline_count"
+            )
         )
 
-        untriaged_count = 0
+    def unset_status_if_spike(self, dry_run: bool = False) -> int:
+        """Unset triaged status for cluster buckets experiencing a spike.
 
-        for bucket in triaged_buckets:
-            recent_count = bucket.recent_count or 0
-            baseline_count = bucket.baseline_count or 0
-
-            if is_poisson_spike(baseline_count, recent_count):
-                status = bucket.triage_status
-                bucket.triage_status = None
-                bucket.save(update_fields=["triage_status"])
-                untriaged_count += 1
-                LOG.info(
-                    f"Auto-untriaged bucket {bucket.id} ({status}): "
-                    f"spike detected (recent={recent_count}, baseline={baseline_count})"
+        With `dry_run`, the p-value of each bucket is printed and nothing is
+        changed. Returns the number of (would be) untriaged buckets.
+        """
+        rows = self.get_bucket_counts()
+        if not rows:
+            return 0
+
+        bucket_ids, statuses, recent_counts, baseline_counts = zip(*rows, strict=True)
+        p_values = poisson_p_values(baseline_counts, recent_counts)
+        spikes = find_poisson_spikes(baseline_counts, recent_counts)
+
+        if dry_run:
+            for bucket_id, status, recent, baseline, p_value, spike in zip(
+                *(bucket_ids, statuses, recent_counts, baseline_counts),
+                p_values,
+                spikes,
+                strict=True,
+            ):
+                self.stdout.write(
+                    f"bucket {bucket_id} ({status}): recent={recent}, "
+                    f"baseline={baseline}, p={p_value:.4g}"
+                    + (" -> untriage" if spike else "")
                 )
+            return int(spikes.sum())
+
+        untriaged_count = 0
+        with transaction.atomic():
+            for batch in batched(np.flatnonzero(spikes).tolist(), 500):
+                untriaged_count += Bucket.objects.filter(
+                    id__in=[bucket_ids[i] for i in batch], triage_status__isnull=False
+                ).update(triage_status=None)
+                for i in batch:
+                    LOG.info(
+                        f"Auto-untriaged bucket {bucket_ids[i]} ({statuses[i]}): "
+                        f"spike detected (recent={recent_counts[i]}, "
+                        f"baseline={baseline_counts[i]}, p={p_values[i]:.4g})"
+                    )
+        if untriaged_count:
+            DataVersion.bump()
 
         return untriaged_count
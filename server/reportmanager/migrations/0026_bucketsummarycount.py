@@ -0,0 +1,92 @@
+# Generated by Django 6.0.6 on 2026-10-19 06:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+BATCH_SIZE = 1000
+
+PRIVATE_BROWSING_DETAIL = "broken_site_report_tab_info_antitracking_is_private_browsing"
+CONTENT_BLOCKED_DETAIL = (
+    "broken_site_report_tab_info_antitracking_has_tracking_content_blocked"
+)
+
+
+def backfill_summary_counts(apps, schema_editor):
+    ReportEntry = apps.get_model("reportmanager", "ReportEntry")
+    BucketSummaryCount = apps.get_model("reportmanager", "BucketSummaryCount")
+
+    batch = []
+    for entry in ReportEntry.objects.only("id", "details").iterator(
+        chunk_size=BATCH_SIZE
+    ):
+        flags = entry.details.get("boolean") if isinstance(entry.details, dict) else None
+        if not isinstance(flags, dict):
+            continue
+        entry.private_browsing = flags.get(PRIVATE_BROWSING_DETAIL) is True
+        entry.content_blocked = flags.get(CONTENT_BLOCKED_DETAIL) is True
+        if entry.private_browsing or entry.content_blocked:
+            batch.append(entry)
+            if len(batch) >= BATCH_SIZE:
+                ReportEntry.objects.bulk_update(
+                    batch, ["private_browsing", "content_blocked"]
+                )
+                batch = []
+    if batch:
+        ReportEntry.objects.bulk_update(batch, ["private_browsing", "content_blocked"])
+
+    rows = (
+        ReportEntry.objects.filter(bucket__isnull=False)
+        .values("bucket_id", "app_id", "os_id", "private_browsing", "content_blocked")
+        .annotate(count=Count("id"))
+        .order_by()
+    )
+    batch = []
+    for row in rows.iterator(chunk_size=BATCH_SIZE):
+        batch.append(BucketSummaryCount(**row))
+        if len(batch) >= BATCH_SIZE:
+            BucketSummaryCount.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        BucketSummaryCount.objects.bulk_create(batch)
+
+
+def reverse_clear(apps, schema_editor):
+    BucketSummaryCount = apps.get_model("reportmanager", "BucketSummaryCount")
+    BucketSummaryCount.objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reportmanager', '0025_bucketcountryrank_import_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reportentry',
+            name='content_blocked',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='reportentry',
+            name='private_browsing',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='BucketSummaryCount',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('private_browsing', models.BooleanField(default=False)),
+                ('content_blocked', models.BooleanField(default=False)),
+                ('count', models.IntegerField(default=0)),
+                ('app', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='reportmanager.app')),
+                ('bucket', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='reportmanager.bucket')),
+                ('os', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='reportmanager.os')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('bucket', 'app', 'os', 'private_browsing', 'content_blocked'), name='unique_bucketsummarycounts')],
+            },
+        ),
+        migrations.RunPython(backfill_summary_counts, reverse_clear),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 6.0.6 on 2026-10-19 06:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reportmanager', '0026_bucketsummarycount'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='reportentry',
+            index=models.Index(fields=['reported_at', 'bucket'], name='reportmanag_reporte_348ffe_idx'),
+        ),
+    ]
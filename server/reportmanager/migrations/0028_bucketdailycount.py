@@ -0,0 +1,71 @@
+# Generated by Django 6.0.6 on 2026-10-19 06:50
+
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils import timezone
+
+BATCH_SIZE = 1000
+COMMENT_MIN_VALID_PROBABILITY = 0.10
+
+
+def backfill_daily_counts(apps, schema_editor):
+    ReportEntry = apps.get_model("reportmanager", "ReportEntry")
+    BucketDailyCount = apps.get_model("reportmanager", "BucketDailyCount")
+
+    counts = defaultdict(int)
+    reports = ReportEntry.objects.filter(bucket__isnull=False).values_list(
+        "bucket_id", "reported_at", "comments", "ml_valid_probability"
+    )
+    for bucket_id, reported_at, comments, ml_valid_probability in reports.iterator(
+        chunk_size=BATCH_SIZE
+    ):
+        if timezone.is_aware(reported_at):
+            reported_at = timezone.localtime(reported_at)
+        has_comments = bool(
+            comments
+            and comments.strip()
+            and ml_valid_probability
+            and ml_valid_probability > COMMENT_MIN_VALID_PROBABILITY
+        )
+        counts[(bucket_id, reported_at.date(), has_comments)] += 1
+
+    BucketDailyCount.objects.bulk_create(
+        (
+            BucketDailyCount(
+                bucket_id=bucket_id, day=day, has_comments=has_comments, count=count
+            )
+            for (bucket_id, day, has_comments), count in counts.items()
+        ),
+        batch_size=BATCH_SIZE,
+    )
+
+
+def reverse_clear(apps, schema_editor):
+    BucketDailyCount = apps.get_model("reportmanager", "BucketDailyCount")
+    BucketDailyCount.objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reportmanager', '0027_reportentry_reportmanag_reporte_348ffe_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BucketDailyCount',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.IntegerField(default=0)),
+                ('day', models.DateField()),
+                ('has_comments', models.BooleanField(default=False)),
+                ('bucket', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='reportmanager.bucket')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('bucket', 'day', 'has_comments'), name='unique_bucketdailycounts')],
+            },
+        ),
+        migrations.RunPython(backfill_daily_counts, reverse_clear),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 6.0.6 on 2026-10-19 06:52
+
+from django.db import migrations, models
+from django.db.models.functions import Length
+
+BATCH_SIZE = 10000
+
+
+def backfill_comments_length(apps, schema_editor):
+    ReportEntry = apps.get_model("reportmanager", "ReportEntry")
+    last_id = ReportEntry.objects.order_by("-id").values_list("id", flat=True).first()
+    for start in range(0, (last_id or 0) + 1, BATCH_SIZE):
+        ReportEntry.objects.filter(id__gte=start, id__lt=start + BATCH_SIZE).update(
+            comments_length=Length("comments")
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reportmanager', '0028_bucketdailycount'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reportentry',
+            name='comments_length',
+            field=models.PositiveIntegerField(db_index=True, default=0),
+        ),
+        migrations.AddIndex(
+            model_name='reportentry',
+            index=models.Index(fields=['bucket', 'reported_at'], name='reportmanag_bucket__24dc49_idx'),
+        ),
+        migrations.RunPython(backfill_comments_length, migrations.RunPython.noop),
+    ]
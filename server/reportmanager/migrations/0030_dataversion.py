@@ -0,0 +1,30 @@
+# Generated by Django 6.0.6 on 2026-10-19 06:54
+
+from django.db import migrations, models
+
+
+def create_data_version(apps, schema_editor):
+    DataVersion = apps.get_model("reportmanager", "DataVersion")
+    DataVersion.objects.get_or_create(singleton_key=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reportmanager', '0029_reportentry_comments_length'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DataVersion',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('singleton_key', models.PositiveSmallIntegerField(default=1, editable=False, help_text='Singleton key constrained to value 1 by check constraint', unique=True)),
+                ('version', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.CheckConstraint(condition=models.Q(('singleton_key', 1)), name='dataversion_singleton_key_must_be_one')],
+            },
+        ),
+        migrations.RunPython(create_data_version, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 6.0.6 on 2026-10-19 07:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reportmanager', '0030_dataversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportWatermark',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(choices=[('bigquery', 'BigQuery')], max_length=50, unique=True)),
+                ('reported_at', models.DateTimeField()),
+                ('boundary_uuids', models.JSONField(default=list)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
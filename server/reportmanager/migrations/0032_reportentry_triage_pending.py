@@ -0,0 +1,18 @@
+# Generated by Django 6.0.6 on 2026-10-19 07:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reportmanager', '0031_importwatermark'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reportentry',
+            name='triage_pending',
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+    ]
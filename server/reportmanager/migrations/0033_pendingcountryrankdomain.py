@@ -0,0 +1,21 @@
+# Generated by Django 6.0.6 on 2026-10-19 07:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reportmanager', '0032_reportentry_triage_pending'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingCountryRankDomain',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('domain', models.CharField(max_length=255, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 6.0.6 on 2026-10-19 07:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reportmanager', '0033_pendingcountryrankdomain'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='buckethit',
+            name='unique_buckethits',
+        ),
+        migrations.AddField(
+            model_name='buckethit',
+            name='resolution',
+            field=models.CharField(choices=[('hour', 'Hour'), ('day', 'Day')], default='hour', max_length=4),
+        ),
+        migrations.AddConstraint(
+            model_name='buckethit',
+            constraint=models.UniqueConstraint(fields=('bucket', 'begin', 'resolution'), name='unique_buckethits'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 6.0.6 on 2026-10-19 07:38
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reportmanager', '0034_buckethit_resolution'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JobLockHolder',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(max_length=50)),
+                ('key', models.CharField(blank=True, max_length=255)),
+                ('mode', models.CharField(choices=[('shared', 'Shared'), ('exclusive', 'Exclusive')], max_length=10)),
+                ('lock_name', models.CharField(choices=[('clustering', 'Clustering'), ('cleanup', 'Cleanup'), ('backfill', 'Backfill')], help_text='Name of operation holding the lock', max_length=50)),
+                ('token', models.UUIDField(db_index=True)),
+                ('acquired_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('acquired_by', models.CharField(help_text='hostname:pid of process holding lock', max_length=255)),
+                ('heartbeat_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['scope', 'key'], name='reportmanag_scope_5acf8b_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,47 @@
+import json
+
+from django.db import migrations
+
+BATCH_SIZE = 1000
+
+
+def populate_bucket_cluster(apps, schema_editor):
+    """Link the cluster buckets created before Bucket.cluster existed to their
+    cluster, which is only recorded in their signature."""
+    Bucket = apps.get_model("reportmanager", "Bucket")
+    Cluster = apps.get_model("reportmanager", "Cluster")
+    qs = Bucket.objects.filter(
+        cluster__isnull=True, description__contains="[Cluster"
+    ).only("id", "signature", "cluster_id")
+
+    cluster_ids = set(Cluster.objects.values_list("id", flat=True))
+    batch = []
+    for bucket in qs.iterator(chunk_size=BATCH_SIZE):
+        try:
+            symptoms = json.loads(bucket.signature)["symptoms"]
+        except (ValueError, KeyError, TypeError):
+            continue
+        for symptom in symptoms:
+            if symptom.get("type") != "cluster_id":
+                continue
+            cluster_id = int(symptom["value"])
+            if cluster_id in cluster_ids:
+                bucket.cluster_id = cluster_id
+                batch.append(bucket)
+            break
+        if len(batch) >= BATCH_SIZE:
+            Bucket.objects.bulk_update(batch, ["cluster_id"])
+            batch = []
+    if batch:
+        Bucket.objects.bulk_update(batch, ["cluster_id"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("reportmanager", "0035_joblockholder"),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_bucket_cluster, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.6 on 2026-10-19 07:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reportmanager', '0036_populate_bucket_cluster'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bucket',
+            name='default_for_domain',
+            field=models.CharField(blank=True, max_length=255, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 6.0.6 on 2026-10-19 08:22
+
+from collections import defaultdict
+
+from django.db import migrations
+from django.db.models import F
+from django.utils import timezone
+
+BATCH_SIZE = 1000
+COMMENT_MIN_VALID_PROBABILITY = 0.10
+
+
+def count_whitespace_comments(apps, schema_editor, has_comments):
+    """Move the daily counts of the reports with whitespace-only comments to
+    `has_comments`: they are now told apart by comments_length only."""
+    ReportEntry = apps.get_model("reportmanager", "ReportEntry")
+    BucketDailyCount = apps.get_model("reportmanager", "BucketDailyCount")
+
+    counts = defaultdict(int)
+    reports = ReportEntry.objects.filter(
+        bucket__isnull=False,
+        comments_length__gt=0,
+        comments__regex=r"^\s*$",
+        ml_valid_probability__gt=COMMENT_MIN_VALID_PROBABILITY,
+    ).values_list("bucket_id", "reported_at")
+    for bucket_id, reported_at in reports.iterator(chunk_size=BATCH_SIZE):
+        if timezone.is_aware(reported_at):
+            reported_at = timezone.localtime(reported_at)
+        counts[(bucket_id, reported_at.date())] += 1
+
+    for (bucket_id, day), count in counts.items():
+        BucketDailyCount.objects.filter(
+            bucket_id=bucket_id, day=day, has_comments=not has_comments
+        ).update(count=F("count") - count)
+        row, _ = BucketDailyCount.objects.get_or_create(
+            bucket_id=bucket_id, day=day, has_comments=has_comments
+        )
+        BucketDailyCount.objects.filter(pk=row.pk).update(count=F("count") + count)
+
+
+def forwards(apps, schema_editor):
+    count_whitespace_comments(apps, schema_editor, True)
+
+
+def backwards(apps, schema_editor):
+    count_whitespace_comments(apps, schema_editor, False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reportmanager', '0037_bucket_default_for_domain'),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, backwards),
+    ]
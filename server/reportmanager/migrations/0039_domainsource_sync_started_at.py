@@ -0,0 +1,18 @@
+# Generated by Django 6.0.6 on 2026-10-19 08:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reportmanager', '0038_bucketdailycount_whitespace_comments'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='domainsource',
+            name='sync_started_at',
+            field=models.DateTimeField(null=True),
+        ),
+    ]
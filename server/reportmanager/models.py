@@ -2,13 +2,18 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 import json
+import operator
 import re
+import threading
 from collections import defaultdict
+from contextlib import contextmanager
 from dataclasses import dataclass
-from datetime import datetime, timedelta
+from datetime import UTC, datetime, timedelta
+from functools import reduce
 from itertools import batched
 from logging import getLogger
 from urllib.parse import urlsplit
+from uuid import UUID
 
 from django.conf import settings
 from django.contrib.auth.models import Permission
@@ -16,8 +21,8 @@ from django.contrib.auth.models import User as DjangoUser
 from django.contrib.contenttypes.models import ContentType
 from django.core.management import call_command
 from django.core.validators import MaxValueValidator, MinValueValidator
-from django.db import models, transaction
-from django.db.models.functions import Length
+from django.db import IntegrityError, connection, models, transaction
+from django.db.models.functions import Greatest, Length, TruncHour
 from django.db.models.signals import post_delete, post_save
 from django.dispatch.dispatcher import receiver
 from django.utils import timezone
@@ -29,6 +34,15 @@ from webcompat.symptoms import URLSymptom, ValueMatcher
 
 LOG = getLogger("reportmanager")
 
+# keys in the "boolean" section of report details extracted into ReportEntry columns
+PRIVATE_BROWSING_DETAIL = "broken_site_report_tab_info_antitracking_is_private_browsing"
+CONTENT_BLOCKED_DETAIL = (
+    "broken_site_report_tab_info_antitracking_has_tracking_content_blocked"
+)
+
+# marks the description of buckets created by clustering
+CLUSTER_BUCKET_IDENTIFIER = "[Cluster"
+
 
 # these enable `{field}__length` filtering in Django
 models.CharField.register_lookup(Length)
@@ -93,6 +107,11 @@ class Bucket(models.Model):
         related_name="buckets",
         db_index=True,
     )
+    # set on the default bucket of a domain created by DomainBucketCache ("" for
+    # reports without domain), so that concurrent imports create only one
+    default_for_domain: models.CharField = models.CharField(
+        max_length=255, null=True, blank=True, unique=True
+    )
 
     class Meta(TypedModelMeta):
         constraints = (
@@ -214,27 +233,26 @@ class Bucket(models.Model):
         if submit_save:
             UPDATE_BATCH_SIZE = 500
             for entry_ids_batch in batched(in_list, UPDATE_BATCH_SIZE):
+                counter_deltas = BucketCounterDeltas()
                 for report in ReportEntry.objects.filter(pk__in=entry_ids_batch).values(
-                    "bucket_id",
-                    "reported_at",
+                    "bucket_id", *BucketCounterDeltas.REPORT_FIELDS
                 ):
                     if report["bucket_id"] != self.id:
-                        if report["bucket_id"] is not None:
-                            BucketHit.decrement_count(
-                                report["bucket_id"],
-                                report["reported_at"],
-                            )
-                        BucketHit.increment_count(self.id, report["reported_at"])
-                ReportEntry.objects.filter(pk__in=entry_ids_batch).update(bucket=self)
+                        counter_deltas.move(report["bucket_id"], self.id, report)
+                ReportEntry.objects.filter(pk__in=entry_ids_batch).update(
+                    bucket=self, triage_pending=False
+                )
+                counter_deltas.apply()
             for entry_ids_batch in batched(out_list, UPDATE_BATCH_SIZE):
+                counter_deltas = BucketCounterDeltas()
                 for report in ReportEntry.objects.filter(pk__in=entry_ids_batch).values(
-                    "bucket_id", "reported_at"
+                    "bucket_id", *BucketCounterDeltas.REPORT_FIELDS
                 ):
                     if report["bucket_id"] is not None:
-                        BucketHit.decrement_count(
-                            report["bucket_id"], report["reported_at"]
-                        )
+                        counter_deltas.add(report["bucket_id"], report, -1)
                 ReportEntry.objects.filter(pk__in=entry_ids_batch).update(bucket=None)
+                counter_deltas.apply()
+            DataVersion.bump()
 
         return in_list, out_list, in_list_count, out_list_count, next_offset
 
@@ -326,24 +344,74 @@ class Bucket(models.Model):
         return None
 
 
+class NewBucketLabeling(threading.local):
+    """Buffer of newly created buckets waiting to be labeled.
+
+    Buckets created in the same transaction, or within `deferred()`, are labeled
+    together by one batched `label_buckets` run once committed, instead of one
+    task per bucket. Buckets of rolled back transactions stay buffered until the
+    next flush, where they are skipped as missing.
+    """
+
+    # maximum number of buckets per labeling task
+    BATCH_SIZE = 1000
+
+    def __init__(self):
+        self.bucket_ids: set[int] = set()
+        self.deferred_depth = 0
+        # outermost atomic block of the transaction the flush was scheduled in,
+        # until it runs (a rolled back transaction never runs it)
+        self.scheduled_in = None
+
+    def add(self, bucket_id: int) -> None:
+        self.bucket_ids.add(bucket_id)
+        if not self.deferred_depth:
+            self.schedule_flush()
+
+    def schedule_flush(self) -> None:
+        """Flush once the current transaction commits (right away outside of
+        one), registering a single hook per transaction."""
+        if not connection.in_atomic_block:
+            self.flush()
+            return
+        transaction_block = connection.atomic_blocks[0]
+        if self.scheduled_in is not transaction_block:
+            self.scheduled_in = transaction_block
+            transaction.on_commit(self.flush)
+
+    @contextmanager
+    def deferred(self):
+        """Hold back labeling of the buckets created in this block until it
+        exits."""
+        self.deferred_depth += 1
+        try:
+            yield
+        finally:
+            self.deferred_depth -= 1
+            if not self.deferred_depth:
+                self.schedule_flush()
+
+    def flush(self) -> None:
+        self.scheduled_in = None
+        bucket_ids, self.bucket_ids = sorted(self.bucket_ids), set()
+        for batch in batched(bucket_ids, self.BATCH_SIZE):
+            if getattr(settings, "USE_CELERY", None):
+                from reportmanager.tasks import label_buckets
+
+                label_buckets.apply_async((list(batch),))
+            else:
+                call_command("label_buckets", bucket_ids=list(batch))
+
+
+new_bucket_labeling = NewBucketLabeling()
+
+
 @receiver(post_save, sender=Bucket)
 def Bucket_save(sender, instance, created, **kwargs):
     if not created or not instance.domain_normalized:
         return
 
-    if getattr(settings, "USE_CELERY", None):
-        bucket_pk = instance.pk
-
-        def enqueue_label_bucket() -> None:
-            from reportmanager.tasks import label_bucket
-
-            label_bucket.apply_async((bucket_pk,))
-
-        transaction.on_commit(enqueue_label_bucket)
-    else:
-        transaction.on_commit(
-            lambda: call_command("label_buckets", bucket_id=instance.pk)
-        )
+    new_bucket_labeling.add(instance.pk)
 
 
 class BucketColor(models.Model):
@@ -392,7 +460,17 @@ def buckethit_default_range_begin():
     return timezone.now().replace(microsecond=0, second=0, minute=0)
 
 
+class BucketHitResolution(models.TextChoices):
+    HOUR = "hour"
+    DAY = "day"
+
+
 class BucketHit(models.Model):
+    """Number of reports of a bucket per hour, or per (UTC) day for the hours
+    older than COMPACT_BUCKET_HITS_AFTER_DAYS once they were compacted, see
+    `compact()`. Readers sum the rows of both resolutions.
+    """
+
     bucket: models.ForeignKey = models.ForeignKey(
         Bucket, on_delete=models.deletion.CASCADE
     )
@@ -400,82 +478,500 @@ class BucketHit(models.Model):
         default=buckethit_default_range_begin
     )
     count: models.IntegerField = models.IntegerField(default=0)
+    resolution: models.CharField = models.CharField(
+        max_length=4,
+        choices=BucketHitResolution.choices,
+        default=BucketHitResolution.HOUR,
+    )
+
+    @staticmethod
+    def get_begin(reported_at: datetime) -> datetime:
+        """Return the start of the hour counting a report from `reported_at`."""
+        return reported_at.replace(microsecond=0, second=0, minute=0)
+
+    @staticmethod
+    def get_day(begin: datetime) -> datetime:
+        """Return the start of the UTC day of `begin`."""
+        return begin.astimezone(UTC).replace(hour=0, minute=0, second=0, microsecond=0)
+
+    @classmethod
+    def get_compaction_horizon(cls) -> datetime:
+        """Return the start of the first day whose hours are kept, the hours
+        before it are (to be) folded into daily rows."""
+        days = getattr(settings, "COMPACT_BUCKET_HITS_AFTER_DAYS", 14)
+        return cls.get_day(timezone.now() - timedelta(days=days))
+
+    @classmethod
+    def get_history(
+        cls, bucket_ids: list[int], since: datetime
+    ) -> dict[int, list[dict]]:
+        """Return the `{"begin", "count"}` history of each bucket since `since`,
+        hourly for recent hours and daily before the compaction horizon (hours
+        that were not compacted yet are merged into their day)."""
+        horizon = cls.get_compaction_horizon()
+        if since < horizon:
+            since = cls.get_day(since)
+
+        history: dict[int, dict[datetime, int]] = defaultdict(lambda: defaultdict(int))
+        for bucket_id, begin, count in (
+            cls.objects.filter(bucket_id__in=bucket_ids, begin__gte=since)
+            .order_by("begin")
+            .values_list("bucket_id", "begin", "count")
+        ):
+            if begin < horizon:
+                begin = cls.get_day(begin)
+            history[bucket_id][begin] += count
+
+        return {
+            bucket_id: [
+                {"begin": begin, "count": count}
+                for begin, count in sorted(counts.items())
+            ]
+            for bucket_id, counts in history.items()
+        }
 
     @classmethod
-    @transaction.atomic
     def decrement_count(cls, bucket_id, begin):
-        begin = begin.replace(microsecond=0, second=0, minute=0)
-        counter = (
-            cls.objects.select_for_update()
-            .filter(
-                bucket_id=bucket_id,
-                begin=begin,
-            )
-            .first()
-        )
-        if counter is not None and counter.count > 0:
-            counter.count -= 1
-            counter.save()
+        cls.bulk_adjust_counts({(bucket_id, cls.get_begin(begin)): -1})
 
     @classmethod
-    @transaction.atomic
     def increment_count(cls, bucket_id, begin):
-        begin = begin.replace(microsecond=0, second=0, minute=0)
-        counter, _ = cls.objects.select_for_update().get_or_create(
-            bucket_id=bucket_id, begin=begin
-        )
-        counter.count += 1
-        counter.save()
+        cls.bulk_adjust_counts({(bucket_id, cls.get_begin(begin)): 1})
 
     @classmethod
-    @transaction.atomic
     def bulk_increment_counts(cls, bucket_hits: list[tuple[int, datetime]]) -> None:
         """Bulk increment BucketHit counts for multiple reports."""
-        if not bucket_hits:
-            return
-
-        # Aggregate counts of reports per bucket_id per hour
-        buckethit_updates: dict[tuple[int, datetime], int] = defaultdict(int)
-        bucket_ids: set[int] = set()
-        begins: set[datetime] = set()
+        deltas: dict[tuple[int, datetime], int] = defaultdict(int)
+        for bucket_id, reported_at in bucket_hits:
+            deltas[(bucket_id, cls.get_begin(reported_at))] += 1
+        cls.bulk_adjust_counts(deltas)
 
+    @classmethod
+    def bulk_decrement_counts(cls, bucket_hits: list[tuple[int, datetime]]) -> None:
+        """Bulk decrement BucketHit counts for multiple reports."""
+        deltas: dict[tuple[int, datetime], int] = defaultdict(int)
         for bucket_id, reported_at in bucket_hits:
-            normalized_time = reported_at.replace(microsecond=0, second=0, minute=0)
-            buckethit_updates[(bucket_id, normalized_time)] += 1
-            bucket_ids.add(bucket_id)
-            begins.add(normalized_time)
-
-        existing = {
-            (h.bucket_id, h.begin): h  # type: ignore[attr-defined]
-            for h in cls.objects.select_for_update().filter(
-                bucket_id__in=bucket_ids, begin__in=begins
+            deltas[(bucket_id, cls.get_begin(reported_at))] -= 1
+        cls.bulk_adjust_counts(deltas)
+
+    @classmethod
+    @transaction.atomic
+    def bulk_adjust_counts(
+        cls,
+        deltas: dict[tuple[int, datetime], int],
+        resolution: str = BucketHitResolution.HOUR,
+    ) -> None:
+        """Apply count deltas (positive or negative) to the rows keyed by
+        (bucket_id, begin), with `begin` on the hour (or on the UTC day, for
+        daily rows).
+
+        Each batch takes one insert of the missing rows and one update adding
+        the deltas in the database, instead of reading and writing back locked
+        rows, so concurrent writers only wait for each other's updates. Counts
+        do not go below zero, except for the hours before the compaction
+        horizon: these may have been folded into their day already, so their
+        deltas are kept as they are until the next `compact()`.
+        """
+        # a stable order of the row locks avoids deadlocks between writers
+        deltas = {key: delta for key, delta in sorted(deltas.items()) if delta}
+        horizon = (
+            cls.get_compaction_horizon()
+            if resolution == BucketHitResolution.HOUR
+            else None
+        )
+
+        for keys in batched(deltas, 500):
+            cls.objects.bulk_create(
+                [
+                    cls(
+                        bucket_id=bucket_id, begin=begin, count=0, resolution=resolution
+                    )
+                    for bucket_id, begin in keys
+                    if deltas[(bucket_id, begin)] > 0
+                    or (horizon is not None and begin < horizon)
+                ],
+                ignore_conflicts=True,
             )
-        }
+            count = models.F("count") + models.Case(
+                *(
+                    models.When(
+                        bucket_id=bucket_id,
+                        begin=begin,
+                        then=models.Value(deltas[(bucket_id, begin)]),
+                    )
+                    for bucket_id, begin in keys
+                ),
+                default=models.Value(0),
+            )
+            cls.objects.filter(
+                reduce(
+                    operator.or_,
+                    (
+                        models.Q(bucket_id=bucket_id, begin=begin)
+                        for bucket_id, begin in keys
+                    ),
+                ),
+                resolution=resolution,
+            ).update(
+                count=(
+                    models.Case(
+                        models.When(begin__lt=horizon, then=count),
+                        default=Greatest(count, models.Value(0)),
+                    )
+                    if horizon is not None
+                    else Greatest(count, models.Value(0))
+                )
+            )
+
+    @classmethod
+    def compact(cls, batch_size: int = 1000) -> int:
+        """Fold the hourly rows before the compaction horizon into daily rows,
+        and return the number of folded rows.
+
+        The hourly rows are locked and deleted batch by batch, with their sums
+        added to the daily rows in the same transaction, so concurrent updates
+        are either folded or wait and create a new hourly row, which the next
+        run folds. Daily rows left at zero are removed.
+        """
+        rows = cls.objects.filter(
+            resolution=BucketHitResolution.HOUR,
+            begin__lt=cls.get_compaction_horizon(),
+        ).order_by("id")
+
+        folded = 0
+        last_id = 0
+        while True:
+            with transaction.atomic():
+                batch = list(
+                    rows.filter(id__gt=last_id)
+                    .select_for_update()
+                    .values_list("id", "bucket_id", "begin", "count")[:batch_size]
+                )
+                if not batch:
+                    break
+                last_id = batch[-1][0]
+
+                deltas: dict[tuple[int, datetime], int] = defaultdict(int)
+                for _, bucket_id, begin, count in batch:
+                    deltas[(bucket_id, cls.get_day(begin))] += count
+                cls.objects.filter(id__in=[row[0] for row in batch]).delete()
+                cls.bulk_adjust_counts(deltas, BucketHitResolution.DAY)
+                cls.objects.filter(
+                    reduce(
+                        operator.or_,
+                        (
+                            models.Q(bucket_id=bucket_id, begin=begin)
+                            for bucket_id, begin in deltas
+                        ),
+                    ),
+                    resolution=BucketHitResolution.DAY,
+                    count=0,
+                ).delete()
+            folded += len(batch)
+        return folded
+
+    class Meta(TypedModelMeta):
+        constraints = (
+            models.UniqueConstraint(
+                fields=["bucket", "begin", "resolution"],
+                name="unique_buckethits",
+            ),
+        )
+
+
+class BucketCounter(models.Model):
+    """Base for report counts kept per bucket and a few report dimensions.
+
+    Subclasses declare their dimensions in KEY_FIELDS, and the ReportEntry fields
+    needed to derive them in REPORT_FIELDS, overriding `get_report_key()` if they
+    are not the same fields.
+    Rows are adjusted whenever reports enter or leave a bucket, see
+    BucketCounterDeltas.
+    """
+
+    # dimensions of a counter row, besides the bucket
+    KEY_FIELDS: tuple[str, ...] = ()
+    # ReportEntry fields needed by get_report_key()
+    REPORT_FIELDS: tuple[str, ...] = ()
+
+    bucket: models.ForeignKey = models.ForeignKey(
+        Bucket, on_delete=models.deletion.CASCADE
+    )
+    count: models.IntegerField = models.IntegerField(default=0)
+
+    class Meta(TypedModelMeta):
+        abstract = True
+
+    @classmethod
+    def get_report_key(cls, report: dict) -> tuple:
+        """Return the KEY_FIELDS values for a report given as a REPORT_FIELDS dict."""
+        return tuple(report[field] for field in cls.KEY_FIELDS)
+
+    @classmethod
+    def get_key(cls, bucket_id: int, report) -> tuple:
+        """Build the counter key for a report (a ReportEntry or a `.values()` dict
+        including REPORT_FIELDS) counted in `bucket_id`.
+        """
+        if not isinstance(report, dict):
+            report = {field: getattr(report, field) for field in cls.REPORT_FIELDS}
+        return (bucket_id, *cls.get_report_key(report))
+
+    @classmethod
+    @transaction.atomic
+    def bulk_adjust_counts(cls, deltas: dict[tuple, int]) -> None:
+        """Apply count deltas (positive or negative) to counter rows."""
+        deltas = {key: delta for key, delta in deltas.items() if delta}
+        if not deltas:
+            return
 
         to_update: list = []
         to_create: list = []
 
-        for (bucket_id, begin), count in buckethit_updates.items():
-            if (bucket_id, begin) in existing:
-                hit = existing[(bucket_id, begin)]
-                hit.count += count
-                to_update.append(hit)
-            else:
-                to_create.append(cls(bucket_id=bucket_id, begin=begin, count=count))
+        for keys in batched(deltas, 500):
+            lookups = {
+                f"{field}__in": {key[idx] for key in keys}
+                for idx, field in enumerate(("bucket_id", *cls.KEY_FIELDS))
+            }
+            existing = {
+                (
+                    row.bucket_id,  # type: ignore[attr-defined]
+                    *(getattr(row, field) for field in cls.KEY_FIELDS),
+                ): row
+                for row in cls.objects.select_for_update().filter(**lookups)
+            }
+            for key in keys:
+                delta = deltas[key]
+                if key in existing:
+                    row = existing[key]
+                    row.count = max(row.count + delta, 0)
+                    to_update.append(row)
+                elif delta > 0:
+                    to_create.append(
+                        cls(
+                            bucket_id=key[0],
+                            count=delta,
+                            **dict(zip(cls.KEY_FIELDS, key[1:], strict=True)),
+                        )
+                    )
 
         if to_update:
-            cls.objects.bulk_update(to_update, ["count"])
+            cls.objects.bulk_update(to_update, ["count"], batch_size=500)
         if to_create:
-            cls.objects.bulk_create(to_create)
+            cls.objects.bulk_create(to_create, batch_size=500)
+
+
+class BucketSummaryCount(BucketCounter):
+    """Number of reports in a bucket per app, OS and privacy flags.
+
+    These rows back the summary shown on the bucket view, so the summary can be
+    built from the handful of rows belonging to one bucket instead of
+    aggregating over all of its reports.
+    """
+
+    KEY_FIELDS = ("app_id", "os_id", "private_browsing", "content_blocked")
+    REPORT_FIELDS = KEY_FIELDS
+
+    app: models.ForeignKey = models.ForeignKey(App, on_delete=models.deletion.CASCADE)
+    os: models.ForeignKey = models.ForeignKey("OS", on_delete=models.deletion.CASCADE)
+    private_browsing: models.BooleanField = models.BooleanField(default=False)
+    content_blocked: models.BooleanField = models.BooleanField(default=False)
 
     class Meta(TypedModelMeta):
         constraints = (
             models.UniqueConstraint(
-                fields=["bucket", "begin"],
-                name="unique_buckethits",
+                fields=[
+                    "bucket",
+                    "app",
+                    "os",
+                    "private_browsing",
+                    "content_blocked",
+                ],
+                name="unique_bucketsummarycounts",
             ),
         )
 
+    @classmethod
+    def summarize(cls, bucket_id: int) -> dict:
+        """Build the bucket view summary from the summary rows of one bucket."""
+        total = pbm_count = blocked_count = 0
+        os_counts: dict[str, int] = defaultdict(int)
+        desktop_browser_versions: dict[str, int] = defaultdict(int)
+        mobile_browser_versions: dict[str, int] = defaultdict(int)
+
+        for (
+            os_name,
+            app_name,
+            app_version,
+            private_browsing,
+            content_blocked,
+            count,
+        ) in cls.objects.filter(bucket_id=bucket_id, count__gt=0).values_list(
+            "os__name",
+            "app__name",
+            "app__version",
+            "private_browsing",
+            "content_blocked",
+            "count",
+        ):
+            os_name = os_name or "Unknown"
+            major = (app_version or "Unknown").split(".")[0]
+            key = f"{app_name or 'Unknown'} {major}"
+
+            total += count
+            os_counts[os_name] += count
+            if os_name.lower() == "android":
+                mobile_browser_versions[key] += count
+            else:
+                desktop_browser_versions[key] += count
+            if private_browsing:
+                pbm_count += count
+            if content_blocked:
+                blocked_count += count
+
+        mobile_os = {k: v for k, v in os_counts.items() if k.lower() == "android"}
+        desktop_os = {k: v for k, v in os_counts.items() if k.lower() != "android"}
+
+        return {
+            "total": total,
+            "desktop": {
+                "total": sum(desktop_os.values()),
+                "os": desktop_os,
+                "browser_versions": dict(desktop_browser_versions),
+            },
+            "mobile": {
+                "total": sum(mobile_os.values()),
+                "os": mobile_os,
+                "browser_versions": dict(mobile_browser_versions),
+            },
+            "pbm_enabled": pbm_count,
+            "content_blocked": blocked_count,
+        }
+
+
+class BucketDailyCount(BucketCounter):
+    """Number of reports in a bucket per day, split by whether they have a usable
+    comment. Spike detection compares these over short and long windows.
+    """
+
+    KEY_FIELDS = ("day", "has_comments")
+    REPORT_FIELDS = ("reported_at", "comments_length", "ml_valid_probability")
+
+    # reports at or below this ML valid probability don't count as commented
+    COMMENT_MIN_VALID_PROBABILITY = 0.10
+
+    day: models.DateField = models.DateField()
+    has_comments: models.BooleanField = models.BooleanField(default=False)
+
+    class Meta(TypedModelMeta):
+        constraints = (
+            models.UniqueConstraint(
+                fields=["bucket", "day", "has_comments"],
+                name="unique_bucketdailycounts",
+            ),
+        )
+
+    @classmethod
+    def get_report_key(cls, report: dict) -> tuple:
+        reported_at = report["reported_at"]
+        if timezone.is_aware(reported_at):
+            reported_at = timezone.localtime(reported_at)
+        return (
+            reported_at.date(),
+            cls.is_commented(report["comments_length"], report["ml_valid_probability"]),
+        )
+
+    @classmethod
+    def is_commented(cls, comments_length: int, ml_valid_probability) -> bool:
+        # derived from the stored length, so that counting does not load comments
+        return bool(
+            comments_length
+            and ml_valid_probability
+            and ml_valid_probability > cls.COMMENT_MIN_VALID_PROBABILITY
+        )
+
+
+class BucketCounterDeltas:
+    """Collects changes to BucketHit and all BucketCounter tables as reports
+    enter or leave buckets, and to ReportHit as reports are created or deleted,
+    and applies them in bulk.
+
+    Reports can be given as ReportEntry instances or as `.values()` dicts
+    including REPORT_FIELDS.
+    """
+
+    COUNTERS: tuple[type[BucketCounter], ...] = (BucketSummaryCount, BucketDailyCount)
+    REPORT_FIELDS = tuple(
+        dict.fromkeys(
+            field
+            for fields in (("reported_at",), *(c.REPORT_FIELDS for c in COUNTERS))
+            for field in fields
+        )
+    )
+
+    _deferred = threading.local()
+
+    def __init__(self) -> None:
+        self.reports: dict[datetime, int] = defaultdict(int)
+        self.hits: dict[tuple[int, datetime], int] = defaultdict(int)
+        self.deltas: dict[type[BucketCounter], dict[tuple, int]] = {
+            counter: defaultdict(int) for counter in self.COUNTERS
+        }
+
+    @staticmethod
+    def get_reported_at(report) -> datetime:
+        return report["reported_at"] if isinstance(report, dict) else report.reported_at
+
+    def add(self, bucket_id: int, report, delta: int = 1) -> None:
+        reported_at = self.get_reported_at(report)
+        self.hits[(bucket_id, BucketHit.get_begin(reported_at))] += delta
+        for counter, deltas in self.deltas.items():
+            deltas[counter.get_key(bucket_id, report)] += delta
+
+    def add_report(self, report, delta: int = 1) -> None:
+        """Count a created report in ReportHit (or a deleted one, with a delta of
+        -1), bucketed or not."""
+        reported_at = self.get_reported_at(report).astimezone(UTC)
+        self.reports[ReportHit.get_period(reported_at)] += delta
+
+    def move(self, old_bucket_id: int | None, new_bucket_id: int | None, report):
+        if old_bucket_id is not None:
+            self.add(old_bucket_id, report, -1)
+        if new_bucket_id is not None:
+            self.add(new_bucket_id, report, 1)
+
+    def apply(self) -> None:
+        if self.reports:
+            ReportHit.bulk_adjust_counts(self.reports)
+            self.reports.clear()
+        if self.hits:
+            BucketHit.bulk_adjust_counts(self.hits)
+            self.hits.clear()
+        for counter, deltas in self.deltas.items():
+            if deltas:
+                counter.bulk_adjust_counts(deltas)
+                deltas.clear()
+
+    @classmethod
+    def current(cls) -> "BucketCounterDeltas | None":
+        """Return the deltas collected by the innermost `deferred()` block."""
+        return getattr(cls._deferred, "deltas", None)
+
+    @classmethod
+    @contextmanager
+    def deferred(cls):
+        """Collect the changes made by deleting single reports in this block (see
+        `ReportEntry_delete`) and apply them together when it exits."""
+        outer = cls.current()
+        if outer is not None:
+            yield outer
+            return
+        cls._deferred.deltas = deltas = cls()
+        try:
+            yield deltas
+            deltas.apply()
+        finally:
+            cls._deferred.deltas = None
+
 
 class BucketWatch(models.Model):
     user: models.ForeignKey = models.ForeignKey(
@@ -568,6 +1064,9 @@ class JobLock(models.Model):
     Prevents race conditions between operations like clustering and cleanup
     that could interfere with each other (e.g., cleanup deleting reports
     that clustering is about to use as centroids).
+
+    The row is a global lock on its own, and also serializes the acquisition of
+    the scoped locks held in JobLockHolder (see reportmanager.locking).
     """
 
     class LockTypes(models.TextChoices):
@@ -623,6 +1122,150 @@ class JobLock(models.Model):
         self.save()
 
 
+class JobLockHolder(models.Model):
+    """A lock held by an operation on a scope, e.g. `("domain", "example.com")`,
+    or on the whole scope with an empty key.
+
+    Locks on the same scope conflict if their keys are equal or either key is
+    empty, unless both are shared. Holders refresh `heartbeat_at` while they
+    run, and are dropped once they missed their heartbeats for STALE_AFTER.
+    """
+
+    class Modes(models.TextChoices):
+        SHARED = "shared", "Shared"
+        EXCLUSIVE = "exclusive", "Exclusive"
+
+    HEARTBEAT_INTERVAL = timedelta(minutes=1)
+    STALE_AFTER = timedelta(minutes=10)
+
+    scope: models.CharField = models.CharField(max_length=50)
+    key: models.CharField = models.CharField(max_length=255, blank=True)
+    mode: models.CharField = models.CharField(max_length=10, choices=Modes.choices)
+    lock_name: models.CharField = models.CharField(
+        max_length=50,
+        choices=JobLock.LockTypes.choices,
+        help_text="Name of operation holding the lock",
+    )
+    # identifies the locks taken together, to renew and release them
+    token: models.UUIDField = models.UUIDField(db_index=True)
+    acquired_at: models.DateTimeField = models.DateTimeField(default=timezone.now)
+    acquired_by: models.CharField = models.CharField(
+        max_length=255, help_text="hostname:pid of process holding lock"
+    )
+    heartbeat_at: models.DateTimeField = models.DateTimeField(default=timezone.now)
+
+    class Meta(TypedModelMeta):
+        indexes = [
+            models.Index(fields=["scope", "key"]),
+        ]
+
+    def conflicts_with(self, scope: str, key: str, mode: str) -> bool:
+        return (
+            self.scope == scope
+            and (not self.key or not key or self.key == key)
+            and not (self.mode == mode == self.Modes.SHARED)
+        )
+
+    def is_stale(self) -> bool:
+        return self.heartbeat_at < timezone.now() - self.STALE_AFTER
+
+
+class DataVersion(models.Model):
+    """Version of the report and bucket data served by the API.
+
+    It only ever increases, and is bumped by everything that changes what the
+    bucket and report endpoints return (imports, triage, reassignment, cleanup,
+    bucket edits, ...). API responses are cached and tagged with it, see
+    `reportmanager.views.cached_by_data_version`.
+    """
+
+    singleton_key: models.PositiveSmallIntegerField = models.PositiveSmallIntegerField(
+        default=1,
+        unique=True,
+        editable=False,
+        help_text="Singleton key constrained to value 1 by check constraint",
+    )
+    version: models.BigIntegerField = models.BigIntegerField(default=0)
+
+    class Meta(TypedModelMeta):
+        constraints = (
+            models.CheckConstraint(
+                condition=models.Q(singleton_key=1),
+                name="dataversion_singleton_key_must_be_one",
+            ),
+        )
+
+    @classmethod
+    def get_version(cls) -> int:
+        return (
+            cls.objects.filter(singleton_key=1)
+            .values_list("version", flat=True)
+            .first()
+        ) or 0
+
+    @classmethod
+    def bump(cls) -> None:
+        if not cls.objects.filter(singleton_key=1).update(
+            version=models.F("version") + 1
+        ):
+            cls.objects.get_or_create(singleton_key=1, defaults={"version": 1})
+
+    @classmethod
+    def bump_on_commit(cls) -> None:
+        """Bump the version once the current transaction commits (right away
+        outside of one). The row stays unlocked until then, so that concurrent
+        transactions do not wait for each other on it. A transaction saving
+        several objects bumps it several times, which is harmless.
+        """
+        transaction.on_commit(cls.bump)
+
+
+class ImportWatermark(models.Model):
+    """Position of the last report import from a source.
+
+    Holds the newest `reported_at` imported and the UUIDs of the reports at exactly
+    that time, so that the next import can start at the watermark and skip the
+    reports at the boundary without looking them up.
+    """
+
+    class Sources(models.TextChoices):
+        BIGQUERY = "bigquery", "BigQuery"
+
+    source: models.CharField = models.CharField(
+        max_length=50, unique=True, choices=Sources.choices
+    )
+    reported_at: models.DateTimeField = models.DateTimeField()
+    boundary_uuids: models.JSONField = models.JSONField(default=list)
+    updated_at: models.DateTimeField = models.DateTimeField(auto_now=True)
+
+    def is_imported(self, report: Report) -> bool:
+        """Whether `report` lies on the boundary and was imported already."""
+        return (
+            report.reported_at == self.reported_at
+            and str(report.uuid) in self.boundary_uuids
+        )
+
+    @classmethod
+    @transaction.atomic
+    def advance(cls, source: str, reported_at: datetime, uuids: set[str]) -> None:
+        """Move the watermark of `source` forward to `reported_at`.
+
+        `uuids` are the reports imported at exactly `reported_at`. A watermark
+        that is already further ahead is left unchanged.
+        """
+        watermark, created = cls.objects.select_for_update().get_or_create(
+            source=source,
+            defaults={"reported_at": reported_at, "boundary_uuids": sorted(uuids)},
+        )
+        if created or reported_at < watermark.reported_at:
+            return
+        if reported_at == watermark.reported_at:
+            uuids = uuids.union(watermark.boundary_uuids)
+        watermark.reported_at = reported_at
+        watermark.boundary_uuids = sorted(uuids)
+        watermark.save()
+
+
 class OS(models.Model):
     name: models.CharField = models.CharField(max_length=63, unique=True)
 
@@ -647,6 +1290,85 @@ class ReportHit(models.Model):
             microseconds=-time.microsecond,
         )
 
+    @classmethod
+    @transaction.atomic
+    def bulk_adjust_counts(cls, deltas: dict[datetime, int]) -> None:
+        """Apply count deltas (positive or negative) to the rows of the given
+        periods (see `get_period()`), like `BucketHit.bulk_adjust_counts()`."""
+        deltas = {period: delta for period, delta in sorted(deltas.items()) if delta}
+
+        for periods in batched(deltas, 500):
+            cls.objects.bulk_create(
+                [
+                    cls(last_update=period, count=0)
+                    for period in periods
+                    if deltas[period] > 0
+                ],
+                ignore_conflicts=True,
+            )
+            cls.objects.filter(last_update__in=periods).update(
+                count=Greatest(
+                    models.F("count")
+                    + models.Case(
+                        *(
+                            models.When(
+                                last_update=period, then=models.Value(deltas[period])
+                            )
+                            for period in periods
+                        ),
+                        default=models.Value(0),
+                    ),
+                    models.Value(0),
+                )
+            )
+
+    @classmethod
+    def check_counts(cls, since: datetime) -> int:
+        """Correct the counts of the periods after `since` from the reports that
+        exist now, and return the number of corrected periods.
+
+        Counts are kept up to date by BucketCounterDeltas as reports are created
+        and deleted, so this is a periodic safety net: one grouped query over the
+        `reported_at` index, and writes only for the periods that drifted.
+        """
+        hours = (
+            ReportEntry.objects.filter(reported_at__gt=since)
+            .annotate(hour=TruncHour("reported_at", tzinfo=UTC))
+            .values("hour")
+            .annotate(
+                total=models.Count("id"),
+                # reported on the hour, which ends the previous period
+                on_hour=models.Count(
+                    "id", filter=models.Q(reported_at=models.F("hour"))
+                ),
+            )
+            .values_list("hour", "total", "on_hour")
+        )
+        expected: dict[datetime, int] = defaultdict(int)
+        for hour, total, on_hour in hours:
+            expected[hour] += on_hour
+            expected[hour + timedelta(hours=1)] += total - on_hour
+
+        actual: dict[datetime, int] = {}
+        stale = []
+        for pk, last_update, count in cls.objects.filter(
+            last_update__gt=since
+        ).values_list("pk", "last_update", "count"):
+            if last_update == cls.get_period(last_update):
+                actual[last_update] = count
+            else:
+                # rows of the current hour used to be stamped with the time of
+                # the last update
+                stale.append(pk)
+        cls.objects.filter(pk__in=stale).delete()
+
+        deltas = {
+            period: expected.get(period, 0) - actual.get(period, 0)
+            for period in expected.keys() | actual.keys()
+        }
+        cls.bulk_adjust_counts(deltas)
+        return sum(1 for delta in deltas.values() if delta)
+
     class Meta(TypedModelMeta):
         constraints = (
             models.UniqueConstraint(
@@ -656,7 +1378,155 @@ class ReportHit(models.Model):
         )
 
 
+class ReportDimensionCache:
+    """In-memory lookup of the App, BreakageCategory and OS rows of reports.
+
+    Used by bulk ingestion so that each dimension value is resolved once, and the
+    values missing from the database are created in one batch per dimension.
+    """
+
+    def __init__(self):
+        self.apps: dict[tuple, int] = {}
+        self.breakage_categories: dict[tuple, int] = {}
+        self.oses: dict[tuple, int] = {}
+
+    def load(self, reports: list[Report]) -> None:
+        """Resolve all dimension values used by `reports`, creating missing rows."""
+        apps = {(r.app_channel, r.app_name, r.app_version) for r in reports}
+        self._load(
+            App,
+            ("channel", "name", "version"),
+            self.apps,
+            apps,
+            name__in={name for _, name, _ in apps},
+            version__in={version for _, _, version in apps},
+        )
+        categories = {
+            (r.breakage_category,) for r in reports if r.breakage_category is not None
+        }
+        self._load(
+            BreakageCategory,
+            ("value",),
+            self.breakage_categories,
+            categories,
+            value__in={value for (value,) in categories},
+        )
+        oses = {(r.os,) for r in reports}
+        self._load(OS, ("name",), self.oses, oses, name__in={n for (n,) in oses})
+
+    @staticmethod
+    def _load(model, fields, cache, keys, **lookups):
+        missing = keys - cache.keys()
+        if not missing:
+            return
+        for attempt in range(2):
+            for obj in model.objects.filter(**lookups).only("pk", *fields):
+                key = tuple(getattr(obj, field) for field in fields)
+                if key in missing:
+                    cache[key] = obj.pk
+            missing -= cache.keys()
+            if not missing or attempt:
+                break
+            model.objects.bulk_create(
+                [model(**dict(zip(fields, key, strict=True))) for key in missing],
+                ignore_conflicts=True,
+            )
+        # rows that could not be read back (e.g. NULL keys)
+        for key in missing:
+            cache[key] = model.objects.get_or_create(
+                **dict(zip(fields, key, strict=True))
+            )[0].pk
+
+    def app_id(self, report: Report) -> int:
+        return self.apps[(report.app_channel, report.app_name, report.app_version)]
+
+    def breakage_category_id(self, report: Report) -> int | None:
+        if report.breakage_category is None:
+            return None
+        return self.breakage_categories[(report.breakage_category,)]
+
+    def os_id(self, report: Report) -> int:
+        return self.oses[(report.os,)]
+
+
+class DomainBucketCache:
+    """In-memory map of report domains to their default (non-cluster) bucket.
+
+    Buckets are looked up in batches with `load()`, and created on first use for
+    domains that do not have a bucket yet. Reports without domain (None) share
+    one default bucket too.
+    """
+
+    def __init__(self):
+        self.buckets: dict[str | None, int] = {}
+        self.created = 0
+
+    @staticmethod
+    def get_bucket_key(domain: str | None) -> str:
+        return domain or ""
+
+    def load(self, domains: set[str | None]) -> None:
+        missing = domains - self.buckets.keys()
+        keys = {self.get_bucket_key(domain): domain for domain in missing}
+        for batch_keys in batched(keys, 500):
+            buckets = Bucket.objects.filter(
+                default_for_domain__in=batch_keys
+            ).values_list("default_for_domain", "id")
+            self.buckets.update((keys[key], bucket_id) for key, bucket_id in buckets)
+
+        # default buckets created before default_for_domain was set
+        missing = {domain for domain in missing - self.buckets.keys() if domain}
+        for batch_domains in batched(missing, 500):
+            buckets = (
+                Bucket.objects.filter(domain__in=batch_domains)
+                .exclude(description__contains=CLUSTER_BUCKET_IDENTIFIER)
+                .values_list("domain", "id")
+            )
+            self.buckets.update(buckets)
+
+    def get_or_create(self, domain: str | None, report: Report) -> int:
+        """Return the bucket of `domain`, creating it with the signature of
+        `report` if needed."""
+        if domain not in self.buckets:
+            key = self.get_bucket_key(domain)
+            bucket = Bucket(
+                description=f"domain is {domain}",
+                signature=report.create_signature().raw_signature,
+                default_for_domain=key,
+            )
+            try:
+                with transaction.atomic():
+                    bucket.save()
+                self.created += 1
+            except IntegrityError:
+                # created by a concurrent import or triage, the locking read sees
+                # it even in a transaction that started before
+                bucket = Bucket.objects.select_for_update().get(default_for_domain=key)
+            self.buckets[domain] = bucket.pk
+        return self.buckets[domain]
+
+
 class ReportEntryManager(models.Manager):
+    @staticmethod
+    def _report_fields(report, comments_preprocessed=None):
+        if comments_preprocessed is None:
+            comments_preprocessed = preprocess_text(
+                report.comments_translated or report.comments
+            )
+        return {
+            "url": report.url.geturl(),
+            "uuid": report.uuid,
+            "reported_at": report.reported_at,
+            "details": report.details,
+            "comments": report.comments,
+            "comments_translated": report.comments_translated,
+            "comments_original_language": report.comments_original_language,
+            "ml_valid_probability": report.ml_valid_probability,
+            "domain": report.url.hostname or "unknown",
+            "comments_preprocessed": comments_preprocessed,
+            "country": report.country,
+        }
+
     @transaction.atomic
     def create_from_report(self, report, bucket_id=None, cluster_id=None):
         app = App.objects.get_or_create(
@@ -672,28 +1542,178 @@ class ReportEntryManager(models.Manager):
             breakage = None
         os = OS.objects.get_or_create(name=report.os)[0]
 
-        domain = report.url.hostname or "unknown"
-        comments_text = report.comments_translated or report.comments
-        preprocessed = preprocess_text(comments_text)
-
         return self.create(
             app=app,
             breakage_category=breakage,
-            url=report.url.geturl(),
-            uuid=report.uuid,
-            reported_at=report.reported_at,
             os=os,
-            details=report.details,
-            comments=report.comments,
-            comments_translated=report.comments_translated,
-            comments_original_language=report.comments_original_language,
-            ml_valid_probability=report.ml_valid_probability,
             bucket_id=bucket_id,
             cluster_id=cluster_id,
-            domain=domain,
-            comments_preprocessed=preprocessed,
-            country=report.country,
+            **self._report_fields(report),
+        )
+
+    def bulk_create_from_reports(
+        self,
+        reports,
+        dimensions: ReportDimensionCache | None = None,
+        batch_size: int = 1000,
+        comments_preprocessed: list[str] | None = None,
+        domain_buckets: DomainBucketCache | None = None,
+    ) -> int:
+        """Insert entries for `reports`, ignoring already known UUIDs.
+
+        Unlike create_from_report(), this bypasses `save()` and the model signals.
+        `comments_preprocessed` may hold the already computed preprocess_text()
+        result for each report.
+
+        With `domain_buckets`, the entries are placed in the default bucket of
+        their domain right away (updating BucketHit and the bucket counters) and
+        marked as pending triage, which may still move them into a cluster
+        bucket. Otherwise the entries are left unbucketed.
+
+        Returns the number of entries actually inserted, not counting the ones
+        inserted concurrently by another import (which are not counted in the
+        bucket counters either).
+        """
+        reports = list(reports)
+        if comments_preprocessed is None:
+            comments_preprocessed = [None] * len(reports)
+
+        # skip known reports with one indexed lookup, rather than relying on
+        # conflicts with the unique constraint
+        known = set(
+            self.filter(uuid__in=[report.uuid for report in reports]).values_list(
+                "uuid", flat=True
+            )
         )
+        new = []
+        for report, preprocessed in zip(reports, comments_preprocessed, strict=True):
+            uuid = UUID(str(report.uuid))
+            if uuid not in known:
+                known.add(uuid)
+                new.append((report, preprocessed))
+        if not new:
+            return 0
+
+        if dimensions is None:
+            dimensions = ReportDimensionCache()
+        dimensions.load([report for report, _ in new])
+
+        entries = []
+        for report, preprocessed in new:
+            entry = self.model(
+                app_id=dimensions.app_id(report),
+                breakage_category_id=dimensions.breakage_category_id(report),
+                os_id=dimensions.os_id(report),
+                **self._report_fields(report, preprocessed),
+            )
+            entry.prepare_insert()
+            entries.append(entry)
+
+        if domain_buckets is not None:
+            domain_buckets.load({entry.domain for entry in entries})
+
+        with transaction.atomic():
+            if domain_buckets is not None:
+                for entry, (report, _) in zip(entries, new, strict=True):
+                    entry.bucket_id = domain_buckets.get_or_create(entry.domain, report)
+                    entry.triage_pending = True
+
+            entries = self._insert_new(entries, batch_size)
+
+            counter_deltas = BucketCounterDeltas()
+            for entry in entries:
+                counter_deltas.add_report(entry)
+                if entry.bucket_id is not None:
+                    counter_deltas.add(entry.bucket_id, entry)
+            counter_deltas.apply()
+        return len(entries)
+
+    def _insert_new(self, entries: list, batch_size: int) -> list:
+        """Insert `entries`, leaving out those inserted concurrently by another
+        import, and return the ones that were inserted."""
+        while True:
+            try:
+                with transaction.atomic():
+                    self.bulk_create(entries, batch_size=batch_size)
+                return entries
+            except IntegrityError:
+                known = set(
+                    self.filter(uuid__in=[entry.uuid for entry in entries]).values_list(
+                        "uuid", flat=True
+                    )
+                )
+                remaining = [
+                    entry for entry in entries if UUID(str(entry.uuid)) not in known
+                ]
+                if len(remaining) == len(entries):
+                    raise
+                entries = remaining
+                # the batches inserted before the conflict were rolled back
+                for entry in entries:
+                    entry.pk = None
+                    entry._state.adding = True
+
+    def bulk_delete(self, queryset=None, batch_size: int = 500) -> int:
+        """Delete the entries of `queryset` (all entries by default) without
+        loading model instances or sending signals.
+
+        Entries are deleted in batches of consecutive primary keys. For each
+        batch, the counted columns are read and locked in one query to decrement
+        ReportHit, BucketHit and the bucket counters together, clusters using a
+        deleted entry as centroid have it cleared like `on_delete=SET_NULL`
+        would, and the rows are removed with a raw DELETE on the primary key
+        range of the batch. Returns the number of deleted entries.
+        """
+        if queryset is None:
+            queryset = self.get_queryset()
+        queryset = queryset.order_by()
+        table = connection.ops.quote_name(self.model._meta.db_table)
+
+        deleted = 0
+        last_id = 0
+        while True:
+            with transaction.atomic():
+                batch = list(
+                    queryset.filter(id__gt=last_id)
+                    .order_by("id")
+                    .select_for_update()
+                    .values("id", "bucket_id", *BucketCounterDeltas.REPORT_FIELDS)[
+                        :batch_size
+                    ]
+                )
+                if not batch:
+                    break
+                first_id, last_id = batch[0]["id"], batch[-1]["id"]
+                batch_rows = queryset.filter(id__gte=first_id, id__lte=last_id)
+
+                counter_deltas = BucketCounterDeltas()
+                for row in batch:
+                    counter_deltas.add_report(row, -1)
+                    if row["bucket_id"] is not None:
+                        counter_deltas.add(row["bucket_id"], row, -1)
+
+                Cluster.objects.filter(centroid__in=batch_rows).update(centroid=None)
+                # the subquery is wrapped in a derived table, MySQL does not allow
+                # selecting from the table a DELETE removes rows from
+                select, params = batch_rows.values("id").query.sql_with_params()
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        f"DELETE FROM {table} WHERE id >= %s AND id <= %s "
+                        f"AND id IN (SELECT id FROM ({select}) AS batch)",
+                        (first_id, last_id, *params),
+                    )
+                    if cursor.rowcount != len(batch):
+                        # an entry of the range was inserted concurrently and not
+                        # counted, read the batch again
+                        transaction.set_rollback(True)
+                        last_id = first_id - 1
+                        continue
+                    deleted += cursor.rowcount
+                counter_deltas.apply()
+
+        if deleted:
+            DataVersion.bump()
+        return deleted
 
 
 class ReportEntry(models.Model):
@@ -705,6 +1725,10 @@ class ReportEntry(models.Model):
         Bucket, null=True, on_delete=models.deletion.CASCADE
     )
     comments: models.TextField = models.TextField()
+    # stored so that filtering and ordering on it can use an index
+    comments_length: models.PositiveIntegerField = models.PositiveIntegerField(
+        default=0, db_index=True
+    )
     comments_translated: models.TextField = models.TextField(null=True)
     comments_original_language: models.TextField = models.TextField(null=True)
     details: models.JSONField = models.JSONField()
@@ -719,12 +1743,23 @@ class ReportEntry(models.Model):
     domain: models.CharField = models.CharField(max_length=255, null=True)
     comments_preprocessed: models.TextField = models.TextField(null=True)
     country: models.TextField = models.TextField(max_length=2, null=True)
+    # extracted from `details` at ingest, see get_details_flags()
+    private_browsing: models.BooleanField = models.BooleanField(default=False)
+    content_blocked: models.BooleanField = models.BooleanField(default=False)
+    # placed in its domain bucket at ingest, but not triaged into a cluster yet
+    triage_pending: models.BooleanField = models.BooleanField(
+        default=False, db_index=True
+    )
 
     objects = ReportEntryManager()
 
     class Meta:
         indexes = [
             models.Index(fields=["domain"]),
+            # covers the time range aggregations of the stats endpoint
+            models.Index(fields=["reported_at", "bucket"]),
+            # cursor pagination of a bucket's reports by date
+            models.Index(fields=["bucket", "reported_at"]),
         ]
 
     def __init__(self, *args, **kwargs):
@@ -741,7 +1776,48 @@ class ReportEntry(models.Model):
     def save(self, *args, **kwargs):
         modified = set()
 
-        if self.pk is None and not getattr(settings, "DB_ISUTF8MB4", False):
+        created = self.pk is None
+        if created:
+            modified |= self.prepare_insert()
+
+        if kwargs.get("update_fields") is None or "comments" in kwargs["update_fields"]:
+            self.comments_length = len(self.comments)
+            modified.add("comments_length")
+
+        update_fields = kwargs.get("update_fields")
+        bucket_changed = self.bucket_id != self._original_bucket and (
+            update_fields is None or {"bucket", "bucket_id"} & set(update_fields)
+        )
+        if bucket_changed and not created:
+            # moved explicitly, triage must not move it again
+            self.triage_pending = False
+            modified.add("triage_pending")
+
+        # required in Django 4.2+
+        if "update_fields" in kwargs and kwargs["update_fields"] is not None:
+            kwargs["update_fields"] = modified.union(kwargs["update_fields"])
+
+        super().save(*args, **kwargs)
+
+        # keep the bucket counters in sync when the bucket of a single entry changes
+        # (bulk reassignments adjust BucketCounter tables themselves)
+        counter_deltas = BucketCounterDeltas()
+        if created:
+            counter_deltas.add_report(self)
+        if bucket_changed:
+            counter_deltas.move(self._original_bucket, self.bucket_id, self)
+            self._original_bucket = self.bucket_id
+        counter_deltas.apply()
+
+    def prepare_insert(self) -> set[str]:
+        """Derive the stored fields of a new entry before it is inserted.
+
+        Called by `save()`, bulk inserts have to call it themselves.
+        Returns the names of the modified fields.
+        """
+        modified = set()
+
+        if not getattr(settings, "DB_ISUTF8MB4", False):
             # Replace 4-byte UTF-8 characters with U+FFFD if our database
             # doesn't support them. By default, MySQL utf-8 does not support these.
             utf8_4byte_re = re.compile("[^\u0000-\ud7ff\ue000-\uffff]", re.UNICODE)
@@ -757,11 +1833,23 @@ class ReportEntry(models.Model):
                 self.comments = comments
                 modified.add("comments")
 
-        # required in Django 4.2+
-        if "update_fields" in kwargs and kwargs["update_fields"] is not None:
-            kwargs["update_fields"] = modified.union(kwargs["update_fields"])
+        self.private_browsing, self.content_blocked = self.get_details_flags(
+            self.details
+        )
+        self.comments_length = len(self.comments)
+        modified.update(("private_browsing", "content_blocked", "comments_length"))
+        return modified
 
-        super().save(*args, **kwargs)
+    @staticmethod
+    def get_details_flags(details) -> tuple[bool, bool]:
+        """Return the (private_browsing, content_blocked) flags of report details."""
+        flags = details.get("boolean") if isinstance(details, dict) else None
+        if not isinstance(flags, dict):
+            return False, False
+        return (
+            flags.get(PRIVATE_BROWSING_DETAIL) is True,
+            flags.get(CONTENT_BLOCKED_DETAIL) is True,
+        )
 
     def get_report(self):
         if self._cached_report is None:
@@ -810,10 +1898,25 @@ class ReportEntry(models.Model):
         return self.save()
 
 
+@receiver(post_save, sender=Bucket)
+@receiver(post_delete, sender=Bucket)
+@receiver(post_save, sender=BucketWatch)
+@receiver(post_delete, sender=BucketWatch)
+@receiver(post_save, sender=Bug)
+@receiver(post_delete, sender=Bug)
+def bump_data_version(sender, **kwargs):
+    DataVersion.bump_on_commit()
+
+
 @receiver(post_delete, sender=ReportEntry)
 def ReportEntry_delete(sender, instance, **kwargs):
+    deferred = BucketCounterDeltas.current()
+    counter_deltas = deferred or BucketCounterDeltas()
+    counter_deltas.add_report(instance, -1)
     if instance.bucket_id is not None:
-        BucketHit.decrement_count(instance.bucket_id, instance.reported_at)
+        counter_deltas.add(instance.bucket_id, instance, -1)
+    if deferred is None:
+        counter_deltas.apply()
 
 
 class BugzillaTemplateMode(models.TextChoices):
@@ -858,6 +1961,9 @@ class DomainSource(models.Model):
     bq_table: models.CharField = models.CharField(max_length=500)
     bq_source_field: models.CharField = models.CharField(max_length=255)
     last_synced_at: models.DateTimeField = models.DateTimeField(null=True)
+    # set when a sync starts, a sync that did not finish is newer than
+    # last_synced_at (see import_domain_list.sync_domain_source)
+    sync_started_at: models.DateTimeField = models.DateTimeField(null=True)
 
 
 class DomainEntry(models.Model):
@@ -951,6 +2057,62 @@ class BucketCountryRank(models.Model):
         ]
 
 
+class PendingCountryRankDomain(models.Model):
+    """Domain seen by triage whose country ranks still have to be imported.
+
+    Domains are collected here and imported in one batch by a delayed task, so
+    that triage does not wait for BigQuery, and consecutive triage runs share a
+    single lookup. See `import_country_ranks --pending`.
+    """
+
+    # schedules at most one import per this many seconds
+    IMPORT_DELAY = 300
+    # `domain` of the row marking that an import is scheduled (not a valid
+    # domain), the import removes it when it starts
+    SCHEDULED_MARKER = ""
+
+    domain: models.CharField = models.CharField(max_length=255, unique=True)
+    created_at: models.DateTimeField = models.DateTimeField(auto_now_add=True)
+
+    @classmethod
+    def enqueue(cls, domains) -> None:
+        """Queue `domains` for the next country rank import."""
+        cls.objects.bulk_create(
+            [cls(domain=domain) for domain in domains], ignore_conflicts=True
+        )
+
+        if getattr(settings, "USE_CELERY", None):
+            delay = getattr(settings, "COUNTRY_RANK_IMPORT_DELAY", cls.IMPORT_DELAY)
+
+            def schedule_import() -> None:
+                from reportmanager.tasks import import_pending_country_ranks
+
+                # a marker left by an import that never ran does not block
+                # scheduling forever
+                cls.objects.filter(
+                    domain=cls.SCHEDULED_MARKER,
+                    created_at__lt=timezone.now() - timedelta(seconds=2 * delay),
+                ).delete()
+                # the scheduled import also covers domains queued until it runs,
+                # the unique marker lets only one process schedule it
+                _, created = cls.objects.get_or_create(domain=cls.SCHEDULED_MARKER)
+                if created:
+                    import_pending_country_ranks.apply_async(countdown=delay)
+
+            transaction.on_commit(schedule_import)
+        else:
+            transaction.on_commit(
+                lambda: call_command("import_country_ranks", pending=True)
+            )
+
+    @classmethod
+    def pending_domains(cls):
+        """Return the queued domains, without the scheduled import marker."""
+        return cls.objects.exclude(domain=cls.SCHEDULED_MARKER).values_list(
+            "domain", flat=True
+        )
+
+
 @receiver(post_save, sender=DjangoUser)
 def add_default_perms(sender, instance, created, **kwargs):
     if created:
@@ -281,9 +281,9 @@ class ReportEntryVueSerializer(ReportEntrySerializer):
         return reverse("reportmanager:reportview", kwargs={"report_id": entry.id})
 
     def get_sig_view_url(self, entry):
-        if entry.bucket:
+        if entry.bucket_id:
             return reverse(
-                "reportmanager:bucketview", kwargs={"sig_id": entry.bucket.id}
+                "reportmanager:bucketview", kwargs={"sig_id": entry.bucket_id}
             )
         return None
 
@@ -309,6 +309,15 @@ class ClusteringJobSerializer(serializers.ModelSerializer):
         ]
 
 
+class BucketSpikeParamsSerializer(serializers.Serializer):
+    """Query parameters of the spike detection, defaulting to those of the UI."""
+
+    short_window = serializers.IntegerField(min_value=1, default=2)
+    long_window = serializers.IntegerField(min_value=1, default=60)
+    threshold = serializers.FloatField(min_value=0, default=1.5)
+    min_reports = serializers.IntegerField(min_value=0, default=10)
+
+
 class BucketSpikeSerializer(serializers.Serializer):
     bucket_id = serializers.IntegerField()
     bucket_domain = serializers.CharField(allow_null=True)
@@ -322,6 +331,7 @@ class BucketSpikeSerializer(serializers.Serializer):
     short_window_start = serializers.DateField()
     short_window_end = serializers.DateField()
     report_comments = serializers.ListField(child=serializers.CharField())
+    more_comments = serializers.BooleanField()
 
     def get_bucket_view_url(self, obj):
         return reverse("reportmanager:bucketview", kwargs={"sig_id": obj["bucket_id"]})
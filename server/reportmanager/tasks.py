@@ -13,5 +13,31 @@ def triage_new_report(pk):
 
 
 @app.task(ignore_result=True)
-def label_bucket(pk):
-    call_command("label_buckets", bucket_id=pk)
+def label_buckets(pks):
+    call_command("label_buckets", bucket_ids=pks)
+
+
+@app.task(ignore_result=True)
+def import_pending_country_ranks():
+    call_command("import_country_ranks", pending=True)
+
+
+@app.task
+def triage_shard(domains, token, tokens):
+    from .management.commands.triage_new_reports import run_triage_shard
+
+    return run_triage_shard(domains, token, tokens)
+
+
+@app.task(ignore_result=True)
+def complete_triage(results, job_pk):
+    from .management.commands.triage_new_reports import finish_sharded_triage
+
+    finish_sharded_triage(job_pk, results)
+
+
+@app.task(ignore_result=True)
+def fail_triage(request, exc, traceback, job_pk):
+    from .management.commands.triage_new_reports import fail_sharded_triage
+
+    fail_sharded_triage(job_pk, str(exc))
@@ -3,8 +3,16 @@
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 import html
 import re
+from collections.abc import Iterable
+from dataclasses import fields
+from typing import Any
 from urllib.parse import urlsplit
 
+from webcompat.models import Report
+
+# columns of exported reports that map onto Report
+REPORT_FIELDS = frozenset(f.name for f in fields(Report))
+
 
 def preprocess_text(text: str | None) -> str:
     if not text or text == "":
@@ -16,6 +24,34 @@ def preprocess_text(text: str | None) -> str:
     return text
 
 
+def parse_report_lines(lines: Iterable[str]) -> list[tuple[Report, str]]:
+    """Decode NDJSON report lines in the format of `Report.load()`.
+
+    Returns each report with its preprocessed comments. This does not depend on
+    Django, so it can run in a worker process.
+    """
+    return [
+        _with_preprocessed_comments(Report.load(line)) for line in lines if line.strip()
+    ]
+
+
+def parse_report_records(records: Iterable[dict[str, Any]]) -> list[tuple[Report, str]]:
+    """Decode report records read from a columnar export (Parquet/Arrow).
+
+    Columns that are not part of a Report are ignored.
+    """
+    return [
+        _with_preprocessed_comments(
+            Report.from_dict({k: v for k, v in record.items() if k in REPORT_FIELDS})
+        )
+        for record in records
+    ]
+
+
+def _with_preprocessed_comments(report: Report) -> tuple[Report, str]:
+    return report, preprocess_text(report.comments_translated or report.comments)
+
+
 def transform_ml_label(
     ml_label: str | None, ml_probability: float | None
 ) -> float | None:
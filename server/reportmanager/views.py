@@ -1,15 +1,18 @@
 # This Source Code Form is subject to the terms of the Mozilla Public
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
+import hashlib
 import html
 import json
-from collections import OrderedDict, defaultdict
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from itertools import batched
+from functools import wraps
 from logging import getLogger
 
 from dateutil.relativedelta import relativedelta
 from django.conf import settings as django_settings
+from django.core.cache import cache
 from django.core.exceptions import FieldError, SuspiciousOperation
 from django.db.models import (
     Avg,
@@ -24,21 +27,24 @@ from django.db.models import (
     Subquery,
     Value,
     When,
+    Window,
 )
-from django.db.models.aggregates import Count, Max
-from django.db.models.functions import Cast, Coalesce, Greatest, Ln
+from django.db.models.aggregates import Count, Max, Sum
+from django.db.models.functions import Cast, Coalesce, Greatest, Ln, RowNumber
 from django.http import Http404
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse, reverse_lazy
 from django.utils import timezone
+from django.utils.http import parse_etags, quote_etag
 from django.views.generic import TemplateView
 from django.views.generic.edit import CreateView, DeleteView, UpdateView
 from django.views.generic.list import ListView
 from rest_framework import mixins, status, viewsets
 from rest_framework.authentication import SessionAuthentication, TokenAuthentication
 from rest_framework.decorators import action
-from rest_framework.exceptions import MethodNotAllowed, ValidationError
+from rest_framework.exceptions import MethodNotAllowed, NotFound, ValidationError
 from rest_framework.filters import BaseFilterBackend, OrderingFilter
+from rest_framework.pagination import Cursor, CursorPagination
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
@@ -53,7 +59,9 @@ from .forms import (
 from .models import (
     Bucket,
     BucketCountryRank,
+    BucketDailyCount,
     BucketHit,
+    BucketSummaryCount,
     BucketWatch,
     Bug,
     BugProvider,
@@ -61,12 +69,14 @@ from .models import (
     BugzillaTemplateMode,
     Cluster,
     ClusteringJob,
+    DataVersion,
     ReportEntry,
     ReportHit,
     User,
 )
 from .serializers import (
     BucketSerializer,
+    BucketSpikeParamsSerializer,
     BucketSpikeSerializer,
     BucketVueSerializer,
     BugProviderSerializer,
@@ -812,6 +822,192 @@ class WatchFilterReportsBackend(BaseFilterBackend):
         return queryset.filter(bucket=watch.bucket, id__gt=watch.last_report)
 
 
+def cached_by_data_version(func):
+    """Cache the responses of a viewset action under the current DataVersion.
+
+    The ETag is derived from the viewset, action, URL kwargs, normalized query
+    parameters, user and data version, so it only changes with them. A request
+    whose If-None-Match lists the current ETag gets `304 Not Modified` without
+    computing anything. The server-side cache key also rotates every
+    RESPONSE_CACHE_TIMEOUT seconds, so parts of a response that depend on the
+    current time (recent report history etc.) don't stay cached indefinitely.
+    """
+
+    @wraps(func)
+    def wrapper(self, request, *args, **kwargs):
+        timeout = getattr(django_settings, "RESPONSE_CACHE_TIMEOUT", 600)
+        params = sorted(
+            (key, value)
+            for key in request.query_params
+            for value in request.query_params.getlist(key)
+        )
+        key_data = json.dumps(
+            [
+                type(self).__name__,
+                func.__name__,
+                kwargs,
+                params,
+                request.user.pk,
+                DataVersion.get_version(),
+            ],
+            default=str,
+        )
+        digest = hashlib.sha256(key_data.encode()).hexdigest()
+        etag = quote_etag(digest)
+        cache_key = f"reportmanager:response:{digest}:{int(time.time() // timeout)}"
+
+        if etag in parse_etags(request.headers.get("If-None-Match", "")):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        elif (data := cache.get(cache_key)) is not None:
+            response = Response(data)
+        else:
+            response = func(self, request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            cache.set(cache_key, response.data, timeout)
+
+        response["ETag"] = etag
+        return response
+
+    return wrapper
+
+
+class ReportEntryOrderingFilter(OrderingFilter):
+    """OrderingFilter that maps `comments__length` onto the stored
+    `comments_length` column, so ordering by it doesn't compute it per row."""
+
+    ALIASES = {"comments__length": "comments_length"}
+
+    def remove_invalid_fields(self, queryset, fields, view, request):
+        mapped = []
+        for term in fields:
+            descending, field = term.startswith("-"), term.lstrip("-")
+            field = self.ALIASES.get(field, field)
+            mapped.append(f"-{field}" if descending else field)
+        return super().remove_invalid_fields(queryset, mapped, view, request)
+
+
+class ReportEntryCursorPagination(CursorPagination):
+    """Cursor pagination for report lists, used when a `cursor` parameter is given.
+
+    Unlike limit/offset, fetching a page doesn't count or skip the preceding rows,
+    so deep pages cost the same as the first one.
+
+    DRF's cursors only seek on the first ordering field, and skip the rows with
+    the same value by offset. The cursors here hold the value and the id of the
+    last row instead, so that pages seek past ties on `reported_at` or
+    `comments_length` as well.
+    """
+
+    ordering = "-id"
+    page_size_query_param = "limit"
+    max_page_size = 1000
+
+    # orderings with an index to seek on
+    ORDERING_FIELDS = ("id", "reported_at", "comments_length")
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        field = ordering[0].lstrip("-")
+        if field not in self.ORDERING_FIELDS:
+            raise ValidationError(
+                {"ordering": f"cursor pagination only supports {self.ORDERING_FIELDS}"}
+            )
+        if field == "id":
+            return (ordering[0],)
+        # the cursor seeks on the field and the id
+        return (ordering[0], "-id" if ordering[0].startswith("-") else "id")
+
+    def decode_cursor(self, request):
+        cursor = super().decode_cursor(request)
+        if cursor is None or cursor.position is None:
+            return cursor
+        try:
+            value, pk = json.loads(cursor.position)
+            position = (str(value), int(pk))
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message) from None
+        return Cursor(offset=0, reverse=cursor.reverse, position=position)
+
+    def encode_cursor(self, cursor):
+        if cursor.position is not None:
+            cursor = cursor._replace(position=json.dumps(cursor.position))
+        return super().encode_cursor(cursor)
+
+    def _get_position_from_instance(self, instance, ordering):
+        field = ordering[0].lstrip("-")
+        if isinstance(instance, dict):
+            return (str(instance[field]), instance["id"])
+        return (str(getattr(instance, field)), instance.pk)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor is not None and self.cursor.reverse
+        position = self.cursor.position if self.cursor is not None else None
+
+        if reverse:
+            queryset = queryset.order_by(
+                *(o[1:] if o.startswith("-") else f"-{o}" for o in self.ordering)
+            )
+        else:
+            queryset = queryset.order_by(*self.ordering)
+
+        if position is not None:
+            field = self.ordering[0].lstrip("-")
+            lookup = "lt" if self.ordering[0].startswith("-") != reverse else "gt"
+            value, pk = position
+            seek = Q(**{f"id__{lookup}": pk})
+            if field != "id":
+                seek = Q(**{f"{field}__{lookup}": value}) | (Q(**{field: value}) & seek)
+            queryset = queryset.filter(seek)
+
+        results = list(queryset[: self.page_size + 1])
+        self.page = results[: self.page_size]
+        has_following = len(results) > len(self.page)
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = position is not None, has_following
+        else:
+            self.has_next, self.has_previous = has_following, position is not None
+
+        # the rows are unique, so the next page starts right after the last one
+        if self.page:
+            self.next_position = self._get_position_from_instance(
+                self.page[-1], self.ordering
+            )
+            self.previous_position = self._get_position_from_instance(
+                self.page[0], self.ordering
+            )
+        else:
+            self.next_position = self.previous_position = position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(
+            Cursor(offset=0, reverse=False, position=self.next_position)
+        )
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        return self.encode_cursor(
+            Cursor(offset=0, reverse=True, position=self.previous_position)
+        )
+
+
 class ReportEntryViewSet(
     mixins.CreateModelMixin,
     mixins.ListModelMixin,
@@ -829,7 +1025,7 @@ class ReportEntryViewSet(
     serializer_class = ReportEntrySerializer
     filter_backends = (
         JsonQueryFilterBackend,
-        OrderingFilter,
+        ReportEntryOrderingFilter,
         WatchFilterReportsBackend,
     )
     ordering_fields = (
@@ -840,14 +1036,43 @@ class ReportEntryViewSet(
         "breakage_category__value",
         "bucket",
         "comments",
-        "comments__length",
-        "details",
+        "comments_length",
         "ml_valid_probability",
         "os__name",
         "reported_at",
         "url",
         "uuid",
     )
+    # large columns only loaded when listed in `fields`
+    DEFERRABLE_FIELDS = ("comments", "comments_translated", "details")
+
+    def get_requested_fields(self):
+        """Return the set of fields selected with `fields=a,b,...`, or None if
+        all fields should be returned."""
+        if self.action not in ("list", "retrieve"):
+            return None
+        fields = self.request.query_params.get("fields")
+        if not fields:
+            return None
+        return {field.strip() for field in fields.split(",")}
+
+    @property
+    def paginator(self):
+        if not hasattr(self, "_paginator"):
+            if "cursor" in self.request.query_params:
+                self._paginator = ReportEntryCursorPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
+    def get_queryset(self):
+        queryset = super().get_queryset().defer("comments_preprocessed")
+        fields = self.get_requested_fields()
+        if fields is not None:
+            queryset = queryset.defer(
+                *(field for field in self.DEFERRABLE_FIELDS if field not in fields)
+            )
+        return queryset
 
     def get_serializer(self, *args, **kwds):
         self.vue = self.request.query_params.get("vue", "false").lower() not in (
@@ -855,9 +1080,28 @@ class ReportEntryViewSet(
             "0",
         )
         if self.vue:
-            return ReportEntryVueSerializer(*args, **kwds)
+            serializer = ReportEntryVueSerializer(*args, **kwds)
         else:
-            return super().get_serializer(*args, **kwds)
+            serializer = super().get_serializer(*args, **kwds)
+
+        fields = self.get_requested_fields()
+        if fields is not None:
+            child = getattr(serializer, "child", serializer)
+            for name in set(child.fields) - fields:
+                child.fields.pop(name)
+        return serializer
+
+    @cached_by_data_version
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @cached_by_data_version
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+        DataVersion.bump()
 
     @action(detail=False, methods=["delete"])
     def delete(self, request, pk=None):
@@ -881,10 +1125,12 @@ class ReportEntryViewSet(
             next_offset = 0
         queryset = queryset[:limit]
 
-        deleted = 0
-        for chunk in batched(queryset.values_list("id", flat=True), 100):
-            delete_stats = ReportEntry.objects.filter(pk__in=tuple(chunk)).delete()
-            deleted += delete_stats[1]["reportmanager.ReportEntry"]
+        # the ids are listed first, MySQL does not support LIMIT in subqueries
+        deleted = ReportEntry.objects.bulk_delete(
+            ReportEntry.objects.filter(
+                pk__in=list(queryset.values_list("id", flat=True))
+            )
+        )
 
         return Response(
             status=status.HTTP_200_OK,
@@ -948,36 +1194,25 @@ class BucketViewSet(
         else:
             return super().get_serializer(*args, **kwds)
 
+    @cached_by_data_version
     def list(self, request, *args, **kwargs):
         response = super().list(request, *args, **kwargs)
 
         if self.vue and response.status_code == 200:
-            hits = (
-                BucketHit.objects.all()
-                .filter(
-                    begin__gte=timezone.now()
-                    - timedelta(
-                        days=getattr(django_settings, "CLEANUP_REPORTS_AFTER_DAYS", 14)
-                    ),
-                    bucket_id__in=[bucket["id"] for bucket in response.data["results"]],
-                )
-                .order_by("begin")
+            bucket_hits = BucketHit.get_history(
+                [bucket["id"] for bucket in response.data["results"]],
+                timezone.now()
+                - timedelta(
+                    days=getattr(django_settings, "CLEANUP_REPORTS_AFTER_DAYS", 14)
+                ),
             )
 
-            bucket_hits = {}
-            for bucket, begin, num in hits.values_list("bucket_id", "begin", "count"):
-                bucket_hits.setdefault(bucket, {})
-                bucket_hits[bucket].setdefault(begin, 0)
-                bucket_hits[bucket][begin] += num
-
             for bucket in response.data["results"]:
-                bucket["report_history"] = [
-                    {"begin": begin, "count": num}
-                    for begin, num in bucket_hits.get(bucket["id"], {}).items()
-                ]
+                bucket["report_history"] = bucket_hits.get(bucket["id"], [])
 
         return response
 
+    @cached_by_data_version
     def retrieve(self, request, *args, **kwargs):
         instance = self.get_object()
 
@@ -985,80 +1220,15 @@ class BucketViewSet(
         response = Response(serializer.data)
 
         if self.vue and response.status_code == 200:
-            hits = (
-                BucketHit.objects.all()
-                .filter(
-                    begin__gte=timezone.now()
-                    - timedelta(
-                        days=getattr(django_settings, "CLEANUP_REPORTS_AFTER_DAYS", 14)
-                    ),
-                    bucket_id=response.data["id"],
-                )
-                .order_by("begin")
-            )
-
-            response.data["report_history"] = list(hits.values("begin", "count"))
-
-            reports = ReportEntry.objects.filter(bucket_id=response.data["id"])
-
-            os_counts = {
-                (row["os__name"] or "Unknown"): row["count"]
-                for row in reports.values("os__name").annotate(count=Count("id"))
-            }
-
-            desktop_browser_versions: dict[str, int] = {}
-            mobile_browser_versions: dict[str, int] = {}
-            for row in reports.values("app__name", "app__version", "os__name").annotate(
-                count=Count("id")
-            ):
-                app_name = row["app__name"] or "Unknown"
-                app_version = row["app__version"] or "Unknown"
-                os_name = (row["os__name"] or "Unknown").lower()
-                major = app_version.split(".")[0]
-                key = f"{app_name} {major}"
-                if os_name == "android":
-                    mobile_browser_versions[key] = (
-                        mobile_browser_versions.get(key, 0) + row["count"]
-                    )
-                else:
-                    desktop_browser_versions[key] = (
-                        desktop_browser_versions.get(key, 0) + row["count"]
-                    )
-
-            mobile_os = {k: v for k, v in os_counts.items() if k.lower() == "android"}
-            desktop_os = {k: v for k, v in os_counts.items() if k.lower() != "android"}
-
-            agg = reports.aggregate(
-                total=Count("id"),
-                pbm_count=Count(
-                    "id",
-                    filter=Q(
-                        details__boolean__broken_site_report_tab_info_antitracking_is_private_browsing=True
-                    ),
-                ),
-                blocked_count=Count(
-                    "id",
-                    filter=Q(
-                        details__boolean__broken_site_report_tab_info_antitracking_has_tracking_content_blocked=True
-                    ),
+            response.data["report_history"] = BucketHit.get_history(
+                [response.data["id"]],
+                timezone.now()
+                - timedelta(
+                    days=getattr(django_settings, "CLEANUP_REPORTS_AFTER_DAYS", 14)
                 ),
-            )
+            ).get(response.data["id"], [])
 
-            response.data["summary"] = {
-                "total": agg["total"],
-                "desktop": {
-                    "total": sum(desktop_os.values()),
-                    "os": desktop_os,
-                    "browser_versions": desktop_browser_versions,
-                },
-                "mobile": {
-                    "total": sum(mobile_os.values()),
-                    "os": mobile_os,
-                    "browser_versions": mobile_browser_versions,
-                },
-                "pbm_enabled": agg["pbm_count"],
-                "content_blocked": agg["blocked_count"],
-            }
+            response.data["summary"] = BucketSummaryCount.summarize(response.data["id"])
 
         return response
 
@@ -1463,45 +1633,6 @@ class InboxView(TemplateView):
     template_name = "inbox.html"
 
 
-class _FreqCount:
-    def __init__(self):
-        self.hour = 0
-        self.day = 0
-        self.week = 0
-        self.month = 0
-        self.bucket_hour = {}
-        self.bucket_day = {}
-        self.bucket_week = {}
-        self.bucket_month = {}
-
-    def add_hour(self, bucket):
-        self.hour += 1
-        if bucket is not None:
-            self.bucket_hour.setdefault(bucket, 0)
-            self.bucket_hour[bucket] += 1
-        self.add_day(bucket)
-
-    def add_day(self, bucket):
-        self.day += 1
-        if bucket is not None:
-            self.bucket_day.setdefault(bucket, 0)
-            self.bucket_day[bucket] += 1
-        self.add_week(bucket)
-
-    def add_week(self, bucket):
-        self.week += 1
-        if bucket is not None:
-            self.bucket_week.setdefault(bucket, 0)
-            self.bucket_week[bucket] += 1
-        self.add_month(bucket)
-
-    def add_month(self, bucket):
-        self.month += 1
-        if bucket is not None:
-            self.bucket_month.setdefault(bucket, 0)
-            self.bucket_month[bucket] += 1
-
-
 class ReportStatsViewSet(viewsets.GenericViewSet):
     """
     API endpoint that allows retrieving ReportManager statistics
@@ -1512,7 +1643,6 @@ class ReportStatsViewSet(viewsets.GenericViewSet):
     filter_backends = ()
 
     def retrieve(self, request, *_args, **_kwds):
-        LOG.error("in retrieve")
         entries = self.filter_queryset(self.get_queryset())
 
         now = timezone.now()
@@ -1521,64 +1651,47 @@ class ReportStatsViewSet(viewsets.GenericViewSet):
         last_month = now - relativedelta(months=1)
         entries = entries.filter(reported_at__gt=last_month)
 
-        totals = _FreqCount()
-        for reported_at, bucket_id in entries.values_list("reported_at", "bucket_id"):
-            if reported_at > last_day:
-                totals.add_day(bucket_id)
-            elif reported_at > last_week:
-                totals.add_week(bucket_id)
-            else:
-                totals.add_month(bucket_id)
+        period_counts = {
+            "day": Count("id", filter=Q(reported_at__gt=last_day)),
+            "week": Count("id", filter=Q(reported_at__gt=last_week)),
+            "month": Count("id"),
+        }
+        totals = entries.aggregate(**period_counts)
 
-        # this gives all the bucket ids
-        #   where the bucket is top10 for any period (day, week, month)
-        top10s = (
-            {
-                b_id
-                for b_id, _ in sorted(
-                    totals.bucket_day.items(), key=lambda t: t[1], reverse=True
-                )[:10]
-            }
-            | {
-                b_id
-                for b_id, _ in sorted(
-                    totals.bucket_week.items(), key=lambda t: t[1], reverse=True
-                )[:10]
-            }
-            | {
-                b_id
-                for b_id, _ in sorted(
-                    totals.bucket_month.items(), key=lambda t: t[1], reverse=True
-                )[:10]
-            }
+        # this gives all the buckets that are top10 for any period (day, week, month)
+        bucket_counts = (
+            entries.filter(bucket__isnull=False)
+            .values("bucket_id")
+            .annotate(**period_counts)
         )
-
         frequent_buckets = {}
-        for b_id in top10s:
-            frequent_buckets[b_id] = [
-                totals.bucket_day.get(b_id, 0),
-                totals.bucket_week.get(b_id, 0),
-                totals.bucket_month[b_id],  # only one that's guaranteed to exist
-            ]
+        for period in ("day", "week", "month"):
+            for row in bucket_counts.filter(**{f"{period}__gt": 0}).order_by(
+                f"-{period}", "bucket_id"
+            )[:10]:
+                frequent_buckets[row["bucket_id"]] = [
+                    row["day"],
+                    row["week"],
+                    row["month"],
+                ]
 
         n_periods = getattr(django_settings, "REPORT_STATS_MAX_HISTORY_DAYS", 14) * 24
         cur_period = ReportHit.get_period(now)
-        periods = [cur_period - timedelta(hours=n) for n in range(n_periods)]
-        periods.reverse()
-        hits_per_hour = [0 for _ in periods]
-        hit_idx = 0
-        for hit in ReportHit.objects.filter(
-            last_update__gt=periods[0] - timedelta(hours=1),
-            last_update__lte=periods[-1],
-        ).order_by("last_update"):
-            hit_period = ReportHit.get_period(hit.last_update)
-            hit_idx = periods.index(hit_period, hit_idx)
-            hits_per_hour[hit_idx] += hit.count
+        first_period = cur_period - timedelta(hours=n_periods - 1)
+        hits_per_hour = [0] * n_periods
+        for last_update, count in ReportHit.objects.filter(
+            last_update__gt=first_period - timedelta(hours=1),
+            last_update__lte=cur_period,
+        ).values_list("last_update", "count"):
+            hit_period = ReportHit.get_period(last_update)
+            hit_idx = int((hit_period - first_period) // timedelta(hours=1))
+            if 0 <= hit_idx < n_periods:
+                hits_per_hour[hit_idx] += count
 
         return Response(
             {
                 # [int, int, int] (day, week, month)
-                "totals": [totals.day, totals.week, totals.month],
+                "totals": [totals["day"], totals["week"], totals["month"]],
                 # { bucket_id: [day, week, month] }
                 # includes the top 10 for each time-frame, which usually overlap
                 "frequent_buckets": frequent_buckets,
@@ -1597,97 +1710,108 @@ class BucketSpikeViewSet(viewsets.GenericViewSet):
     authentication_classes = (TokenAuthentication, SessionAuthentication)
     serializer_class = BucketSpikeSerializer
 
+    # comments returned per spiking bucket, more are available from `comments`
+    COMMENTS_LIMIT = 50
+
+    lookup_value_regex = r"\d+"
+
+    def get_params(self, request):
+        params = BucketSpikeParamsSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        return params.validated_data
+
     def list(self, request):
-        short_window = request.query_params.get("short_window")
-        long_window = request.query_params.get("long_window")
-        threshold = request.query_params.get("threshold")
-        min_reports = request.query_params.get("min_reports")
-
-        return self.compute_spikes(
-            short_window=int(short_window),
-            long_window=int(long_window),
-            threshold=float(threshold),
-            min_reports=int(min_reports),
+        return self.compute_spikes(**self.get_params(request))
+
+    @action(detail=True, methods=["get"])
+    def comments(self, request, pk=None):
+        """Page through the short window comments of one bucket."""
+        bucket = get_object_or_404(Bucket, pk=pk)
+        short_window = self.get_params(request)["short_window"]
+        end_date = self.get_end_date()
+        if not end_date:
+            raise Http404()
+
+        short_window_start = end_date - timedelta(days=short_window - 1)
+        comments = self.get_comments(short_window_start, end_date).filter(bucket=bucket)
+
+        page = self.paginate_queryset(
+            comments.values_list("comments_translated", flat=True)
+        )
+        return self.get_paginated_response(
+            [html.unescape(comment.strip()) for comment in page]
         )
 
     def get_end_date(self):
-        """Get the end date based on the last bucketed report
+        """Get the end date based on the last day with bucketed reports
         (instead of using today's date as reports are delayed by a day).
         """
-        last_bucketed_report = (
-            ReportEntry.objects.filter(bucket__isnull=False)
-            .order_by("-reported_at")
-            .first()
+        return BucketDailyCount.objects.filter(count__gt=0).aggregate(
+            end_date=Max("day")
+        )["end_date"]
+
+    def fetch_bucket_counts(self, long_window_start, short_window_start, end_date):
+        """Sum the daily counters of each bucket over the long and short window."""
+        return (
+            BucketDailyCount.objects.filter(
+                day__gte=long_window_start,
+                day__lte=end_date,
+            )
+            .values("bucket_id", "bucket__domain")
+            .annotate(
+                long_count=Sum("count"),
+                short_count=Coalesce(
+                    Sum("count", filter=Q(day__gte=short_window_start)), 0
+                ),
+                short_count_with_comments=Coalesce(
+                    Sum(
+                        "count",
+                        filter=Q(day__gte=short_window_start, has_comments=True),
+                    ),
+                    0,
+                ),
+            )
+            .order_by()
         )
-        return last_bucketed_report.reported_at.date() if last_bucketed_report else None
 
-    def fetch_reports_data(self, long_window_start, short_window_start, end_date):
-        reports = (
+    def get_comments(self, short_window_start, end_date):
+        """Reports with translated comments in the short window, newest first."""
+        return (
             ReportEntry.objects.filter(
-                reported_at__date__gte=long_window_start,
+                reported_at__date__gte=short_window_start,
                 reported_at__date__lte=end_date,
-                bucket__isnull=False,
+                ml_valid_probability__gt=BucketDailyCount.COMMENT_MIN_VALID_PROBABILITY,
             )
-            .select_related("bucket")
-            .values_list(
-                "bucket_id",
-                "reported_at",
-                "comments",
-                "comments_translated",
-                "bucket__domain",
-                "ml_valid_probability",
-            )
-            .order_by("bucket_id", "-reported_at")
+            .exclude(comments_translated__isnull=True)
+            .exclude(comments_translated__regex=r"^\s*$")
+            .order_by("-reported_at")
         )
 
-        bucket_data = defaultdict(
-            lambda: {
-                "daily": defaultdict(lambda: {"total": 0, "with_comments": 0}),
-                "domain": None,
-                "comments": [],
-            }
+    def get_spike_comments(self, bucket_ids, short_window_start, end_date):
+        """Return the first COMMENTS_LIMIT + 1 comments of each of `bucket_ids`,
+        in one query."""
+        rows = (
+            self.get_comments(short_window_start, end_date)
+            .filter(bucket_id__in=bucket_ids)
+            .annotate(
+                row_number=Window(
+                    RowNumber(),
+                    partition_by=F("bucket_id"),
+                    order_by=F("reported_at").desc(),
+                )
+            )
+            .filter(row_number__lte=self.COMMENTS_LIMIT + 1)
+            .order_by("bucket_id", "row_number")
+            .values_list("bucket_id", "comments_translated")
         )
-
-        for (
-            bucket_id,
-            reported_at,
-            comments,
-            comments_translated,
-            bucket_domain,
-            ml_valid_probability,
-        ) in reports:
-            day = reported_at.date()
-            bucket = bucket_data[bucket_id]
-
-            bucket["daily"][day]["total"] += 1
-
-            if (
-                comments
-                and comments.strip()
-                and ml_valid_probability
-                and ml_valid_probability > 0.10
-            ):
-                bucket["daily"][day]["with_comments"] += 1
-
-            if bucket["domain"] is None:
-                bucket["domain"] = bucket_domain
-
-            # Collect translated comments for the short window
-            if (
-                day >= short_window_start
-                and comments_translated
-                and comments_translated.strip()
-                and ml_valid_probability
-                and ml_valid_probability > 0.10
-            ):
-                bucket["comments"].append(html.unescape(comments_translated.strip()))
-
-        return bucket_data
+        comments = {bucket_id: [] for bucket_id in bucket_ids}
+        for bucket_id, comment in rows:
+            comments[bucket_id].append(comment)
+        return comments
 
     def calculate_spike(
         self,
-        bucket_id,
-        bucket_info,
+        bucket_counts,
         short_window_start,
         short_window,
         long_window,
@@ -1695,19 +1819,8 @@ class BucketSpikeViewSet(viewsets.GenericViewSet):
         min_reports,
         end_date,
     ):
-        daily_counts = bucket_info["daily"]
-
-        short_count = sum(
-            counts["total"]
-            for date, counts in daily_counts.items()
-            if date >= short_window_start
-        )
-        short_count_with_comments = sum(
-            counts["with_comments"]
-            for date, counts in daily_counts.items()
-            if date >= short_window_start
-        )
-        long_count = sum(counts["total"] for counts in daily_counts.values())
+        short_count = bucket_counts["short_count"]
+        long_count = bucket_counts["long_count"]
 
         if long_count < min_reports:
             return None
@@ -1724,17 +1837,16 @@ class BucketSpikeViewSet(viewsets.GenericViewSet):
             return None
 
         return {
-            "bucket_id": bucket_id,
-            "bucket_domain": bucket_info["domain"],
+            "bucket_id": bucket_counts["bucket_id"],
+            "bucket_domain": bucket_counts["bucket__domain"],
             "short_count": short_count,
-            "short_count_with_comments": short_count_with_comments,
+            "short_count_with_comments": bucket_counts["short_count_with_comments"],
             "short_average": short_average,
             "long_average": long_average,
             "long_count": long_count,
             "ratio": round(ratio, 3),
             "short_window_start": short_window_start,
             "short_window_end": end_date,
-            "report_comments": bucket_info["comments"],
         }
 
     def compute_spikes(self, short_window, long_window, threshold, min_reports):
@@ -1752,15 +1864,12 @@ class BucketSpikeViewSet(viewsets.GenericViewSet):
         long_window_start = end_date - timedelta(days=long_window - 1)
         short_window_start = end_date - timedelta(days=short_window - 1)
 
-        bucket_data = self.fetch_reports_data(
-            long_window_start, short_window_start, end_date
-        )
-
         spikes_data = []
-        for bucket_id, bucket_info in bucket_data.items():
+        for bucket_counts in self.fetch_bucket_counts(
+            long_window_start, short_window_start, end_date
+        ):
             spike = self.calculate_spike(
-                bucket_id,
-                bucket_info,
+                bucket_counts,
                 short_window_start,
                 short_window,
                 long_window,
@@ -1773,6 +1882,19 @@ class BucketSpikeViewSet(viewsets.GenericViewSet):
 
         spikes_data.sort(key=lambda x: x["ratio"], reverse=True)
 
+        # only load comment text for spiking buckets, the rest can be paged in
+        # through the comments action
+        spike_comments = self.get_spike_comments(
+            [spike["bucket_id"] for spike in spikes_data], short_window_start, end_date
+        )
+        for spike in spikes_data:
+            comments = spike_comments[spike["bucket_id"]]
+            spike["report_comments"] = [
+                html.unescape(comment.strip())
+                for comment in comments[: self.COMMENTS_LIMIT]
+            ]
+            spike["more_comments"] = len(comments) > self.COMMENTS_LIMIT
+
         serializer = self.get_serializer(spikes_data, many=True)
         return Response(
             {
@@ -296,11 +296,38 @@ CSRF_TRUSTED_ORIGINS = ["http://localhost:8000", "http://127.0.0.1:8000"]
 # CLEANUP_REPORTS_AFTER_DAYS = 14
 # CLEANUP_FIXED_BUCKETS_AFTER_DAYS = 3
 # CLEANUP_CENTROIDS_AFTER_DAYS = 180
+# Hourly BucketHit rows older than this are folded into daily rows
+# COMPACT_BUCKET_HITS_AFTER_DAYS = 14
+# Number of Celery tasks triage_new_reports is split into, by domain (1 to
+# triage all reports in one task)
+# TRIAGE_SHARDS = 8
+# Maximum number of reports triaged (and held in memory) at once, domains with
+# more reports are triaged alone
+# TRIAGE_CHUNK_SIZE = 5000
+# Expired reports are moved to Parquet files in this directory instead of being
+# deleted, if set (requires pyarrow, see reportmanager.archive)
+# REPORT_ARCHIVE_DIR = BASE_DIR / "archive"
 ALLOW_EMAIL_EDITION = True
 
 # Redis configuration
 REDIS_URL = "redis://localhost:6379?db=0"  # unix sockets, use unix:///path/to/sock?db=0
 
+# Cache used for API responses (see reportmanager.views.cached_by_data_version).
+# Local memory caches are per process, use Redis to share one between workers:
+# CACHES = {
+#     "default": {
+#         "BACKEND": "django.core.cache.backends.redis.RedisCache",
+#         "LOCATION": "redis:///3",
+#     }
+# }
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    }
+}
+# Maximum age of a cached API response in seconds
+RESPONSE_CACHE_TIMEOUT = 600
+
 # Celery configuration
 USE_CELERY = True
 CELERY_ACCEPT_CONTENT = ["json", "pickle"]
@@ -317,9 +344,9 @@ CELERY_BEAT_SCHEDULE = {
     #     'task': 'reportmanager.cron.bug_update_status',
     #     'schedule': 15 * 60,
     # },
-    "Update ReportEntry stats every minute": {
+    "Check ReportEntry stats every hour": {
         "task": "reportmanager.cron.update_report_stats",
-        "schedule": 60,
+        "schedule": 60 * 60,
     },
     "Check for untriaged Reports every hour": {
         "task": "reportmanager.cron.triage_new_reports",
@@ -329,6 +356,10 @@ CELERY_BEAT_SCHEDULE = {
         "task": "reportmanager.cron.cleanup_old_reports",
         "schedule": 30 * 60,
     },
+    "Compact BucketHit rows every day": {
+        "task": "reportmanager.cron.compact_bucket_hits",
+        "schedule": 60 * 60 * 24,
+    },
     "Unset triage status for buckets every 6 hours": {
         "task": "reportmanager.cron.unset_buckets_triage_status",
         "schedule": 60 * 60 * 6,
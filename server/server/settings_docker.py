@@ -18,6 +18,12 @@ BASE_DIR = Path("/data")
 REDIS_URL = "redis://webcompatmanager-redis:6379?db=0"
 CELERY_BROKER_URL = "redis://webcompatmanager-redis/2"
 CELERY_RESULT_BACKEND = "redis://webcompatmanager-redis/1"
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": "redis://webcompatmanager-redis/3",
+    }
+}
 
 DATABASES = {
     "default": {
@@ -1,3 +1,6 @@
 from .settings import *  # noqa
 
 USE_CELERY = False
+
+# tests share database ids and data versions, don't let responses leak between them
+CACHES = {"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}
@@ -59,10 +59,27 @@ class Report:
 
     @classmethod
     def load(cls, data: str) -> Report:
-        result = json.loads(data)
-        result["details"] = json.loads(result["details"])
-        result["reported_at"] = isoparse(result["reported_at"]).replace(tzinfo=UTC)
-        result["url"] = urlsplit(result["url"])
+        return cls.from_dict(json.loads(data))
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> Report:
+        """Create a report from a decoded record, as found in JSON or columnar
+        exports. `details` may be given encoded or decoded, and `reported_at` as an
+        ISO 8601 string or a datetime.
+        """
+        result = dict(data)
+        if isinstance(result["details"], str):
+            result["details"] = json.loads(result["details"])
+        reported_at = result["reported_at"]
+        if isinstance(reported_at, str):
+            reported_at = isoparse(reported_at).replace(tzinfo=UTC)
+        elif reported_at.tzinfo is None:
+            reported_at = reported_at.replace(tzinfo=UTC)
+        else:
+            reported_at = reported_at.astimezone(UTC)
+        result["reported_at"] = reported_at
+        if isinstance(result["url"], str):
+            result["url"] = urlsplit(result["url"])
         return cls(**result)
 
     def create_signature(self) -> Signature:
@@ -0,0 +1,57 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+import json
+from datetime import datetime
+from uuid import uuid4
+
+import pytest
+from django.utils import timezone
+
+from reportmanager.models import ReportEntry
+from webcompat.models import Report
+
+
+@pytest.fixture
+def load_report():
+    """Return a factory of `Report` objects, as loaded from BigQuery.
+
+    Keyword arguments override the fields of the report. `domain` sets the URL,
+    datetimes and `details` dicts are serialized like in the BigQuery rows, and
+    every report gets a new UUID.
+    """
+
+    def load(domain="example.com", **fields):
+        data = {
+            "app_channel": "release",
+            "app_name": "Firefox",
+            "app_version": "130.0",
+            "breakage_category": None,
+            "comments": "",
+            "details": "{}",
+            "os": "Windows",
+            "reported_at": timezone.now(),
+            "url": f"https://{domain}/",
+            "uuid": str(uuid4()),
+            **fields,
+        }
+        if isinstance(data["reported_at"], datetime):
+            data["reported_at"] = data["reported_at"].isoformat()
+        if isinstance(data["details"], dict):
+            data["details"] = json.dumps(data["details"])
+        return Report.load(json.dumps(data))
+
+    return load
+
+
+@pytest.fixture
+def make_report(db, load_report):
+    """Return a factory of `ReportEntry` objects created in `bucket`, from the
+    report returned by `load_report(**fields)`."""
+
+    def make(bucket=None, **fields):
+        return ReportEntry.objects.create_from_report(
+            load_report(**fields), bucket_id=bucket.pk if bucket else None
+        )
+
+    return make
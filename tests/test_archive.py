@@ -0,0 +1,146 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+from datetime import UTC, date, datetime, timedelta
+
+import pytest
+from django.core.management import CommandError, call_command
+from django.utils import timezone
+
+from reportmanager import archive
+from reportmanager.models import Bucket, BucketHit, Bug, BugProvider, ReportEntry
+from webcompat.models import Report
+
+pytest.importorskip("pyarrow")
+
+
+def make_bucket(domain="example.com"):
+    return Bucket.objects.create(signature='{"symptoms": []}', domain=domain)
+
+
+@pytest.mark.django_db
+class TestArchive:
+    DAY = datetime(2026, 1, 1, 23, 30, tzinfo=UTC)
+
+    def test_archive_and_load(self, tmp_path, make_report):
+        bucket = make_bucket()
+        first = make_report(
+            bucket,
+            comments="first",
+            details={"boolean": {"x": True}},
+            reported_at=self.DAY,
+            url="https://example.com/page",
+        )
+        second = make_report(
+            bucket, comments="second", reported_at=self.DAY + timedelta(hours=1)
+        )
+        kept = make_report(reported_at=self.DAY + timedelta(days=5))
+
+        archived = archive.archive_reports(
+            ReportEntry.objects.exclude(pk=kept.pk), tmp_path, batch_size=1
+        )
+
+        assert archived == 2
+        assert list(ReportEntry.objects.values_list("pk", flat=True)) == [kept.pk]
+        assert not BucketHit.objects.filter(bucket=bucket, count__gt=0).exists()
+        assert sorted(
+            p.relative_to(tmp_path).as_posix() for p in tmp_path.rglob("*")
+        ) == [
+            "reported_date=2026-01-01",
+            f"reported_date=2026-01-01/{first.pk}-{first.pk}.parquet",
+            "reported_date=2026-01-02",
+            f"reported_date=2026-01-02/{second.pk}-{second.pk}.parquet",
+        ]
+
+        records = list(
+            archive.iter_archived_records(tmp_path, date(2026, 1, 1), date(2026, 1, 1))
+        )
+        assert [(r["id"], r["bucket_id"]) for r in records] == [(first.pk, bucket.pk)]
+
+        reports = list(
+            archive.load_archived_reports(tmp_path, date(2026, 1, 1), date(2026, 1, 3))
+        )
+        assert [r.comments for r in reports] == ["first", "second"]
+        assert reports[0].uuid == str(first.uuid)
+        assert reports[0].reported_at == self.DAY
+        assert reports[0].details == {"boolean": {"x": True}}
+        assert reports[0].url.geturl() == "https://example.com/page"
+
+    def test_load_missing_range(self, tmp_path):
+        assert not list(
+            archive.load_archived_reports(tmp_path, date(2026, 1, 1), date(2026, 1, 2))
+        )
+
+    def test_export(self, tmp_path, make_report):
+        entry = make_report(reported_at=self.DAY)
+        archive.archive_reports(ReportEntry.objects.all(), tmp_path)
+        output = tmp_path / "export.ndjson"
+
+        call_command(
+            "export_archived_reports",
+            since=date(2026, 1, 1),
+            until=date(2026, 1, 1),
+            archive_dir=tmp_path,
+            output=output,
+        )
+
+        (line,) = output.read_text().splitlines()
+        report = Report.load(line)
+        assert report.uuid == str(entry.uuid)
+        assert report.reported_at == self.DAY
+
+
+@pytest.mark.django_db
+class TestCleanupArchive:
+    def test_cleanup_archives_old_reports(self, settings, tmp_path, make_report):
+        settings.CLEANUP_REPORTS_AFTER_DAYS = 14
+        settings.REPORT_ARCHIVE_DIR = tmp_path
+        now = timezone.now()
+        old = make_report(reported_at=now - timedelta(days=30))
+        recent = make_report(reported_at=now - timedelta(days=1))
+
+        call_command("cleanup_old_reports", leave_empty_buckets=True)
+
+        assert list(ReportEntry.objects.values_list("pk", flat=True)) == [recent.pk]
+        (path,) = tmp_path.rglob("*.parquet")
+        assert path.parent.name == f"reported_date={old.reported_at.date()}"
+
+    def test_cleanup_archives_reports_of_closed_bugs(
+        self, settings, tmp_path, make_report
+    ):
+        settings.REPORT_ARCHIVE_DIR = tmp_path
+        provider = BugProvider.objects.create(
+            classname="BugzillaProvider",
+            hostname="bugzilla.example.com",
+            url_template="https://bugzilla.example.com/%s",
+        )
+        bug = Bug.objects.create(
+            external_id="1",
+            external_type=provider,
+            closed=timezone.now() - timedelta(days=30),
+        )
+        bucket = make_bucket()
+        bucket.bug = bug
+        bucket.save()
+        entry = make_report(bucket)
+
+        call_command("cleanup_old_reports", leave_empty_buckets=True)
+
+        assert not Bucket.objects.filter(pk=bucket.pk).exists()
+        (path,) = tmp_path.rglob("*.parquet")
+        assert path.name == f"{entry.pk}-{entry.pk}.parquet"
+
+    def test_cleanup_requires_pyarrow(
+        self, settings, tmp_path, monkeypatch, make_report
+    ):
+        monkeypatch.setattr(archive, "pyarrow", None)
+        settings.REPORT_ARCHIVE_DIR = tmp_path
+        entry = make_report(reported_at=timezone.now() - timedelta(days=30))
+        empty = make_bucket()
+
+        with pytest.raises(CommandError, match="pyarrow"):
+            call_command("cleanup_old_reports")
+
+        # fails before cleaning up anything
+        assert ReportEntry.objects.filter(pk=entry.pk).exists()
+        assert Bucket.objects.filter(pk=empty.pk).exists()
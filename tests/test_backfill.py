@@ -0,0 +1,95 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+from types import SimpleNamespace
+
+import pytest
+
+from reportmanager.management.commands.backfill_missing_report_data import Command
+from reportmanager.models import Bucket, BucketSummaryCount
+
+
+class StubClient:
+    """Stands in for the BigQuery client, answering from in-memory rows."""
+
+    def __init__(self, rows):
+        self.rows = {row.uuid: row for row in rows}
+        self.queries = 0
+
+    def query(self, query, job_config):
+        self.queries += 1
+        (param,) = job_config.query_parameters
+        return [self.rows[uuid] for uuid in param.values if uuid in self.rows]
+
+
+def make_row(entry, **kwargs):
+    row = {
+        "uuid": str(entry.uuid),
+        "ml_label": "valid",
+        "ml_probability": 0.9,
+        "language_code": None,
+        "translated_text": None,
+        "country": "DE",
+    }
+    row.update(kwargs)
+    return SimpleNamespace(**row)
+
+
+@pytest.mark.django_db
+class TestBackfill:
+    def test_backfill_in_concurrent_batches(self, monkeypatch, make_report):
+        monkeypatch.setattr(Command, "BQ_BATCH_SIZE", 2)
+        monkeypatch.setattr(Command, "BQ_WORKERS", 2)
+        bucket = Bucket.objects.create(
+            signature='{"symptoms": []}', description="domain is example.com"
+        )
+        entries = [make_report(bucket, comments="broken") for _ in range(4)]
+        translated = make_report(bucket, comments="kaputt")
+        complete = make_report(
+            comments="broken", ml_valid_probability=0.5, country="FR"
+        )
+        client = StubClient(
+            [make_row(entry) for entry in entries]
+            + [
+                make_row(
+                    translated,
+                    language_code="de",
+                    translated_text="  broken  ",
+                    country=None,
+                ),
+                make_row(complete),
+            ]
+        )
+
+        Command().run_backfill(client=client)
+
+        assert client.queries == 3
+        for entry in entries:
+            entry.refresh_from_db()
+            assert entry.ml_valid_probability == 0.9
+            assert entry.country == "DE"
+            # re-triaged
+            assert entry.bucket_id is None
+        translated.refresh_from_db()
+        assert translated.comments_translated == "  broken  "
+        assert translated.comments_original_language == "de"
+        assert translated.comments_preprocessed == "broken"
+        assert translated.country is None
+        complete.refresh_from_db()
+        assert (complete.ml_valid_probability, complete.country) == (0.5, "FR")
+        assert (
+            sum(
+                BucketSummaryCount.objects.filter(bucket=bucket).values_list(
+                    "count", flat=True
+                )
+            )
+            == 0
+        )
+
+    def test_nothing_to_backfill(self, make_report):
+        make_report(comments="broken", ml_valid_probability=0.5, country="FR")
+        client = StubClient([])
+
+        Command().run_backfill(client=client)
+
+        assert client.queries == 0
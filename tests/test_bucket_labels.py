@@ -1,12 +1,16 @@
 from io import StringIO
+from unittest.mock import patch
 
 import pytest
 from django.core.management import CommandError, call_command
+from django.db import transaction
 
 from reportmanager.management.commands.label_buckets import (
     get_or_create_source_label,
     reconcile_all_buckets_for_source,
     reconcile_bucket_for_label,
+    reconcile_buckets_for_source,
+    reconcile_domains_for_source,
 )
 from reportmanager.models import (
     Bucket,
@@ -14,6 +18,7 @@ from reportmanager.models import (
     DomainEntry,
     DomainSource,
     Label,
+    new_bucket_labeling,
 )
 
 
@@ -21,6 +26,12 @@ def make_bucket(domain: str | None = None) -> Bucket:
     return Bucket.objects.create(signature='{"symptoms": []}', domain=domain)
 
 
+@pytest.fixture(autouse=True)
+def clear_new_bucket_labeling():
+    # buckets of rolled back test transactions are never flushed
+    new_bucket_labeling.bucket_ids.clear()
+
+
 @pytest.fixture
 def nsfw_source(db):
     src = DomainSource.objects.create(
@@ -97,6 +108,132 @@ class TestReconcileAllBucketsForSource:
         assert removed == 1
 
 
+@pytest.mark.django_db
+class TestReconcileDomainsForSource:
+    def test_labels_added_and_unlabels_removed_domains(self, nsfw_source):
+        label = get_or_create_source_label("nsfw")
+        added = make_bucket(domain="www.added.com")
+        removed = make_bucket(domain="gone.com")
+        BucketLabel.objects.create(bucket=removed, label=label)
+        DomainEntry.objects.create(domain_source=nsfw_source, domain="added.com")
+
+        created_count, removed_count = reconcile_domains_for_source(
+            "nsfw", {"added.com"}, {"gone.com"}
+        )
+
+        assert (created_count, removed_count) == (1, 1)
+        assert added.labels.filter(label=label).exists()
+        assert not removed.labels.exists()
+
+    def test_only_touches_changed_domains(self, nsfw_source):
+        label = get_or_create_source_label("nsfw")
+        # inconsistent, but not part of the change
+        unchanged = make_bucket(domain="example.com")
+        BucketLabel.objects.filter(bucket=unchanged).delete()
+        added = make_bucket(domain="badsite.com")
+
+        assert reconcile_domains_for_source("nsfw", {"badsite.com"}, set()) == (1, 0)
+        assert reconcile_domains_for_source("nsfw", {"badsite.com"}, set()) == (0, 0)
+        assert not unchanged.labels.exists()
+        assert BucketLabel.objects.filter(bucket=added, label=label).count() == 1
+
+    def test_reconciles_all_buckets_without_label(self, nsfw_source):
+        bucket = make_bucket(domain="example.com")
+        assert not Label.objects.exists()
+
+        assert reconcile_domains_for_source("nsfw", set(), set()) == (1, 0)
+        assert bucket.labels.filter(label__name="nsfw").exists()
+
+
+@pytest.mark.django_db
+class TestReconcileBucketsForSource:
+    def test_labels_and_unlabels_buckets(self, nsfw_source):
+        label = get_or_create_source_label("nsfw")
+        match = make_bucket(domain="www.example.com")
+        other = make_bucket(domain="unrelated.com")
+        stale = make_bucket(domain="oldsite.com")
+        BucketLabel.objects.create(bucket=stale, label=label)
+
+        created, removed = reconcile_buckets_for_source(
+            [match.pk, other.pk, stale.pk, 99999], "nsfw"
+        )
+
+        assert (created, removed) == (1, 1)
+        assert set(BucketLabel.objects.values_list("bucket_id", flat=True)) == {
+            match.pk
+        }
+
+    def test_one_lookup_per_source(self, nsfw_source, django_assert_num_queries):
+        get_or_create_source_label("nsfw")
+        buckets = [make_bucket(domain=f"site{i}.com") for i in range(5)]
+
+        # source, label, buckets, domain entries and existing labels
+        with django_assert_num_queries(5):
+            reconcile_buckets_for_source([b.pk for b in buckets], "nsfw")
+
+
+@pytest.mark.django_db
+class TestNewBucketLabeling:
+    def test_buckets_of_a_transaction_are_labeled_together(
+        self, nsfw_source, settings, django_capture_on_commit_callbacks
+    ):
+        settings.USE_CELERY = True
+        with (
+            patch("reportmanager.tasks.label_buckets.apply_async") as apply_async,
+            django_capture_on_commit_callbacks(execute=True),
+        ):
+            buckets = [make_bucket(domain=f"site{i}.com") for i in range(3)]
+            make_bucket()
+
+        apply_async.assert_called_once_with(([b.pk for b in buckets],))
+
+    def test_deferred_buckets_are_labeled_at_exit(
+        self, nsfw_source, django_capture_on_commit_callbacks
+    ):
+        with (
+            patch("reportmanager.models.call_command") as call_command,
+            django_capture_on_commit_callbacks(execute=True),
+        ):
+            with new_bucket_labeling.deferred():
+                buckets = [
+                    make_bucket(domain="example.com"),
+                    make_bucket(domain="unrelated.com"),
+                ]
+                call_command.assert_not_called()
+
+        call_command.assert_called_once_with(
+            "label_buckets", bucket_ids=[b.pk for b in buckets]
+        )
+
+    def test_flush_is_scheduled_once_per_transaction(
+        self, nsfw_source, django_capture_on_commit_callbacks
+    ):
+        with django_capture_on_commit_callbacks() as callbacks:
+            for i in range(3):
+                make_bucket(domain=f"site{i}.com")
+
+        assert callbacks.count(new_bucket_labeling.flush) == 1
+
+    @pytest.mark.django_db(transaction=True)
+    def test_flush_is_scheduled_after_a_rollback(self, nsfw_source):
+        with patch("reportmanager.models.call_command") as call_command:
+            with pytest.raises(RuntimeError), transaction.atomic():
+                make_bucket(domain="site1.com")
+                raise RuntimeError
+
+            with transaction.atomic():
+                bucket = make_bucket(domain="site2.com")
+
+        (call,) = call_command.call_args_list
+        assert bucket.pk in call.kwargs["bucket_ids"]
+
+    def test_labels_new_buckets(self, nsfw_source, django_capture_on_commit_callbacks):
+        with django_capture_on_commit_callbacks(execute=True):
+            bucket = make_bucket(domain="example.com")
+
+        assert bucket.labels.filter(label__name="nsfw").exists()
+
+
 @pytest.mark.django_db
 class TestReconcileBucketForLabel:
     def test_labels_matching_bucket(self, nsfw_source):
@@ -182,3 +319,11 @@ class TestLabelBucketsCommand:
         call_command("label_buckets", bucket_id=bucket_match.pk)
         assert bucket_match.labels.filter(label__name="nsfw").exists()
         assert not bucket_other.labels.exists()
+
+    def test_with_bucket_ids_processes_those_buckets(self, nsfw_source):
+        buckets = [make_bucket(domain="example.com"), make_bucket(domain="badsite.com")]
+        bucket_other = make_bucket(domain="badsite.com")
+        call_command("label_buckets", bucket_ids=[b.pk for b in buckets])
+        for bucket in buckets:
+            assert bucket.labels.filter(label__name="nsfw").exists()
+        assert not bucket_other.labels.exists()
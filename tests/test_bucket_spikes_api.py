@@ -0,0 +1,168 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+from datetime import UTC, datetime, timedelta
+from unittest.mock import ANY
+
+import pytest
+from django.contrib.auth.models import Permission
+from django.contrib.auth.models import User as DjangoUser
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from reportmanager.models import Bucket, BucketDailyCount, ReportEntry
+from reportmanager.models import User as ReportManagerUser
+from reportmanager.views import BucketSpikeViewSet
+
+END = datetime(2026, 3, 31, 12, tzinfo=UTC)
+
+
+def make_bucket(domain="example.com"):
+    return Bucket.objects.create(signature='{"symptoms": []}', domain=domain)
+
+
+@pytest.fixture
+def make_reports(make_report):
+    def make(bucket, count, days_ago, comment=None, ml_valid_probability=0.9):
+        for _ in range(count):
+            make_report(
+                bucket,
+                domain=bucket.domain,
+                comments=comment or "",
+                comments_translated=comment,
+                ml_valid_probability=ml_valid_probability,
+                reported_at=END - timedelta(days=days_ago),
+            )
+
+    return make
+
+
+@pytest.fixture
+def authed_client(db):
+    """Create a user with read permissions and return an authenticated APIClient."""
+    user = DjangoUser.objects.create_user(
+        username="testuser", password="testpass", email="testuser@example.com"
+    )
+    ct = ContentType.objects.get_for_model(ReportManagerUser)
+    for codename in ("reportmanager_visible", "reportmanager_read"):
+        perm = Permission.objects.get(content_type=ct, codename=codename)
+        user.user_permissions.add(perm)
+
+    token, _ = Token.objects.get_or_create(user=user)
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+    return client
+
+
+@pytest.mark.django_db
+class TestBucketDailyCount:
+    def test_counts_follow_reports(self, make_reports):
+        bucket = make_bucket()
+        make_reports(bucket, 2, 0, comment="broken")
+        make_reports(bucket, 1, 0, comment="broken", ml_valid_probability=0.05)
+        make_reports(bucket, 1, 1)
+
+        rows = BucketDailyCount.objects.filter(bucket=bucket)
+        assert sorted(rows.values_list("day", "has_comments", "count")) == [
+            ((END - timedelta(days=1)).date(), False, 1),
+            (END.date(), False, 1),
+            (END.date(), True, 2),
+        ]
+
+        ReportEntry.objects.filter(bucket=bucket, comments="").delete()
+        assert sorted(rows.values_list("day", "has_comments", "count")) == [
+            ((END - timedelta(days=1)).date(), False, 0),
+            (END.date(), False, 1),
+            (END.date(), True, 2),
+        ]
+
+
+@pytest.mark.django_db
+class TestBucketSpikesEndpoint:
+    URL = "/reportmanager/rest/bucket-spikes/"
+    PARAMS = {"short_window": 3, "long_window": 30, "threshold": 2, "min_reports": 5}
+
+    def test_detects_spike(self, authed_client, make_reports):
+        spiking = make_bucket("spiking.com")
+        make_reports(spiking, 1, 20)
+        make_reports(spiking, 4, 1, comment="site is broken")
+        make_reports(spiking, 2, 0)
+        steady = make_bucket("steady.com")
+        for days_ago in range(0, 30, 3):
+            make_reports(steady, 1, days_ago, comment="slow")
+
+        response = authed_client.get(self.URL, self.PARAMS)
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["short_window_end"] == str(END.date())
+        assert len(data["spikes"]) == 1
+        spike = data["spikes"][0]
+        assert spike["bucket_id"] == spiking.pk
+        assert spike["bucket_domain"] == "spiking.com"
+        assert spike["short_count"] == 6
+        assert spike["short_count_with_comments"] == 4
+        assert spike["long_count"] == 7
+        assert spike["report_comments"] == ["site is broken"] * 4
+        assert spike["more_comments"] is False
+
+    def test_comments_are_capped_and_paged(
+        self, authed_client, monkeypatch, make_reports
+    ):
+        monkeypatch.setattr(BucketSpikeViewSet, "COMMENTS_LIMIT", 2)
+        bucket = make_bucket("spiking.com")
+        make_reports(bucket, 5, 0, comment="broken")
+
+        response = authed_client.get(self.URL, self.PARAMS)
+
+        spike = response.json()["spikes"][0]
+        assert spike["report_comments"] == ["broken", "broken"]
+        assert spike["more_comments"] is True
+
+        response = authed_client.get(
+            f"{self.URL}{bucket.pk}/comments/",
+            {"short_window": 3, "limit": 3, "offset": 3},
+        )
+
+        assert response.status_code == 200
+        assert response.json()["count"] == 5
+        assert response.json()["results"] == ["broken", "broken"]
+
+    def test_comments_of_spikes_in_one_query(self, authed_client, make_reports):
+        for domain in ("a.com", "b.com", "c.com"):
+            make_reports(make_bucket(domain), 5, 0, comment=f"{domain} is broken")
+
+        with CaptureQueriesContext(connection) as queries:
+            response = authed_client.get(self.URL, self.PARAMS)
+
+        spikes = response.json()["spikes"]
+        assert sorted(spike["report_comments"][0] for spike in spikes) == [
+            f"{domain} is broken" for domain in ("a.com", "b.com", "c.com")
+        ]
+        assert [q for q in queries if "comments_translated" in q["sql"]] == [ANY]
+
+    @pytest.mark.parametrize("params", [{"short_window": "x"}, {"short_window": 0}])
+    def test_invalid_params(self, authed_client, params):
+        bucket = make_bucket()
+
+        response = authed_client.get(self.URL, {**self.PARAMS, **params})
+        assert response.status_code == 400
+
+        response = authed_client.get(f"{self.URL}{bucket.pk}/comments/", params)
+        assert response.status_code == 400
+
+    def test_comments_of_unknown_bucket(self, authed_client, make_reports):
+        make_reports(make_bucket(), 1, 0, comment="broken")
+
+        for pk in (0, "x"):
+            response = authed_client.get(f"{self.URL}{pk}/comments/")
+            assert response.status_code == 404
+
+    def test_no_reports(self, authed_client):
+        response = authed_client.get(self.URL, self.PARAMS)
+
+        assert response.status_code == 200
+        assert response.json()["spikes"] == []
@@ -0,0 +1,286 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+import json
+from datetime import UTC, datetime, timedelta
+
+import pytest
+
+from reportmanager.models import (
+    CONTENT_BLOCKED_DETAIL,
+    PRIVATE_BROWSING_DETAIL,
+    Bucket,
+    BucketCounterDeltas,
+    BucketHit,
+    BucketHitResolution,
+    BucketSummaryCount,
+    ReportEntry,
+)
+
+
+def make_bucket(domain="example.com"):
+    return Bucket.objects.create(signature='{"symptoms": []}', domain=domain)
+
+
+@pytest.fixture
+def make_report(make_report):
+    """Create entries with the details flags counted by the summaries."""
+
+    def make(bucket=None, *, private_browsing=False, content_blocked=False, **fields):
+        details = {
+            "boolean": {
+                PRIVATE_BROWSING_DETAIL: private_browsing,
+                CONTENT_BLOCKED_DETAIL: content_blocked,
+            }
+        }
+        fields.setdefault("reported_at", datetime(2026, 1, 1, 12, tzinfo=UTC))
+        return make_report(bucket, details=details, **fields)
+
+    return make
+
+
+def summary_counts(bucket):
+    return sum(
+        BucketSummaryCount.objects.filter(bucket=bucket).values_list("count", flat=True)
+    )
+
+
+def hit_counts(bucket):
+    return dict(BucketHit.objects.filter(bucket=bucket).values_list("begin", "count"))
+
+
+def test_get_details_flags():
+    assert ReportEntry.get_details_flags({}) == (False, False)
+    assert ReportEntry.get_details_flags({"boolean": None}) == (False, False)
+    assert ReportEntry.get_details_flags(
+        {"boolean": {PRIVATE_BROWSING_DETAIL: True, CONTENT_BLOCKED_DETAIL: "true"}}
+    ) == (True, False)
+
+
+@pytest.mark.django_db
+class TestBucketSummaryCount:
+    def test_flags_extracted_on_create(self, make_report):
+        entry = make_report(private_browsing=True, content_blocked=True)
+
+        entry.refresh_from_db()
+        assert entry.private_browsing
+        assert entry.content_blocked
+
+    def test_counted_on_create_and_delete(self, make_report):
+        bucket = make_bucket()
+        entry = make_report(bucket)
+        make_report(bucket)
+
+        assert summary_counts(bucket) == 2
+        entry.delete()
+        assert summary_counts(bucket) == 1
+
+    def test_moved_on_bucket_change(self, make_report):
+        old, new = make_bucket("old.com"), make_bucket("new.com")
+        entry = make_report(old)
+
+        entry = ReportEntry.objects.get(pk=entry.pk)
+        entry.bucket = new
+        entry.save()
+
+        assert summary_counts(old) == 0
+        assert summary_counts(new) == 1
+
+    def test_unrelated_save_does_not_count(self, make_report):
+        bucket = make_bucket()
+        entry = make_report(bucket)
+
+        entry = ReportEntry.objects.get(pk=entry.pk)
+        entry.save(update_fields=["comments"])
+
+        assert summary_counts(bucket) == 1
+
+    def test_reassign(self, make_report):
+        old, new = make_bucket("old.com"), make_bucket("new.com")
+        entry = make_report(old)
+        new.signature = json.dumps(
+            {"symptoms": [{"type": "url", "part": "hostname", "value": "example.com"}]}
+        )
+        new.priority = old.priority + 1
+        new.save()
+
+        new.reassign(True)
+
+        assert ReportEntry.objects.get(pk=entry.pk).bucket_id == new.pk
+        assert summary_counts(old) == 0
+        assert summary_counts(new) == 1
+
+    def test_summarize(self, make_report):
+        bucket = make_bucket()
+        make_report(bucket, os="Windows", app_version="130.0.1", private_browsing=True)
+        make_report(bucket, os="Windows", app_version="130.0.2", content_blocked=True)
+        make_report(bucket, os="Linux", app_version="131.0")
+        make_report(bucket, os="Android", app_version="130.0")
+
+        assert BucketSummaryCount.summarize(bucket.pk) == {
+            "total": 4,
+            "desktop": {
+                "total": 3,
+                "os": {"Windows": 2, "Linux": 1},
+                "browser_versions": {"Firefox 130": 2, "Firefox 131": 1},
+            },
+            "mobile": {
+                "total": 1,
+                "os": {"Android": 1},
+                "browser_versions": {"Firefox 130": 1},
+            },
+            "pbm_enabled": 1,
+            "content_blocked": 1,
+        }
+
+    def test_summarize_empty_bucket(self, make_report):
+        bucket = make_bucket()
+        entry = make_report(bucket)
+        entry.delete()
+
+        summary = BucketSummaryCount.summarize(bucket.pk)
+        assert summary["total"] == 0
+        assert summary["desktop"]["os"] == {}
+
+
+@pytest.mark.django_db
+class TestBucketHit:
+    NOON = datetime(2026, 1, 1, 12, tzinfo=UTC)
+    ONE = datetime(2026, 1, 1, 13, tzinfo=UTC)
+
+    @pytest.fixture(autouse=True)
+    def hourly(self, settings):
+        # these hours must not be past the compaction horizon
+        settings.COMPACT_BUCKET_HITS_AFTER_DAYS = 36500
+
+    def test_adjust_counts(self):
+        bucket = make_bucket()
+        BucketHit.objects.create(bucket=bucket, begin=self.NOON, count=2)
+
+        BucketHit.bulk_adjust_counts(
+            {(bucket.pk, self.NOON): 3, (bucket.pk, self.ONE): 1}
+        )
+        assert hit_counts(bucket) == {self.NOON: 5, self.ONE: 1}
+
+        BucketHit.bulk_adjust_counts(
+            {
+                (bucket.pk, self.NOON): -2,
+                (bucket.pk, self.ONE): -4,
+                (bucket.pk, datetime(2026, 1, 1, 14, tzinfo=UTC)): -1,
+            }
+        )
+        # never below zero, and no rows for decrements alone
+        assert hit_counts(bucket) == {self.NOON: 3, self.ONE: 0}
+
+    def test_adjust_counts_in_place(self, django_assert_num_queries):
+        buckets = [make_bucket(f"site{i}.com") for i in range(3)]
+        deltas = {(bucket.pk, self.NOON): 1 for bucket in buckets}
+
+        # savepoint, insert of the missing rows, update and release
+        with django_assert_num_queries(4):
+            BucketHit.bulk_adjust_counts(deltas)
+        with django_assert_num_queries(4):
+            BucketHit.bulk_adjust_counts(deltas)
+
+        for bucket in buckets:
+            assert hit_counts(bucket) == {self.NOON: 2}
+
+    def test_moved_on_bucket_change(self, make_report):
+        old, new = make_bucket("old.com"), make_bucket("new.com")
+        entry = make_report(old)
+        assert hit_counts(old) == {self.NOON: 1}
+
+        entry = ReportEntry.objects.get(pk=entry.pk)
+        entry.bucket = new
+        entry.save()
+
+        assert hit_counts(old) == {self.NOON: 0}
+        assert hit_counts(new) == {self.NOON: 1}
+
+    def test_deferred_deletes(self, make_report):
+        bucket = make_bucket()
+        entries = [make_report(bucket) for _ in range(3)]
+
+        with BucketCounterDeltas.deferred():
+            for entry in entries[:2]:
+                entry.delete()
+            assert summary_counts(bucket) == 3
+
+        assert summary_counts(bucket) == 1
+        assert hit_counts(bucket) == {self.NOON: 1}
+
+
+@pytest.mark.django_db
+class TestBucketHitCompaction:
+    @pytest.fixture(autouse=True)
+    def horizon(self, settings):
+        settings.COMPACT_BUCKET_HITS_AFTER_DAYS = 14
+        return BucketHit.get_compaction_horizon()
+
+    @staticmethod
+    def rows(bucket):
+        return set(
+            BucketHit.objects.filter(bucket=bucket).values_list(
+                "begin", "resolution", "count"
+            )
+        )
+
+    def test_compact(self, horizon):
+        bucket, other = make_bucket(), make_bucket("other.com")
+        old_day = horizon - timedelta(days=2)
+        recent = horizon + timedelta(hours=5)
+        for hour in (0, 5, 23):
+            BucketHit.objects.create(
+                bucket=bucket, begin=old_day + timedelta(hours=hour), count=hour + 1
+            )
+        BucketHit.objects.create(bucket=bucket, begin=recent, count=4)
+        BucketHit.objects.create(bucket=other, begin=old_day, count=0)
+
+        assert BucketHit.compact(batch_size=2) == 4
+
+        assert self.rows(bucket) == {
+            (old_day, BucketHitResolution.DAY, 31),
+            (recent, BucketHitResolution.HOUR, 4),
+        }
+        assert not self.rows(other)
+        assert BucketHit.compact() == 0
+
+    def test_decrement_compacted_hour(self, horizon):
+        bucket = make_bucket()
+        hour = horizon - timedelta(days=1) + timedelta(hours=3)
+        BucketHit.bulk_adjust_counts({(bucket.pk, hour): 3})
+        BucketHit.compact()
+
+        BucketHit.bulk_adjust_counts({(bucket.pk, hour): -2})
+
+        # kept aside until the next compaction
+        assert self.rows(bucket) == {
+            (BucketHit.get_day(hour), BucketHitResolution.DAY, 3),
+            (hour, BucketHitResolution.HOUR, -2),
+        }
+        BucketHit.compact()
+        assert self.rows(bucket) == {
+            (BucketHit.get_day(hour), BucketHitResolution.DAY, 1)
+        }
+
+    def test_history_merges_resolutions(self, horizon):
+        bucket = make_bucket()
+        old_day = horizon - timedelta(days=1)
+        BucketHit.bulk_adjust_counts(
+            {
+                (bucket.pk, old_day + timedelta(hours=2)): 2,
+                (bucket.pk, horizon + timedelta(hours=1)): 1,
+            }
+        )
+        BucketHit.compact()
+        # not compacted yet
+        BucketHit.bulk_adjust_counts({(bucket.pk, old_day + timedelta(hours=4)): 1})
+
+        history = BucketHit.get_history([bucket.pk], old_day + timedelta(hours=1))
+
+        assert history == {
+            bucket.pk: [
+                {"begin": old_day, "count": 3},
+                {"begin": horizon + timedelta(hours=1), "count": 1},
+            ]
+        }
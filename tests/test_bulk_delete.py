@@ -0,0 +1,98 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+from datetime import timedelta
+from unittest.mock import patch
+
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.db.models.signals import post_delete
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from reportmanager.models import (
+    Bucket,
+    BucketDailyCount,
+    BucketHit,
+    BucketSummaryCount,
+    Cluster,
+    ReportEntry,
+)
+
+
+def make_bucket(domain="example.com"):
+    return Bucket.objects.create(signature='{"symptoms": []}', domain=domain)
+
+
+def counts(bucket):
+    return tuple(
+        sum(model.objects.filter(bucket=bucket).values_list("count", flat=True))
+        for model in (BucketHit, BucketSummaryCount, BucketDailyCount)
+    )
+
+
+@pytest.mark.django_db
+class TestBulkDelete:
+    def test_deletes_and_decrements_counters(self, make_report):
+        bucket, other = make_bucket(), make_bucket("other.com")
+        entries = [make_report(bucket) for _ in range(5)]
+        kept = make_report(other)
+        make_report()
+        assert counts(bucket) == (5, 5, 5)
+
+        with patch.object(post_delete, "send") as send:
+            deleted = ReportEntry.objects.bulk_delete(
+                ReportEntry.objects.exclude(pk=kept.pk), batch_size=2
+            )
+
+        send.assert_not_called()
+        assert deleted == 6
+        assert list(ReportEntry.objects.values_list("pk", flat=True)) == [kept.pk]
+        assert counts(bucket) == (0, 0, 0)
+        assert counts(other) == (1, 1, 1)
+        assert not ReportEntry.objects.filter(pk__in=[e.pk for e in entries]).exists()
+
+    def test_clears_cluster_centroids(self, make_report):
+        entry = make_report()
+        cluster = Cluster.objects.create(domain="example.com", centroid=entry)
+
+        assert ReportEntry.objects.bulk_delete() == 1
+
+        cluster.refresh_from_db()
+        assert cluster.centroid is None
+
+    def test_keeps_unselected_entries_within_batch_ranges(self, make_report):
+        bucket = make_bucket()
+        entries = [make_report(bucket, comments="x" * (i % 2)) for i in range(6)]
+
+        deleted = ReportEntry.objects.bulk_delete(
+            ReportEntry.objects.filter(comments_length=1), batch_size=2
+        )
+
+        assert deleted == 3
+        assert list(
+            ReportEntry.objects.order_by("pk").values_list("pk", flat=True)
+        ) == [e.pk for e in entries[::2]]
+        assert counts(bucket) == (3, 3, 3)
+
+    def test_nothing_to_delete(self):
+        with CaptureQueriesContext(connection) as queries:
+            assert ReportEntry.objects.bulk_delete() == 0
+
+        assert not [q for q in queries if q["sql"].startswith(("DELETE", "UPDATE"))]
+
+
+@pytest.mark.django_db
+class TestCleanupOldReports:
+    def test_removes_old_reports(self, settings, make_report):
+        settings.CLEANUP_REPORTS_AFTER_DAYS = 14
+        bucket = make_bucket()
+        now = timezone.now()
+        make_report(bucket, reported_at=now - timedelta(days=30))
+        recent = make_report(bucket, reported_at=now - timedelta(days=1))
+
+        call_command("cleanup_old_reports", leave_empty_buckets=True)
+
+        assert list(ReportEntry.objects.values_list("pk", flat=True)) == [recent.pk]
+        assert counts(bucket) == (1, 1, 1)
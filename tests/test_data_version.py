@@ -0,0 +1,166 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+from unittest.mock import patch
+
+import pytest
+from django.contrib.auth.models import Permission
+from django.contrib.auth.models import User as DjangoUser
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from reportmanager.models import Bucket, DataVersion
+from reportmanager.models import User as ReportManagerUser
+
+
+def make_bucket(domain="example.com"):
+    return Bucket.objects.create(signature='{"symptoms": []}', domain=domain)
+
+
+@pytest.fixture
+def authed_client(db):
+    """Create a user with read permissions and return an authenticated APIClient."""
+    user = DjangoUser.objects.create_user(
+        username="testuser", password="testpass", email="testuser@example.com"
+    )
+    ct = ContentType.objects.get_for_model(ReportManagerUser)
+    for codename in ("reportmanager_visible", "reportmanager_read"):
+        perm = Permission.objects.get(content_type=ct, codename=codename)
+        user.user_permissions.add(perm)
+
+    token, _ = Token.objects.get_or_create(user=user)
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+    return client
+
+
+@pytest.fixture
+def response_cache(settings):
+    settings.CACHES = {
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+    }
+    cache.clear()
+    yield
+    cache.clear()
+
+
+@pytest.mark.django_db
+class TestDataVersion:
+    def test_bump(self):
+        version = DataVersion.get_version()
+
+        DataVersion.bump()
+        DataVersion.bump()
+
+        assert DataVersion.get_version() == version + 2
+
+    def test_bump_creates_missing_row(self):
+        DataVersion.objects.all().delete()
+        assert DataVersion.get_version() == 0
+
+        DataVersion.bump()
+
+        assert DataVersion.get_version() == 1
+
+    @pytest.mark.django_db(transaction=True)
+    def test_bucket_edits_bump(self):
+        version = DataVersion.get_version()
+
+        bucket = make_bucket()
+        assert DataVersion.get_version() > version
+
+        version = DataVersion.get_version()
+        bucket.delete()
+        assert DataVersion.get_version() > version
+
+    @pytest.mark.django_db(transaction=True)
+    def test_bucket_edits_bump_on_commit(self):
+        version = DataVersion.get_version()
+
+        with transaction.atomic():
+            make_bucket("a.com")
+            make_bucket("b.com").delete()
+            # the row is not updated (and locked) before the commit
+            assert DataVersion.get_version() == version
+
+        assert DataVersion.get_version() > version
+
+    @pytest.mark.django_db(transaction=True)
+    def test_rolled_back_edits_do_not_bump(self):
+        version = DataVersion.get_version()
+
+        with pytest.raises(RuntimeError), transaction.atomic():
+            make_bucket("a.com")
+            raise RuntimeError
+
+        assert DataVersion.get_version() == version
+
+        make_bucket("b.com")
+        assert DataVersion.get_version() > version
+
+
+@pytest.mark.django_db
+@pytest.mark.usefixtures("response_cache")
+class TestVersionedResponses:
+    URL = "/reportmanager/rest/buckets/"
+
+    def test_etag_and_not_modified(self, authed_client):
+        make_bucket()
+
+        response = authed_client.get(self.URL)
+        assert response.status_code == 200
+        etag = response["ETag"]
+
+        response = authed_client.get(self.URL, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 304
+        assert response["ETag"] == etag
+
+        DataVersion.bump()
+        response = authed_client.get(self.URL, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 200
+        assert response["ETag"] != etag
+
+    def test_etag_depends_on_query(self, authed_client):
+        make_bucket()
+
+        first = authed_client.get(self.URL, {"limit": 1, "offset": 0})
+        reordered = authed_client.get(self.URL, {"offset": 0, "limit": 1})
+        other = authed_client.get(self.URL, {"limit": 2})
+
+        assert first["ETag"] == reordered["ETag"]
+        assert first["ETag"] != other["ETag"]
+
+    def test_cached_until_version_changes(self, authed_client):
+        make_bucket()
+        assert authed_client.get(self.URL).json()["count"] == 1
+
+        # bulk_create bypasses the signals, so the cached response is still served
+        Bucket.objects.bulk_create([Bucket(signature='{"symptoms": []}', domain="a")])
+        assert authed_client.get(self.URL).json()["count"] == 1
+
+        DataVersion.bump()
+        assert authed_client.get(self.URL).json()["count"] == 2
+
+    def test_etag_stable_while_cache_rotates(self, authed_client, settings):
+        settings.RESPONSE_CACHE_TIMEOUT = 600
+        make_bucket()
+
+        with patch("reportmanager.views.time.time", return_value=1000.0):
+            first = authed_client.get(self.URL)
+            Bucket.objects.bulk_create(
+                [Bucket(signature='{"symptoms": []}', domain="a")]
+            )
+            # served from the cache
+            assert authed_client.get(self.URL).json()["count"] == 1
+
+        with patch("reportmanager.views.time.time", return_value=1700.0):
+            response = authed_client.get(self.URL, HTTP_IF_NONE_MATCH=first["ETag"])
+            assert response.status_code == 304
+
+            # the cached response expired with its time bucket
+            response = authed_client.get(self.URL)
+            assert response.json()["count"] == 2
+            assert response["ETag"] == first["ETag"]
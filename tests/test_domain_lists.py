@@ -1,6 +1,10 @@
 import pytest
 
-from reportmanager.management.commands.import_domain_list import sync_domain_source
+from reportmanager.management.commands import import_domain_list
+from reportmanager.management.commands.import_domain_list import (
+    checked_domains,
+    sync_domain_source,
+)
 from reportmanager.models import DomainEntry, DomainSource
 
 
@@ -16,7 +20,7 @@ def domain_source(db):
 @pytest.mark.django_db
 class TestSyncDomainSource:
     def test_inserts_new_domains(self, domain_source):
-        sync_domain_source(domain_source, {"a.com", "b.com"})
+        sync_domain_source(domain_source, ["a.com", "b.com"])
         assert set(domain_source.entries.values_list("domain", flat=True)) == {
             "a.com",
             "b.com",
@@ -24,7 +28,7 @@ class TestSyncDomainSource:
 
     def test_removes_old_domains(self, domain_source):
         DomainEntry.objects.create(domain_source=domain_source, domain="old.com")
-        sync_domain_source(domain_source, {"new.com"})
+        sync_domain_source(domain_source, ["new.com"])
         assert set(domain_source.entries.values_list("domain", flat=True)) == {
             "new.com"
         }
@@ -33,25 +37,134 @@ class TestSyncDomainSource:
         entry = DomainEntry.objects.create(
             domain_source=domain_source, domain="keep.com"
         )
-        sync_domain_source(domain_source, {"keep.com", "added.com"})
+        sync_domain_source(domain_source, ["added.com", "keep.com"])
         assert DomainEntry.objects.filter(id=entry.id, domain="keep.com").exists()
 
     def test_empty_domains_removes_all(self, domain_source):
         DomainEntry.objects.create(domain_source=domain_source, domain="gone.com")
-        sync_domain_source(domain_source, set())
+        sync_domain_source(domain_source, [])
         assert domain_source.entries.count() == 0
 
     def test_updates_last_synced_at(self, domain_source):
         assert domain_source.last_synced_at is None
-        sync_domain_source(domain_source, {"a.com"})
+        sync_domain_source(domain_source, ["a.com"])
         domain_source.refresh_from_db()
         assert domain_source.last_synced_at is not None
 
-    def test_returns_added_and_removed_counts(self, domain_source):
+    def test_returns_added_and_removed_domains(self, domain_source):
         DomainEntry.objects.create(domain_source=domain_source, domain="keep.com")
         DomainEntry.objects.create(domain_source=domain_source, domain="gone.com")
         added, removed = sync_domain_source(
-            domain_source, {"keep.com", "new1.com", "new2.com"}
+            domain_source, ["keep.com", "new1.com", "new2.com"]
         )
         assert added == 2
         assert removed == 1
+
+    def test_merges_in_batches(self, domain_source, monkeypatch):
+        monkeypatch.setattr(import_domain_list, "BATCH_SIZE", 2)
+        for domain in ("a.com", "c.com", "d.com", "f.com", "g.com"):
+            DomainEntry.objects.create(domain_source=domain_source, domain=domain)
+        changes = []
+
+        added, removed = sync_domain_source(
+            domain_source,
+            ["b.com", "c.com", "c.com", "e.com", "f.com", "h.com"],
+            on_change=lambda added, removed: changes.append((added, removed)),
+        )
+
+        assert (added, removed) == (3, 3)
+        assert changes == [
+            (["b.com"], ["a.com"]),
+            (["e.com"], ["d.com"]),
+            (["h.com"], ["g.com"]),
+            ([], []),
+        ]
+        assert set(domain_source.entries.values_list("domain", flat=True)) == {
+            "b.com",
+            "c.com",
+            "e.com",
+            "f.com",
+            "h.com",
+        }
+
+    def test_orders_by_code_point(self, domain_source):
+        domains = ["a-b.com", "a.com", "a_b.com", "ab.com"]
+        for domain in reversed(domains):
+            DomainEntry.objects.create(domain_source=domain_source, domain=domain)
+
+        assert sync_domain_source(domain_source, domains) == (0, 0)
+
+    def test_rejects_unsorted_domains(self, domain_source):
+        with pytest.raises(ValueError, match="not sorted"):
+            sync_domain_source(domain_source, ["b.com", "a.com"])
+
+    @pytest.mark.django_db(transaction=True)
+    def test_commits_each_batch(self, domain_source, monkeypatch):
+        monkeypatch.setattr(import_domain_list, "BATCH_SIZE", 2)
+
+        def on_change(added, removed):
+            if "c.com" in added:
+                raise RuntimeError("failed")
+
+        with pytest.raises(RuntimeError):
+            sync_domain_source(
+                domain_source, ["a.com", "b.com", "c.com", "d.com"], on_change
+            )
+
+        assert set(domain_source.entries.values_list("domain", flat=True)) == {
+            "a.com",
+            "b.com",
+        }
+        domain_source.refresh_from_db()
+        assert domain_source.last_synced_at is None
+
+    def test_completes_partial_sync(self, domain_source, monkeypatch, caplog):
+        monkeypatch.setattr(import_domain_list, "BATCH_SIZE", 2)
+
+        def on_change(added, removed):
+            if "c.com" in added:
+                raise RuntimeError("failed")
+
+        with pytest.raises(RuntimeError):
+            sync_domain_source(domain_source, ["a.com", "b.com", "c.com"], on_change)
+
+        assert sync_domain_source(domain_source, ["a.com", "b.com", "c.com"]) == (
+            1,
+            0,
+        )
+        assert "did not finish" in caplog.text
+        caplog.clear()
+
+        assert sync_domain_source(domain_source, ["a.com", "b.com", "c.com"]) == (
+            0,
+            0,
+        )
+        assert "did not finish" not in caplog.text
+
+
+# (value, domain) as normalized by NORMALIZED_DOMAINS_QUERY
+NORMALIZED_BY_BIGQUERY = [
+    ("example.com", "example.com"),
+    ("www.example.com", "example.com"),
+    ("m.example.com", "example.com"),
+    ("www.m.example.com", "m.example.com"),
+    ("www.localhost", "www.localhost"),
+    ("https://www.example.com/path?q=1", "example.com"),
+    ("http://user@example.com:8080/", "example.com"),
+    ("//cdn.example.com/x.js", "cdn.example.com"),
+    ("sub.example.co.uk", "sub.example.co.uk"),
+]
+
+
+class TestCheckedDomains:
+    def test_matches_normalize_domain(self, caplog):
+        rows = [(domain, value) for value, domain in NORMALIZED_BY_BIGQUERY]
+
+        assert list(checked_domains(rows)) == [domain for domain, _ in rows]
+        assert caplog.text == ""
+
+    def test_logs_mismatches(self, caplog):
+        rows = [("a.com", "a.com"), ("www.b.com", "www.b.com")]
+
+        assert list(checked_domains(rows)) == ["a.com", "www.b.com"]
+        assert "normalized differently" in caplog.text
@@ -1,12 +1,18 @@
 # This Source Code Form is subject to the terms of the Mozilla Public
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
+from datetime import timedelta
 from unittest.mock import MagicMock, patch
 
 import pytest
 from django.core.management import call_command
+from django.utils import timezone
 
-from reportmanager.models import Bucket, BucketCountryRank
+from reportmanager.management.commands.import_country_ranks import (
+    ranked_buckets,
+    sync_country_ranks,
+)
+from reportmanager.models import Bucket, BucketCountryRank, PendingCountryRankDomain
 
 
 def make_bucket(domain: str | None = None) -> Bucket:
@@ -40,6 +46,14 @@ def make_bq_client(host_rows: list[dict], rank_cols: list[str]) -> MagicMock:
     return client
 
 
+@pytest.fixture(autouse=True)
+def clear_ranked_buckets():
+    # the set of ranked buckets is kept across runs in a process
+    ranked_buckets.clear()
+    yield
+    ranked_buckets.clear()
+
+
 @pytest.mark.django_db
 class TestImportCountryRanks:
     def _run_command(self, client_mock, **options):
@@ -191,3 +205,169 @@ class TestImportCountryRanks:
         ranks = BucketCountryRank.objects.filter(bucket=bucket)
         assert ranks.count() == 1
         assert ranks.get().rank == 1000
+
+    def test_full_import_only_writes_changes(self):
+        unchanged = make_bucket(domain="example.com")
+        changed = make_bucket(domain="example.org")
+        BucketCountryRank.objects.create(bucket=unchanged, country="us_rank", rank=1)
+        BucketCountryRank.objects.create(bucket=changed, country="us_rank", rank=2)
+        stale = BucketCountryRank.objects.create(
+            bucket=changed, country="germany_rank", rank=3
+        )
+        before = BucketCountryRank.objects.get(bucket=unchanged)
+        client = make_bq_client(
+            host_rows=[
+                {"host": "example.com", "us_rank": 1, "poland_rank": 4},
+                {"host": "example.org", "us_rank": 5, "poland_rank": None},
+            ],
+            rank_cols=["us_rank", "poland_rank"],
+        )
+
+        with patch(
+            "reportmanager.management.commands.import_country_ranks.BATCH_SIZE", 1
+        ):
+            self._run_command(client)
+
+        after = BucketCountryRank.objects.get(bucket=unchanged, country="us_rank")
+        assert (after.pk, after.updated_at, after.import_id) == (
+            before.pk,
+            before.updated_at,
+            before.import_id,
+        )
+        assert (
+            BucketCountryRank.objects.get(bucket=changed, country="us_rank").rank == 5
+        )
+        assert (
+            BucketCountryRank.objects.get(bucket=unchanged, country="poland_rank").rank
+            == 4
+        )
+        assert not BucketCountryRank.objects.filter(pk=stale.pk).exists()
+        assert BucketCountryRank.objects.count() == 3
+
+    def test_full_import_merges_ranks_in_key_order(self):
+        buckets = [make_bucket(domain=f"site{i}.com") for i in range(3)]
+        for bucket in buckets[1:]:
+            BucketCountryRank.objects.create(bucket=bucket, country="us_rank", rank=9)
+        BucketCountryRank.objects.create(bucket=buckets[2], country="a_rank", rank=1)
+        client = make_bq_client(
+            host_rows=[
+                {"host": "site0.com", "us_rank": 1, "fr_rank": 2},
+                {"host": "site2.com", "us_rank": 9, "fr_rank": 3},
+            ],
+            rank_cols=["us_rank", "fr_rank"],
+        )
+
+        with patch(
+            "reportmanager.management.commands.import_country_ranks.BATCH_SIZE", 2
+        ):
+            self._run_command(client)
+
+        assert sorted(
+            BucketCountryRank.objects.values_list("bucket_id", "country", "rank")
+        ) == [
+            (buckets[0].pk, "fr_rank", 2),
+            (buckets[0].pk, "us_rank", 1),
+            (buckets[2].pk, "fr_rank", 3),
+            (buckets[2].pk, "us_rank", 9),
+        ]
+
+    def test_sync_rejects_unsorted_ranks(self):
+        bucket = make_bucket(domain="example.com")
+        ranks = [
+            BucketCountryRank(bucket_id=bucket.pk, country=country, rank=1)
+            for country in ("us_rank", "fr_rank")
+        ]
+
+        with pytest.raises(ValueError, match="not sorted"):
+            sync_country_ranks(ranks, {})
+
+    def test_partial_import_skips_ranked_buckets(self):
+        ranked = make_bucket(domain="example.com")
+        BucketCountryRank.objects.create(bucket=ranked, country="us_rank", rank=10)
+        client = make_bq_client(
+            host_rows=[{"host": "example.com", "us_rank": 20}],
+            rank_cols=["us_rank"],
+        )
+
+        self._run_command(client, domains=["example.com"])
+        assert not client.query.called
+
+        # a new bucket of the same domain has no ranks yet
+        new = make_bucket(domain="example.com")
+        self._run_command(client, domains=["example.com"])
+
+        assert BucketCountryRank.objects.get(bucket=ranked).rank == 10
+        assert BucketCountryRank.objects.get(bucket=new).rank == 20
+        assert ranked_buckets.get() == {ranked.pk, new.pk}
+
+    def test_pending_domains_are_imported_in_one_query(self):
+        first = make_bucket(domain="example.com")
+        second = make_bucket(domain="example.org")
+        PendingCountryRankDomain.objects.bulk_create(
+            [
+                PendingCountryRankDomain(domain="example.com"),
+                PendingCountryRankDomain(domain="example.org"),
+                PendingCountryRankDomain(
+                    domain=PendingCountryRankDomain.SCHEDULED_MARKER
+                ),
+            ]
+        )
+        client = make_bq_client(
+            host_rows=[
+                {"host": "example.com", "us_rank": 1},
+                {"host": "example.org", "us_rank": 2},
+            ],
+            rank_cols=["us_rank"],
+        )
+
+        self._run_command(client, pending=True)
+
+        assert client.query.call_count == 1
+        assert BucketCountryRank.objects.get(bucket=first).rank == 1
+        assert BucketCountryRank.objects.get(bucket=second).rank == 2
+        assert not PendingCountryRankDomain.objects.exists()
+
+
+@pytest.mark.django_db
+class TestPendingCountryRankDomain:
+    def enqueue(self, *domain_sets):
+        with (
+            patch(
+                "reportmanager.tasks.import_pending_country_ranks.apply_async"
+            ) as task,
+            self.capture_on_commit_callbacks(execute=True),
+        ):
+            for domains in domain_sets:
+                PendingCountryRankDomain.enqueue(domains)
+        return task
+
+    @pytest.fixture(autouse=True)
+    def use_celery(self, settings, django_capture_on_commit_callbacks):
+        settings.USE_CELERY = True
+        self.capture_on_commit_callbacks = django_capture_on_commit_callbacks
+
+    def test_enqueue_schedules_one_import(self):
+        task = self.enqueue({"example.com", "example.org"}, {"example.com"})
+
+        task.assert_called_once_with(countdown=PendingCountryRankDomain.IMPORT_DELAY)
+        assert set(PendingCountryRankDomain.pending_domains()) == {
+            "example.com",
+            "example.org",
+        }
+
+    def test_started_import_lets_enqueue_schedule_the_next(self):
+        self.enqueue({"example.com"})
+        # what the import removes when it starts
+        PendingCountryRankDomain.objects.filter(
+            domain=PendingCountryRankDomain.SCHEDULED_MARKER
+        ).delete()
+
+        self.enqueue({"example.org"}).assert_called_once()
+
+    def test_stale_marker_is_replaced(self):
+        self.enqueue({"example.com"})
+        PendingCountryRankDomain.objects.filter(
+            domain=PendingCountryRankDomain.SCHEDULED_MARKER
+        ).update(created_at=timezone.now() - timedelta(hours=1))
+
+        self.enqueue({"example.org"}).assert_called_once()
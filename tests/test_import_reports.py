@@ -0,0 +1,218 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+import json
+from datetime import UTC, datetime
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+from uuid import uuid4
+
+import pytest
+from django.core.management import CommandError, call_command
+
+from reportmanager.cron import import_reports
+from reportmanager.management.commands.import_reports_from_bigquery import Command
+from reportmanager.models import (
+    OS,
+    PRIVATE_BROWSING_DETAIL,
+    App,
+    BreakageCategory,
+    ImportWatermark,
+    ReportEntry,
+)
+
+
+def make_row(**kwargs) -> SimpleNamespace:
+    row = {
+        "app_name": "Firefox",
+        "app_channel": "release",
+        "app_version": "130.0",
+        "breakage_category": "site_broken",
+        "comments": "broken",
+        "translated_text": None,
+        "language_code": None,
+        "country": "DE",
+        "details": {"boolean": {PRIVATE_BROWSING_DETAIL: True}},
+        "reported_at": datetime(2026, 3, 1, 12),
+        "url": "https://example.com/page",
+        "os": "Windows",
+        "uuid": str(uuid4()),
+        "ml_label": None,
+        "ml_probability": None,
+    }
+    row.update(kwargs)
+    return SimpleNamespace(**row)
+
+
+def make_bq_client(rows: list[SimpleNamespace]) -> MagicMock:
+    client = MagicMock()
+    client.query.return_value = rows
+    return client
+
+
+@pytest.mark.django_db
+class TestImportReportsFromBigQuery:
+    def _run_command(self, rows, **options):
+        with patch(
+            "reportmanager.management.commands.import_reports_from_bigquery"
+            ".bigquery.Client",
+            return_value=make_bq_client(rows),
+        ):
+            call_command("import_reports_from_bigquery", since="2026-01-01", **options)
+
+    def test_imports_rows(self):
+        rows = [
+            make_row(comments="slow \U0001f40c"),
+            make_row(os="Linux", breakage_category=None, app_version="131.0"),
+            make_row(os="Linux", app_channel=None),
+        ]
+
+        self._run_command(rows, batch_size=2)
+
+        assert ReportEntry.objects.count() == 3
+        entry = ReportEntry.objects.get(uuid=rows[0].uuid)
+        assert entry.app.version == "130.0"
+        assert entry.os.name == "Windows"
+        assert entry.breakage_category.value == "site_broken"
+        assert entry.domain == "example.com"
+        assert entry.comments == "slow �"
+        assert entry.comments_length == 6
+        assert entry.comments_preprocessed
+        assert entry.private_browsing is True
+        assert entry.content_blocked is False
+        assert entry.bucket.domain == "example.com"
+        assert entry.triage_pending
+        assert ReportEntry.objects.get(uuid=rows[1].uuid).breakage_category is None
+        assert ReportEntry.objects.get(uuid=rows[2].uuid).app.channel is None
+
+        assert App.objects.count() == 3
+        assert OS.objects.count() == 2
+        assert BreakageCategory.objects.count() == 1
+
+    def test_existing_reports_and_dimensions_are_reused(self):
+        rows = [make_row(), make_row(app_channel=None)]
+        self._run_command(rows)
+
+        self._run_command([*rows, make_row()])
+
+        assert ReportEntry.objects.count() == 3
+        assert App.objects.count() == 2
+        assert OS.objects.count() == 1
+        assert BreakageCategory.objects.count() == 1
+
+    def test_bulk_create_counts_new_entries(self):
+        rows = [make_row(), make_row()]
+        self._run_command(rows[:1])
+
+        reports = [Command.row_to_report(row) for row in rows]
+
+        assert ReportEntry.objects.bulk_create_from_reports(reports) == 1
+        assert ReportEntry.objects.bulk_create_from_reports(reports) == 0
+
+    def test_known_reports_are_filtered_per_batch(self, django_assert_num_queries):
+        rows = [make_row() for _ in range(3)]
+        self._run_command(rows[:2])
+        reports = [Command.row_to_report(row) for row in rows[:2]]
+
+        # one lookup of the UUIDs, nothing to insert
+        with django_assert_num_queries(1):
+            assert ReportEntry.objects.bulk_create_from_reports(reports) == 0
+
+    def test_watermark(self):
+        early, late = datetime(2026, 3, 1, 12), datetime(2026, 3, 1, 13)
+        rows = [
+            make_row(reported_at=early),
+            make_row(reported_at=late),
+            make_row(reported_at=late),
+        ]
+
+        self._run_command(rows)
+
+        watermark = ImportWatermark.objects.get(source="bigquery")
+        assert watermark.reported_at == late.replace(tzinfo=UTC)
+        assert watermark.boundary_uuids == sorted([rows[1].uuid, rows[2].uuid])
+
+        # reports on the boundary are skipped without being looked up
+        with patch.object(
+            ReportEntry.objects,
+            "bulk_create_from_reports",
+            wraps=ReportEntry.objects.bulk_create_from_reports,
+        ) as bulk_create:
+            self._run_command([*rows[1:], make_row(reported_at=late)])
+        assert len(bulk_create.call_args.args[0]) == 1
+
+        watermark.refresh_from_db()
+        assert watermark.reported_at == late.replace(tzinfo=UTC)
+        assert len(watermark.boundary_uuids) == 3
+        assert ReportEntry.objects.count() == 4
+
+    def test_cron_imports_since_watermark(self):
+        reported_at = datetime.now(UTC)
+        ImportWatermark.objects.create(source="bigquery", reported_at=reported_at)
+
+        with patch("reportmanager.cron.call_command") as call:
+            import_reports()
+
+        call.assert_called_once_with("import_reports_from_bigquery", since=reported_at)
+
+
+def make_record(**kwargs) -> dict:
+    record = {
+        "app_name": "Firefox",
+        "app_channel": "release",
+        "app_version": "130.0",
+        "breakage_category": None,
+        "comments": "  page is &lt;blank&gt;  ",
+        "details": '{"boolean": {}}',
+        "os": "Windows",
+        "reported_at": "2026-03-01T12:00:00",
+        "url": "https://example.com/page",
+        "uuid": str(uuid4()),
+    }
+    record.update(kwargs)
+    return record
+
+
+@pytest.mark.django_db
+class TestImportReportsFromFile:
+    @pytest.mark.parametrize("workers", [0, 2])
+    def test_imports_ndjson(self, tmp_path, workers):
+        records = [make_record() for _ in range(5)]
+        path = tmp_path / "reports.ndjson"
+        path.write_text("".join(json.dumps(r) + "\n" for r in records) + "\n")
+
+        call_command(
+            "import_reports_from_file", str(path), batch_size=2, workers=workers
+        )
+        # importing again skips the known reports
+        call_command("import_reports_from_file", str(path), workers=workers)
+
+        assert ReportEntry.objects.count() == 5
+        entry = ReportEntry.objects.get(uuid=records[0]["uuid"])
+        assert entry.comments_preprocessed == "page is <blank>"
+        assert entry.reported_at == datetime(2026, 3, 1, 12, tzinfo=UTC)
+
+    def test_imports_parquet(self, tmp_path):
+        pyarrow = pytest.importorskip("pyarrow")
+        parquet = pytest.importorskip("pyarrow.parquet")
+        records = [
+            make_record(
+                reported_at=datetime(2026, 3, 1, 12, tzinfo=UTC),
+                details={"boolean": {PRIVATE_BROWSING_DETAIL: True}},
+                extra_column=1,
+            ),
+            make_record(reported_at=datetime(2026, 3, 2, 12, tzinfo=UTC)),
+        ]
+        records[1]["details"] = json.dumps({"boolean": {}})
+        records[0]["details"] = json.dumps(records[0]["details"])
+        path = tmp_path / "reports.parquet"
+        parquet.write_table(pyarrow.Table.from_pylist(records), path)
+
+        call_command("import_reports_from_file", str(path), workers=0)
+
+        assert ReportEntry.objects.count() == 2
+        assert ReportEntry.objects.get(uuid=records[0]["uuid"]).private_browsing
+
+    def test_missing_file(self, tmp_path):
+        with pytest.raises(CommandError):
+            call_command("import_reports_from_file", str(tmp_path / "missing"))
@@ -1,11 +1,24 @@
 from datetime import timedelta
 
 import pytest
+from django.core.management import call_command
 from django.db import IntegrityError, transaction
 from django.utils import timezone
 
-from reportmanager.locking import JobLockError, acquire_lock, release_lock
-from reportmanager.models import JobLock
+from reportmanager.locking import (
+    JobLockError,
+    acquire_lock,
+    acquire_scoped_lock,
+    acquire_scopes,
+    domain_scope,
+    domain_scopes,
+    operation_scope,
+    release_lock,
+    release_scopes,
+)
+from reportmanager.models import JobLock, JobLockHolder, ReportEntry
+
+SHARED = JobLockHolder.Modes.SHARED
 
 
 @pytest.mark.django_db
@@ -146,3 +159,103 @@ class TestJobLocking:
         )
         assert lock1.singleton_key == 1
         assert JobLock.objects.count() == 1
+
+
+@pytest.mark.django_db
+class TestScopedLocking:
+    CLUSTERING = JobLock.LockTypes.CLUSTERING
+    CLEANUP = JobLock.LockTypes.CLEANUP
+
+    def test_domains_are_locked_separately(self):
+        acquire_scopes(self.CLUSTERING, [domain_scope("a.com")])
+
+        with acquire_scoped_lock(self.CLEANUP, domain_scope("b.com")) as lock:
+            assert lock.scopes == [domain_scope("b.com")]
+            with pytest.raises(JobLockError, match=r"another operation.*clustering"):
+                acquire_scopes(self.CLEANUP, [domain_scope("a.com")])
+
+        assert list(JobLockHolder.objects.values_list("key", flat=True)) == ["a.com"]
+
+    def test_whole_scope_conflicts_with_keys(self):
+        token, _ = acquire_scopes(self.CLUSTERING, [domain_scope("a.com")])
+        with pytest.raises(JobLockError):
+            acquire_scopes(self.CLUSTERING, [domain_scope()])
+
+        release_scopes(token)
+        acquire_scopes(self.CLUSTERING, [domain_scope()])
+        with pytest.raises(JobLockError):
+            acquire_scopes(self.CLEANUP, [domain_scope("b.com")])
+        acquire_scopes(self.CLEANUP, [operation_scope(self.CLEANUP)])
+
+    def test_shared_and_exclusive_modes(self):
+        acquire_scopes(self.CLEANUP, [domain_scope("a.com", SHARED)])
+        acquire_scopes(self.CLEANUP, [domain_scope(mode=SHARED)])
+
+        with pytest.raises(JobLockError):
+            acquire_scopes(self.CLUSTERING, [domain_scope("a.com")])
+
+    def test_partial(self):
+        acquire_scopes(self.CLUSTERING, [domain_scope("a.com")])
+
+        _, acquired = acquire_scopes(
+            self.CLEANUP, [domain_scope("a.com"), domain_scope("b.com")], partial=True
+        )
+
+        assert acquired == [domain_scope("b.com")]
+
+    def test_stale_holder_is_dropped(self):
+        acquire_scopes(self.CLUSTERING, [domain_scope("a.com")])
+        JobLockHolder.objects.update(
+            heartbeat_at=timezone.now() - JobLockHolder.STALE_AFTER - timedelta(1)
+        )
+
+        _, acquired = acquire_scopes(self.CLEANUP, [domain_scope("a.com")])
+
+        assert acquired == [domain_scope("a.com")]
+        assert set(JobLockHolder.objects.values_list("lock_name", flat=True)) == {
+            self.CLEANUP
+        }
+
+    def test_global_lock_conflicts_with_scopes(self):
+        token, _ = acquire_scopes(self.CLUSTERING, [domain_scope("a.com")])
+        with pytest.raises(JobLockError, match=r"another operation.*clustering"):
+            acquire_lock(self.CLEANUP)
+
+        release_scopes(token)
+        acquire_lock(self.CLEANUP)
+        with pytest.raises(JobLockError, match=r"another operation.*cleanup"):
+            acquire_scopes(self.CLUSTERING, [domain_scope("a.com")])
+
+    def test_cleanup_skips_locked_domains(self, settings, make_report):
+        settings.CLEANUP_REPORTS_AFTER_DAYS = 14
+        for domain in ("a.com", "b.com"):
+            make_report(domain=domain, reported_at=timezone.now() - timedelta(days=30))
+        acquire_scopes(self.CLUSTERING, [domain_scope("b.com")])
+
+        call_command("cleanup_old_reports")
+
+        assert list(ReportEntry.objects.values_list("domain", flat=True)) == ["b.com"]
+        assert list(JobLockHolder.objects.values_list("key", flat=True)) == ["b.com"]
+
+    def test_rows_without_domain_are_locked_separately(self, load_report):
+        reports = ReportEntry.objects.bulk_create_from_reports(
+            load_report(domain) for domain in ("a.com", "b.com")
+        )
+        assert reports == 2
+        ReportEntry.objects.filter(domain="b.com").update(domain=None)
+
+        def locked_domains(lock):
+            return set(
+                ReportEntry.objects.filter(lock.domain_filter()).values_list(
+                    "domain", flat=True
+                )
+            )
+
+        with acquire_scoped_lock(self.CLEANUP, *domain_scopes(["a.com"])) as lock:
+            assert locked_domains(lock) == {"a.com"}
+        with acquire_scoped_lock(self.CLEANUP, *domain_scopes(["a.com", None])) as lock:
+            assert locked_domains(lock) == {"a.com", None}
+
+        acquire_scopes(self.CLUSTERING, [domain_scope()])
+        _, acquired = acquire_scopes(self.CLEANUP, domain_scopes([None]), partial=True)
+        assert acquired == []
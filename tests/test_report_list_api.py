@@ -0,0 +1,149 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+from datetime import UTC, datetime, timedelta
+
+import pytest
+from django.contrib.auth.models import Permission
+from django.contrib.auth.models import User as DjangoUser
+from django.contrib.contenttypes.models import ContentType
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from reportmanager.models import ReportEntry
+from reportmanager.models import User as ReportManagerUser
+
+REPORTED_AT = datetime(2026, 1, 31, tzinfo=UTC)
+
+
+@pytest.fixture
+def authed_client(db):
+    """Create a user with read permissions and return an authenticated APIClient."""
+    user = DjangoUser.objects.create_user(
+        username="testuser", password="testpass", email="testuser@example.com"
+    )
+    ct = ContentType.objects.get_for_model(ReportManagerUser)
+    for codename in ("reportmanager_visible", "reportmanager_read"):
+        perm = Permission.objects.get(content_type=ct, codename=codename)
+        user.user_permissions.add(perm)
+
+    token, _ = Token.objects.get_or_create(user=user)
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+    return client
+
+
+@pytest.mark.django_db
+class TestReportListEndpoint:
+    URL = "/reportmanager/rest/reports/"
+
+    def test_comments_length_stored(self, make_report):
+        entry = make_report(comments="four")
+        assert ReportEntry.objects.get(pk=entry.pk).comments_length == 4
+
+        entry.comments = "longer"
+        entry.save(update_fields=["comments"])
+        assert ReportEntry.objects.get(pk=entry.pk).comments_length == 6
+
+    def test_limit_offset_pagination(self, authed_client, make_report):
+        entries = [make_report() for _ in range(3)]
+
+        response = authed_client.get(
+            self.URL, {"limit": 2, "offset": 2, "ordering": "id"}
+        )
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["count"] == 3
+        assert [r["id"] for r in data["results"]] == [entries[2].pk]
+
+    def test_cursor_pagination(self, authed_client, make_report):
+        entries = [
+            make_report(reported_at=REPORTED_AT - timedelta(days=i % 2))
+            for i in range(5)
+        ]
+        expected = [e.pk for e in sorted(entries, key=lambda e: (e.reported_at, e.pk))]
+
+        seen = []
+        url, params = self.URL, {"cursor": "", "limit": 2, "ordering": "reported_at"}
+        while url:
+            response = authed_client.get(url, params)
+            assert response.status_code == 200
+            data = response.json()
+            assert "count" not in data
+            seen.extend(r["id"] for r in data["results"])
+            url, params = data["next"], None
+
+        assert seen == expected
+
+    @pytest.mark.parametrize("ordering", ["comments_length", "-comments_length"])
+    def test_cursor_pagination_seeks_past_ties(
+        self, authed_client, ordering, make_report
+    ):
+        # more rows with the same value than fit in a page
+        entries = [make_report(comments="tie" if i % 4 else "other") for i in range(9)]
+        expected = [
+            e.pk
+            for e in sorted(
+                entries,
+                key=lambda e: (e.comments_length, e.pk),
+                reverse=ordering.startswith("-"),
+            )
+        ]
+
+        pages = []
+        url, params = self.URL, {"cursor": "", "limit": 2, "ordering": ordering}
+        while url:
+            data = authed_client.get(url, params).json()
+            pages.append([r["id"] for r in data["results"]])
+            url, params = data["next"], None
+        assert [pk for page in pages for pk in page] == expected
+
+        seen = []
+        url = data["previous"]
+        while url:
+            data = authed_client.get(url).json()
+            seen[:0] = [r["id"] for r in data["results"]]
+            url = data["previous"]
+        assert seen == expected[: -len(pages[-1])]
+
+    def test_cursor_pagination_rejects_unindexed_ordering(
+        self, authed_client, make_report
+    ):
+        make_report()
+
+        response = authed_client.get(self.URL, {"cursor": "", "ordering": "url"})
+
+        assert response.status_code == 400
+
+    def test_ordering_by_comments_length(self, authed_client, make_report):
+        long = make_report(comments="a long comment")
+        short = make_report(comments="short")
+        empty = make_report(comments="")
+
+        for ordering in ("comments__length", "comments_length"):
+            response = authed_client.get(self.URL, {"ordering": f"-{ordering}"})
+
+            assert [r["id"] for r in response.json()["results"]] == [
+                long.pk,
+                short.pk,
+                empty.pk,
+            ]
+
+    def test_fields_selector(self, authed_client, make_report):
+        make_report(comments="some comment")
+
+        response = authed_client.get(self.URL, {"fields": "id,uuid,comments"})
+
+        assert response.status_code == 200
+        (result,) = response.json()["results"]
+        assert set(result) == {"id", "uuid", "comments"}
+        assert result["comments"] == "some comment"
+
+    def test_all_fields_by_default(self, authed_client, make_report):
+        make_report()
+
+        response = authed_client.get(self.URL)
+
+        (result,) = response.json()["results"]
+        assert {"details", "comments", "comments_translated"} <= set(result)
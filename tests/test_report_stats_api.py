@@ -0,0 +1,145 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+from datetime import timedelta
+
+import pytest
+from django.contrib.auth.models import Permission
+from django.contrib.auth.models import User as DjangoUser
+from django.contrib.contenttypes.models import ContentType
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from reportmanager.models import Bucket, ReportEntry, ReportHit
+from reportmanager.models import User as ReportManagerUser
+
+
+def make_bucket(domain="example.com"):
+    return Bucket.objects.create(signature='{"symptoms": []}', domain=domain)
+
+
+@pytest.fixture
+def make_reports(make_report):
+    def make(count, age, bucket=None):
+        for _ in range(count):
+            make_report(bucket, reported_at=timezone.now() - age)
+
+    return make
+
+
+@pytest.fixture
+def authed_client(db):
+    """Create a user with read permissions and return an authenticated APIClient."""
+    user = DjangoUser.objects.create_user(
+        username="testuser", password="testpass", email="testuser@example.com"
+    )
+    ct = ContentType.objects.get_for_model(ReportManagerUser)
+    for codename in ("reportmanager_visible", "reportmanager_read"):
+        perm = Permission.objects.get(content_type=ct, codename=codename)
+        user.user_permissions.add(perm)
+
+    token, _ = Token.objects.get_or_create(user=user)
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+    return client
+
+
+@pytest.mark.django_db
+class TestReportStatsEndpoint:
+    URL = "/reportmanager/rest/reports/stats/"
+
+    def test_totals_and_frequent_buckets(self, authed_client, make_reports):
+        daily = make_bucket("daily.com")
+        weekly = make_bucket("weekly.com")
+        make_reports(2, timedelta(hours=1), daily)
+        make_reports(1, timedelta(days=3), daily)
+        make_reports(3, timedelta(days=3), weekly)
+        make_reports(1, timedelta(days=20), weekly)
+        make_reports(1, timedelta(hours=2))
+        make_reports(5, timedelta(days=45), weekly)
+
+        response = authed_client.get(self.URL)
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["totals"] == [3, 7, 8]
+        assert data["frequent_buckets"] == {
+            str(daily.pk): [2, 3, 3],
+            str(weekly.pk): [0, 3, 4],
+        }
+
+    def test_frequent_buckets_limited_to_top10(self, authed_client, make_reports):
+        buckets = [make_bucket(f"{i}.example.com") for i in range(12)]
+        for i, bucket in enumerate(buckets):
+            make_reports(i + 1, timedelta(hours=1), bucket)
+
+        response = authed_client.get(self.URL)
+
+        assert response.status_code == 200
+        assert set(response.json()["frequent_buckets"]) == {
+            str(bucket.pk) for bucket in buckets[2:]
+        }
+
+    def test_graph_data(self, authed_client, settings):
+        settings.REPORT_STATS_MAX_HISTORY_DAYS = 1
+        cur_period = ReportHit.get_period(timezone.now())
+        ReportHit.objects.create(last_update=cur_period, count=4)
+        ReportHit.objects.create(
+            last_update=cur_period - timedelta(hours=2, minutes=30), count=2
+        )
+        ReportHit.objects.create(last_update=cur_period - timedelta(days=2), count=9)
+
+        response = authed_client.get(self.URL)
+
+        assert response.status_code == 200
+        graph_data = response.json()["graph_data"]
+        assert len(graph_data) == 24
+        assert graph_data[-1] == 4
+        assert graph_data[-3] == 2
+        assert sum(graph_data) == 6
+
+
+@pytest.mark.django_db
+class TestReportHit:
+    @staticmethod
+    def hits():
+        return dict(ReportHit.objects.values_list("last_update", "count"))
+
+    def test_counted_on_create_and_delete(self, make_reports):
+        period = ReportHit.get_period(timezone.now() - timedelta(days=3))
+        make_reports(2, timezone.now() - period + timedelta(minutes=30))
+        make_reports(1, timedelta(days=3), make_bucket())
+        assert self.hits() == {period: 3}
+
+        ReportEntry.objects.filter(bucket=None).first().delete()
+        assert self.hits() == {period: 2}
+
+        ReportEntry.objects.bulk_delete()
+        assert self.hits() == {period: 0}
+
+    def test_check_counts(self, make_reports):
+        cur_period = ReportHit.get_period(timezone.now())
+        since = cur_period - timedelta(hours=3)
+        make_reports(3, timedelta(hours=1))
+        assert ReportHit.check_counts(since) == 0
+        assert self.hits() == {cur_period - timedelta(hours=1): 3}
+
+        # moved without counting: one on the hour, the end of a period, and one
+        # backfilled before it
+        first, second = ReportEntry.objects.all()[:2]
+        ReportEntry.objects.filter(pk=first.pk).update(
+            reported_at=cur_period - timedelta(hours=2)
+        )
+        ReportEntry.objects.filter(pk=second.pk).update(
+            reported_at=cur_period - timedelta(hours=2, minutes=59)
+        )
+        ReportHit.objects.create(last_update=since + timedelta(minutes=1), count=5)
+        ReportHit.objects.create(last_update=since - timedelta(hours=5), count=5)
+
+        assert ReportHit.check_counts(since) == 2
+        assert self.hits() == {
+            cur_period - timedelta(hours=1): 1,
+            cur_period - timedelta(hours=2): 2,
+            since - timedelta(hours=5): 5,
+        }
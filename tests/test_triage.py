@@ -0,0 +1,410 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+from unittest.mock import patch
+
+import pytest
+from celeryconf import app
+from django.core.management import call_command
+from django.utils import timezone
+
+from reportmanager.clustering.ClusterBucketManager import (
+    ClusterBucketManager,
+    DomainClusterData,
+)
+from reportmanager.locking import NO_DOMAIN, acquire_scopes, domain_scopes
+from reportmanager.management.commands import triage_new_reports
+from reportmanager.models import (
+    Bucket,
+    BucketHit,
+    BucketSummaryCount,
+    Cluster,
+    ClusteringJob,
+    ClusteringJobType,
+    DomainBucketCache,
+    JobLock,
+    JobLockHolder,
+    PendingCountryRankDomain,
+    ReportEntry,
+    ReportHit,
+)
+
+
+def bucket_counts(bucket_id):
+    hits = BucketHit.objects.filter(bucket_id=bucket_id).values_list("count", flat=True)
+    summary = BucketSummaryCount.objects.filter(bucket_id=bucket_id).values_list(
+        "count", flat=True
+    )
+    return sum(hits), sum(summary)
+
+
+def run_triage():
+    job = ClusteringJob.objects.create(job_type=ClusteringJobType.INCREMENTAL)
+    with (
+        patch(
+            "reportmanager.clustering.ClusterBucketManager.SBERTClusterer",
+        ),
+        patch.object(PendingCountryRankDomain, "enqueue") as enqueue,
+    ):
+        domains = triage_new_reports.run_triage(job)
+    # country ranks are imported by the caller, once the lock is released
+    enqueue.assert_not_called()
+    job.refresh_from_db()
+    assert job.is_ok
+    return domains
+
+
+@pytest.mark.django_db
+class TestIngestBucketing:
+    def test_reports_are_placed_in_domain_buckets(self, load_report):
+        existing = Bucket.objects.create(
+            signature=load_report("known.com").create_signature().raw_signature,
+            description="domain is known.com",
+        )
+        domain_buckets = DomainBucketCache()
+
+        created = ReportEntry.objects.bulk_create_from_reports(
+            [load_report("known.com"), load_report("new.com"), load_report("new.com")],
+            domain_buckets=domain_buckets,
+        )
+
+        assert created == 3
+        assert domain_buckets.created == 1
+        new = Bucket.objects.get(domain="new.com")
+        assert new.description == "domain is new.com"
+        assert set(ReportEntry.objects.values_list("bucket_id", "triage_pending")) == {
+            (existing.pk, True),
+            (new.pk, True),
+        }
+        assert bucket_counts(existing.pk) == (1, 1)
+        assert bucket_counts(new.pk) == (2, 2)
+
+    def test_reports_imported_concurrently_are_not_counted(self, load_report):
+        ReportEntry.objects.bulk_create_from_reports(
+            [report := load_report()], domain_buckets=DomainBucketCache()
+        )
+        real_filter = ReportEntry.objects.filter
+        calls = []
+
+        def racy_filter(*args, **kwargs):
+            calls.append(kwargs)
+            # the lookup of known reports runs before the other import commits
+            if len(calls) == 1:
+                return ReportEntry.objects.none()
+            return real_filter(*args, **kwargs)
+
+        with patch.object(ReportEntry.objects, "filter", side_effect=racy_filter):
+            created = ReportEntry.objects.bulk_create_from_reports(
+                [report, load_report()], domain_buckets=DomainBucketCache()
+            )
+
+        assert created == 1
+        assert ReportEntry.objects.count() == 2
+        bucket = Bucket.objects.get(domain="example.com")
+        assert bucket_counts(bucket.pk) == (2, 2)
+        assert sum(ReportHit.objects.values_list("count", flat=True)) == 2
+
+    def test_default_buckets_are_created_once(self, load_report):
+        first, second = DomainBucketCache(), DomainBucketCache()
+        report = load_report()
+
+        bucket_id = first.get_or_create("example.com", report)
+        # a cache loaded before the other one created the bucket
+        assert second.get_or_create("example.com", report) == bucket_id
+        assert (first.created, second.created) == (1, 0)
+
+        no_domain = first.get_or_create(None, report)
+        second.load({None})
+        assert second.buckets[None] == no_domain
+        assert Bucket.objects.count() == 2
+
+    def test_explicit_moves_clear_triage_pending(self, load_report):
+        ReportEntry.objects.bulk_create_from_reports(
+            [load_report()], domain_buckets=DomainBucketCache()
+        )
+        entry = ReportEntry.objects.get()
+        other = Bucket.objects.create(signature='{"symptoms": []}', description="x")
+
+        entry.bucket = other
+        entry.save()
+
+        entry.refresh_from_db()
+        assert entry.bucket_id == other.pk
+        assert not entry.triage_pending
+
+
+@pytest.mark.django_db
+class TestRunTriage:
+    def test_pending_reports_stay_in_domain_bucket(self, load_report):
+        ReportEntry.objects.bulk_create_from_reports(
+            [load_report(), load_report()], domain_buckets=DomainBucketCache()
+        )
+        bucket = Bucket.objects.get(domain="example.com")
+
+        run_triage()
+
+        assert (
+            list(ReportEntry.objects.values_list("bucket_id", "triage_pending"))
+            == [(bucket.pk, False)] * 2
+        )
+        assert bucket_counts(bucket.pk) == (2, 2)
+
+    def test_pending_reports_are_promoted_to_cluster_buckets(self, load_report):
+        ReportEntry.objects.bulk_create_from_reports(
+            [load_report(comments="video is broken", ml_valid_probability=0.9)],
+            domain_buckets=DomainBucketCache(),
+        )
+        domain_bucket = Bucket.objects.get(domain="example.com")
+        cluster = Cluster.objects.create(domain="example.com")
+        cluster_bucket = Bucket.objects.create(
+            signature='{"symptoms": []}',
+            description="example.com [Cluster 1]",
+            cluster=cluster,
+        )
+
+        with patch.object(
+            triage_new_reports,
+            "get_cluster_bucket",
+            return_value=(cluster.pk, cluster_bucket.pk),
+        ):
+            run_triage()
+
+        entry = ReportEntry.objects.get()
+        assert (entry.bucket_id, entry.cluster_id) == (cluster_bucket.pk, cluster.pk)
+        assert not entry.triage_pending
+        assert bucket_counts(domain_bucket.pk) == (0, 0)
+        assert bucket_counts(cluster_bucket.pk) == (1, 1)
+
+    def test_matched_reports_use_bucket_of_cluster(self, load_report):
+        entry = ReportEntry.objects.create_from_report(
+            load_report(comments="video is broken", ml_valid_probability=0.9)
+        )
+        cluster = Cluster.objects.create(domain="example.com")
+        # the bucket is found by its cluster, not by its signature
+        cluster_bucket = Bucket.objects.create(
+            signature='{"symptoms": []}',
+            description="example.com [Cluster 1]",
+            cluster=cluster,
+        )
+        domain_data = {
+            "example.com": DomainClusterData("example.com", 0.5, {cluster.pk: None})
+        }
+
+        with (
+            patch.object(
+                ClusterBucketManager, "build_domain_data", return_value=domain_data
+            ),
+            patch.object(
+                ClusterBucketManager, "get_closest_cluster", return_value=cluster.pk
+            ),
+        ):
+            run_triage()
+
+        entry.refresh_from_db()
+        assert (entry.bucket_id, entry.cluster_id) == (cluster_bucket.pk, cluster.pk)
+        assert bucket_counts(cluster_bucket.pk) == (1, 1)
+
+    def test_unbucketed_reports_use_domain_buckets(self, make_report):
+        entry = make_report()
+
+        domains = run_triage()
+
+        entry.refresh_from_db()
+        bucket = Bucket.objects.get(domain="example.com")
+        assert entry.bucket_id == bucket.pk
+        assert bucket_counts(bucket.pk) == (1, 1)
+        assert domains == {"example.com"}
+
+    def test_country_ranks_are_imported_after_the_lock(self, make_report):
+        ClusteringJob.objects.create(
+            job_type=ClusteringJobType.FULL, completed_at=timezone.now(), is_ok=True
+        )
+        make_report()
+        holders = []
+
+        with (
+            patch("reportmanager.clustering.ClusterBucketManager.SBERTClusterer"),
+            patch.object(
+                PendingCountryRankDomain,
+                "enqueue",
+                side_effect=lambda domains: holders.append(
+                    JobLockHolder.objects.count()
+                ),
+            ) as enqueue,
+        ):
+            call_command("triage_new_reports")
+
+        enqueue.assert_called_once_with({"example.com"})
+        assert holders == [0]
+
+    def test_reports_are_triaged_in_chunks(self, settings, make_report):
+        settings.TRIAGE_CHUNK_SIZE = 2
+        for domain in ["a.com", "a.com", "a.com", "b.com", "c.com"]:
+            make_report(domain=domain)
+
+        assert triage_new_reports.plan_triage_chunks(
+            triage_new_reports.get_pending_domain_counts(), 2
+        ) == [["a.com"], ["b.com", "c.com"]]
+
+        with patch.object(
+            triage_new_reports, "triage_chunk", wraps=triage_new_reports.triage_chunk
+        ) as triage_chunk:
+            domains = run_triage()
+
+        assert [c.args[1] for c in triage_chunk.call_args_list] == [
+            ["a.com"],
+            ["b.com", "c.com"],
+        ]
+        assert not ReportEntry.objects.filter(bucket__isnull=True).exists()
+        assert bucket_counts(Bucket.objects.get(domain="a.com").pk) == (3, 3)
+        assert domains == {"a.com", "b.com", "c.com"}
+
+
+@pytest.mark.django_db
+class TestShardedTriage:
+    def test_plan_shards_balances_reports(self, make_report):
+        for domain, count in [("a.com", 3), ("b.com", 2), ("c.com", 1), ("d.com", 1)]:
+            for _ in range(count):
+                make_report(domain=domain)
+
+        assert triage_new_reports.plan_triage_shards(2) == [
+            ["a.com", "d.com"],
+            ["b.com", "c.com"],
+        ]
+        assert len(triage_new_reports.plan_triage_shards(8)) == 4
+
+    def test_triage_reports_of_shard(self, make_report):
+        a = make_report(domain="a.com")
+        b = make_report(domain="b.com")
+
+        with patch("reportmanager.clustering.ClusterBucketManager.SBERTClusterer"):
+            result = triage_new_reports.triage_reports(
+                ClusterBucketManager(), ["a.com"]
+            )
+
+        assert result == (0, 1, {"a.com"})
+        a.refresh_from_db()
+        b.refresh_from_db()
+        assert a.bucket_id == Bucket.objects.get(domain="a.com").pk
+        assert b.bucket_id is None
+
+    @pytest.fixture
+    def sharded(self, settings, monkeypatch):
+        settings.USE_CELERY = True
+        settings.TRIAGE_SHARDS = 2
+        monkeypatch.setattr(app.conf, "task_always_eager", True)
+        ClusteringJob.objects.create(
+            job_type=ClusteringJobType.FULL, completed_at=timezone.now(), is_ok=True
+        )
+
+    def test_sharded_triage_command(self, sharded, make_report):
+        for domain in ["a.com", "a.com", "b.com", None]:
+            entry = make_report(domain=domain or "x")
+        ReportEntry.objects.filter(pk=entry.pk).update(domain=None)
+        run_triage_shard = triage_new_reports.run_triage_shard
+        locked = []
+
+        def check_locks(domains, token, tokens):
+            # each shard holds the locks of its domains until it is done
+            locked.append(set(JobLockHolder.objects.values_list("key", flat=True)))
+            assert set(
+                JobLockHolder.objects.filter(token=token).values_list("key", flat=True)
+            ) == {NO_DOMAIN if domain is None else domain for domain in domains}
+            return run_triage_shard(domains, token, tokens)
+
+        with (
+            patch("reportmanager.clustering.ClusterBucketManager.SBERTClusterer"),
+            patch.object(PendingCountryRankDomain, "enqueue") as enqueue,
+            patch.object(triage_new_reports, "run_triage") as run_triage,
+            patch.object(triage_new_reports, "run_triage_shard", check_locks),
+        ):
+            call_command("triage_new_reports")
+
+        run_triage.assert_not_called()
+        assert locked[0] == {"a.com", "b.com", NO_DOMAIN}
+        assert locked[1] < locked[0]
+        assert not ReportEntry.objects.filter(bucket__isnull=True).exists()
+        job = ClusteringJob.objects.get(job_type=ClusteringJobType.INCREMENTAL)
+        assert job.is_ok
+        assert job.buckets_created == 3
+        enqueue.assert_called_once_with({"a.com", "b.com"})
+        assert not JobLockHolder.objects.exists()
+
+    def test_sharded_triage_skips_locked_domains(self, sharded, make_report):
+        for domain in ["a.com", "b.com"]:
+            make_report(domain=domain)
+        token, _ = acquire_scopes(
+            JobLock.LockTypes.CLEANUP, domain_scopes([None, "b.com"])
+        )
+
+        with (
+            patch("reportmanager.clustering.ClusterBucketManager.SBERTClusterer"),
+            patch.object(PendingCountryRankDomain, "enqueue"),
+        ):
+            call_command("triage_new_reports")
+
+        assert list(
+            ReportEntry.objects.filter(bucket__isnull=True).values_list(
+                "domain", flat=True
+            )
+        ) == ["b.com"]
+        assert list(
+            JobLockHolder.objects.values_list("token", flat=True).distinct()
+        ) == [token]
+
+    def test_failed_shard_fails_job(self, sharded, make_report):
+        make_report(domain="a.com")
+
+        with (
+            patch.object(
+                triage_new_reports, "run_triage_shard", side_effect=RuntimeError("boom")
+            ),
+            pytest.raises(RuntimeError),
+        ):
+            call_command("triage_new_reports")
+
+        job = ClusteringJob.objects.get(job_type=ClusteringJobType.INCREMENTAL)
+        assert not job.is_ok
+        assert job.error_message == "boom"
+        assert not JobLockHolder.objects.exists()
+
+    def test_sharded_triage_returns_once_dispatched(self, sharded, make_report):
+        make_report(domain="a.com")
+
+        with patch("celery.chord") as chord:
+            call_command("triage_new_reports")
+
+        chord.return_value.assert_called_once()
+        job = ClusteringJob.objects.get(job_type=ClusteringJobType.INCREMENTAL)
+        assert job.completed_at is None
+        # held until the shard runs
+        assert list(JobLockHolder.objects.values_list("key", flat=True)) == ["a.com"]
+
+    def test_stale_shard_locks_fail_job(self, sharded, make_report):
+        make_report(domain="a.com")
+        run_triage_shard = triage_new_reports.run_triage_shard
+
+        def stale_shard(domains, token, tokens):
+            # the locks were released as stale while the shard was queued
+            JobLockHolder.objects.all().delete()
+            return run_triage_shard(domains, token, tokens)
+
+        with patch.object(triage_new_reports, "run_triage_shard", stale_shard):
+            call_command("triage_new_reports")
+
+        assert ReportEntry.objects.filter(bucket__isnull=True).exists()
+        job = ClusteringJob.objects.get(job_type=ClusteringJobType.INCREMENTAL)
+        assert not job.is_ok
+
+    def test_expired_jobs_are_failed(self, sharded):
+        job = ClusteringJob.objects.create(job_type=ClusteringJobType.INCREMENTAL)
+        ClusteringJob.objects.filter(pk=job.pk).update(
+            started_at=timezone.now() - triage_new_reports.TRIAGE_TIMEOUT
+        )
+
+        call_command("triage_new_reports")
+
+        job.refresh_from_db()
+        assert job.completed_at is not None
+        assert not job.is_ok
+        assert job.error_message == "Timed out"
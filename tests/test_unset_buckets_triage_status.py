@@ -1,12 +1,15 @@
 from datetime import timedelta
+from io import StringIO
 
 import pytest
+from django.core.management import call_command
 from django.utils import timezone
 
 from reportmanager.management.commands.unset_buckets_triage_status import (
-    Command,
     LONG_WINDOW,
     SHORT_WINDOW,
+    Command,
+    find_poisson_spikes,
     is_poisson_spike,
 )
 from reportmanager.models import Bucket, BucketHit, Cluster
@@ -70,6 +73,14 @@ class TestIsPoissonSpike:
         # same baseline; getting 7 → p ≈ 3.4%, above the 1% threshold — normal variation
         assert not is_poisson_spike(baseline_count=57, recent_count=7)
 
+    def test_vectorized_matches_scalar(self):
+        pairs = [(9, 7), (114, 3), (30, 2), (0, 2), (0, 3), (3, 8), (57, 10), (57, 7)]
+        baseline_counts, recent_counts = zip(*pairs, strict=True)
+
+        spikes = find_poisson_spikes(baseline_counts, recent_counts)
+
+        assert spikes.tolist() == [is_poisson_spike(b, r) for b, r in pairs]
+
 
 @pytest.mark.django_db
 class TestUnsetStatusIfSpike:
@@ -219,3 +230,33 @@ class TestUnsetStatusIfSpike:
         bucket.refresh_from_db()
         assert bucket.triage_status is None
         assert bucket.triaged_at is not None
+
+    def test_spiking_buckets_untriaged_in_one_update(self, django_assert_num_queries):
+        now = timezone.now()
+        buckets = [
+            make_bucket("worksforme", now - timedelta(days=30)) for _ in range(3)
+        ]
+        for bucket in buckets:
+            make_bucket_hits(bucket, recent_count=7, baseline_count=9)
+
+        # last hit, counts, and the update with the data version bump
+        with django_assert_num_queries(6):
+            count = Command().unset_status_if_spike()
+
+        assert count == 3
+        assert not Bucket.objects.filter(triage_status__isnull=False).exists()
+
+    def test_dry_run(self):
+        now = timezone.now()
+        bucket = make_bucket("worksforme", now - timedelta(days=30))
+        make_bucket_hits(bucket, recent_count=7, baseline_count=9)
+        out = StringIO()
+
+        call_command("unset_buckets_triage_status", dry_run=True, stdout=out)
+
+        assert out.getvalue() == (
+            f"bucket {bucket.pk} (worksforme): recent=7, baseline=9, p=7.024e-07"
+            " -> untriage\n"
+        )
+        bucket.refresh_from_db()
+        assert bucket.triage_status == "worksforme"